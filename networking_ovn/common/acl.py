@@ -12,14 +12,122 @@
 #    under the License.
 #
 
+import collections
+import time
+
 import netaddr
 
 from neutron_lib import constants as const
 from oslo_config import cfg
+from oslo_log import log
+from ovsdbapp import exceptions as ovsdbapp_exc
 
+from networking_ovn._i18n import _LE, _LW
+from networking_ovn.common import config
 from networking_ovn.common import constants as ovn_const
 from networking_ovn.common import utils
 
+LOG = log.getLogger(__name__)
+
+# Maximum number of security groups, and of subnets, cached by the process
+RESOURCE_CACHE_SIZE = 1000
+
+# Maximum number of compiled security group rule matches cached by the
+# process
+SG_RULE_MATCH_CACHE_SIZE = 10000
+
+# Number of times the transaction updating the ACLs of a chunk of the ports
+# of a security group is attempted, when ovn_acl_fanout_chunk_size is set.
+ACL_FANOUT_CHUNK_ATTEMPTS = 3
+
+
+class AclKey(collections.namedtuple('AclKey', ['lport', 'direction',
+                                               'priority', 'action',
+                                               'match', 'log'])):
+    """Canonical and hashable value of an ACL.
+
+    ACLs are handled as dictionaries, which can't be stored in sets or used
+    as dictionary keys. Two ACLs with the same key are the same ACL, no
+    matter which other columns or bookkeeping fields their dictionaries
+    carry.
+    """
+    __slots__ = ()
+
+
+def acl_key(acl):
+    """Return the AclKey of an ACL dictionary."""
+    lport = acl.get('lport')
+    if lport is None:
+        lport = acl.get('external_ids', {}).get('neutron:lport')
+    return AclKey(lport=lport,
+                  direction=acl.get('direction'),
+                  priority=acl.get('priority'),
+                  action=acl.get('action'),
+                  match=acl.get('match'),
+                  log=bool(acl.get('log', False)))
+
+
+class LRUCache(object):
+    """Cache evicting its least recently used entries past max_size."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = collections.OrderedDict()
+
+    def _expires(self):
+        """Return the time an entry added now expires at, None if never"""
+        return None
+
+    def get(self, key, default=None):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return default
+        expires, value = entry
+        if expires is not None and expires <= time.time():
+            return default
+        self._entries[key] = entry
+        return value
+
+    def __setitem__(self, key, value):
+        self._entries.pop(key, None)
+        self._entries[key] = (self._expires(), value)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def evict(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class ResourceCache(LRUCache):
+    """Bounded cache of Neutron resources expiring after a while.
+
+    The entries expire ovn_acl_cache_ttl seconds after they are added, and
+    the least recently used ones are evicted once max_size entries are
+    cached. Entries are evicted explicitly when their resource changes in
+    this process, the ones changed by the other neutron-server processes
+    are stale until they expire.
+    """
+
+    def _expires(self):
+        return time.time() + config.get_ovn_acl_cache_ttl()
+
+
+_sg_cache = ResourceCache(RESOURCE_CACHE_SIZE)
+_subnet_cache = ResourceCache(RESOURCE_CACHE_SIZE)
+
+# Compiled port independent matches of the security group rules, indexed
+# by rule id along with the attributes they are compiled from, so that the
+# entries of the rules deleted by other processes are never used again.
+# They are evicted when their rule is deleted in this process, or once the
+# cache is full.
+_sg_rule_match_cache = LRUCache(SG_RULE_MATCH_CACHE_SIZE)
+
 
 def is_sg_enabled():
     return cfg.CONF.SECURITYGROUP.enable_security_group
@@ -33,6 +141,14 @@ def acl_direction(r, port):
     return '%s == "%s"' % (portdir, port['id'])
 
 
+def acl_port_group_direction(r, pg_name):
+    if r['direction'] == 'ingress':
+        portdir = 'outport'
+    else:
+        portdir = 'inport'
+    return '%s == @%s' % (portdir, pg_name)
+
+
 def acl_ethertype(r):
     match = ''
     ip_version = None
@@ -117,6 +233,20 @@ def drop_all_ip_traffic_for_port(port):
     return acl_list
 
 
+def drop_all_ip_traffic_for_port_group(
+        pg_name=ovn_const.OVN_DROP_PORT_GROUP_NAME):
+    acl_list = []
+    for direction, p in (('from-lport', 'inport'),
+                         ('to-lport', 'outport')):
+        acl = {"priority": ovn_const.ACL_PRIORITY_DROP,
+               "action": ovn_const.ACL_ACTION_DROP,
+               "log": False,
+               "direction": direction,
+               "match": '%s == @%s && ip' % (p, pg_name)}
+        acl_list.append(acl)
+    return acl_list
+
+
 def add_sg_rule_acl_for_port(port, r, match):
     dir_map = {
         'ingress': 'to-lport',
@@ -166,14 +296,33 @@ def add_acl_dhcp(port, subnet, ovn_dhcp=True):
     return acl_list
 
 
+def get_acl_caches():
+    """Return the security group and subnet caches to build ACLs with.
+
+    The process wide caches are returned when the ovn_acl_cache_ttl option
+    is set, otherwise new dictionaries, only shared by the ACLs the caller
+    builds.
+    """
+    if config.get_ovn_acl_cache_ttl():
+        return _sg_cache, _subnet_cache
+    return {}, {}
+
+
+def evict_security_group(sg_id):
+    _sg_cache.evict(sg_id)
+
+
+def evict_subnet(subnet_id):
+    _subnet_cache.evict(subnet_id)
+
+
 def _get_subnet_from_cache(plugin, admin_context, subnet_cache, subnet_id):
-    if subnet_id in subnet_cache:
-        return subnet_cache[subnet_id]
-    else:
+    subnet = subnet_cache.get(subnet_id)
+    if subnet is None:
         subnet = plugin.get_subnet(admin_context, subnet_id)
         if subnet:
             subnet_cache[subnet_id] = subnet
-        return subnet
+    return subnet
 
 
 def _get_sg_ports_from_cache(plugin, admin_context, sg_ports_cache, sg_id):
@@ -189,13 +338,12 @@ def _get_sg_ports_from_cache(plugin, admin_context, sg_ports_cache, sg_id):
 
 
 def _get_sg_from_cache(plugin, admin_context, sg_cache, sg_id):
-    if sg_id in sg_cache:
-        return sg_cache[sg_id]
-    else:
+    sg = sg_cache.get(sg_id)
+    if sg is None:
         sg = plugin.get_security_group(admin_context, sg_id)
         if sg:
             sg_cache[sg_id] = sg
-        return sg
+    return sg
 
 
 def acl_remote_group_id(r, ip_version):
@@ -208,14 +356,17 @@ def acl_remote_group_id(r, ip_version):
     return ' && %s.%s == $%s' % (ip_version, src_or_dst, addrset_name)
 
 
-def _add_sg_rule_acl_for_port(port, r):
-    # Update the match based on which direction this rule is for (ingress
-    # or egress).
-    match = acl_direction(r, port)
+def _sg_rule_match_key(r):
+    return (r.get('direction'), r.get('ethertype'),
+            r.get('remote_ip_prefix'), r.get('remote_group_id'),
+            r.get('protocol'), r.get('port_range_min'),
+            r.get('port_range_max'))
 
+
+def _compile_sg_rule_match(r):
     # Update the match for IPv4 vs IPv6.
     ip_match, ip_version, icmp = acl_ethertype(r)
-    match += ip_match
+    match = ip_match
 
     # Update the match if an IPv4 or IPv6 prefix was specified.
     match += acl_remote_ip_prefix(r, ip_version)
@@ -226,23 +377,86 @@ def _add_sg_rule_acl_for_port(port, r):
     # Update the match for the protocol (tcp, udp, icmp) and port/type
     # range if specified.
     match += acl_protocol_and_ports(r, icmp)
+    return match
+
+
+def get_sg_rule_match(r):
+    """Return the port independent part of the match of a rule.
+
+    The match is compiled once per security group rule and cached by rule
+    id until evict_sg_rule_match() is called for the rule, or until it is
+    the least recently used one of a full cache.
+    """
+    rule_id = r.get('id')
+    if rule_id is None:
+        return _compile_sg_rule_match(r)
+
+    key = _sg_rule_match_key(r)
+    cached = _sg_rule_match_cache.get(rule_id)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    match = _compile_sg_rule_match(r)
+    _sg_rule_match_cache[rule_id] = (key, match)
+    return match
+
+
+def evict_sg_rule_match(rule_id):
+    _sg_rule_match_cache.evict(rule_id)
+
+
+def clear_sg_rule_match_cache():
+    _sg_rule_match_cache.clear()
+
+
+def _add_sg_rule_acl_for_port(port, r):
+    # Update the match based on which direction this rule is for (ingress
+    # or egress), which is the only part of the match depending on the
+    # port, and complete it with the compiled rule match.
+    match = acl_direction(r, port) + get_sg_rule_match(r)
 
     # Finally, create the ACL entry for the direction specified.
     return add_sg_rule_acl_for_port(port, r, match)
 
 
-def update_acls_for_security_group(plugin,
-                                   admin_context,
-                                   ovn,
-                                   security_group_id,
-                                   security_group_rule,
-                                   sg_ports_cache=None,
-                                   is_add_acl=True):
-    # Skip ACLs if security groups aren't enabled
+def add_sg_rule_acl_for_port_group(pg_name, r):
+    dir_map = {
+        'ingress': 'to-lport',
+        'egress': 'from-lport',
+    }
+    match = acl_port_group_direction(r, pg_name) + get_sg_rule_match(r)
+    acl = {"priority": ovn_const.ACL_PRIORITY_ALLOW,
+           "action": ovn_const.ACL_ACTION_ALLOW_RELATED,
+           "log": False,
+           "direction": dir_map[r['direction']],
+           "match": match,
+           "external_ids": {ovn_const.OVN_SG_RULE_EXT_ID_KEY: r['id']}}
+    return acl
+
+
+def add_acls_for_port_group(sg):
+    """Return the ACLs of the port group of a security group."""
+    acl_list = []
     if not is_sg_enabled():
-        return
+        return acl_list
 
-    # Get the security group ports.
+    pg_name = utils.ovn_port_group_name(sg['id'])
+    acl_keys = set()
+    for r in sg['security_group_rules']:
+        acl = add_sg_rule_acl_for_port_group(pg_name, r)
+        key = acl_key(acl)
+        if key not in acl_keys:
+            acl_keys.add(key)
+            acl_list.append(acl)
+    return acl_list
+
+
+def _get_sg_acl_ports(plugin, admin_context, security_group_id,
+                      sg_ports_cache=None, skip_port_ids=()):
+    """Return the ports of a security group having its ACLs
+
+    The ports of skip_port_ids, which have the ACLs of the security group
+    through its port group, are left out.
+    """
     sg_ports_cache = sg_ports_cache or {}
     sg_ports = _get_sg_ports_from_cache(plugin,
                                         admin_context,
@@ -250,20 +464,66 @@ def update_acls_for_security_group(plugin,
                                         security_group_id)
 
     # ACLs associated with a security group may span logical switches
-    sg_port_ids = [binding['port_id'] for binding in sg_ports]
-    sg_port_ids = list(set(sg_port_ids))
+    sg_port_ids = set(binding['port_id'] for binding in sg_ports)
+    if skip_port_ids:
+        sg_port_ids -= set(skip_port_ids)
+    if not sg_port_ids:
+        return []
+    sg_port_ids = list(sg_port_ids)
     port_list = plugin.get_ports(admin_context,
                                  filters={'id': sg_port_ids})
+    # Skip trusted port
+    return [port for port in port_list if not utils.is_lsp_trusted(port)]
+
+
+def _update_port_group_acls(ovn, security_group_id, rules_add, rules_del):
+    """Update the ACLs of the rules on the port group of a security group.
+
+    :returns: The ids of the ports of the port group, None if it doesn't
+              exist. The ports of the security group created before port
+              groups were enabled, which aren't in the port group until they
+              are updated or synced, still have their own ACLs.
+    """
+    pg_name = utils.ovn_port_group_name(security_group_id)
+    port_group = ovn.get_port_group(pg_name)
+    if port_group is None:
+        return None
+    ovn.update_port_group_acls(
+        pg_name,
+        acls_add=[add_sg_rule_acl_for_port_group(pg_name, r)
+                  for r in rules_add],
+        acls_del=[add_sg_rule_acl_for_port_group(pg_name, r)
+                  for r in rules_del]).execute(check_error=True)
+    return [lsp.name for lsp in getattr(port_group, 'ports', [])]
+
+
+def update_acls_for_security_group(plugin,
+                                   admin_context,
+                                   ovn,
+                                   security_group_id,
+                                   security_group_rule,
+                                   sg_ports_cache=None,
+                                   is_add_acl=True):
+    # Skip ACLs if security groups aren't enabled
+    if not is_sg_enabled():
+        return
+
+    pg_port_ids = None
+    if ovn.is_port_groups_supported():
+        rules = [security_group_rule]
+        pg_port_ids = _update_port_group_acls(
+            ovn, security_group_id,
+            rules_add=rules if is_add_acl else (),
+            rules_del=() if is_add_acl else rules)
+
+    update_port_list = _get_sg_acl_ports(plugin, admin_context,
+                                         security_group_id, sg_ports_cache,
+                                         skip_port_ids=pg_port_ids)
     acl_new_values_dict = {}
-    update_port_list = []
 
     # NOTE(lizk): We can directly locate the affected acl records,
     # so no need to compare new acl values with existing acl objects.
-    for port in port_list:
-        # Skip trusted port
-        if utils.is_lsp_trusted(port):
-            continue
-        update_port_list.append(port)
+    for port in update_port_list:
         acl = _add_sg_rule_acl_for_port(port, security_group_rule)
         # Remove lport and lswitch since we don't need them
         acl.pop('lport')
@@ -272,6 +532,19 @@ def update_acls_for_security_group(plugin,
 
     if not update_port_list:
         return
+    if config.get_ovn_acl_fanout_chunk_size():
+        def get_commands(ports, may_exist):
+            return [ovn.update_acls(
+                list(set([p['network_id'] for p in ports])),
+                ports,
+                dict((p['id'], acl_new_values_dict[p['id']]) for p in ports),
+                need_compare=False,
+                is_add_acl=is_add_acl,
+                may_exist=may_exist)]
+
+        _update_acls_in_chunks(ovn, security_group_id, update_port_list,
+                               get_commands)
+        return
     lswitch_names = set([p['network_id'] for p in update_port_list])
 
     ovn.update_acls(list(lswitch_names),
@@ -281,7 +554,113 @@ def update_acls_for_security_group(plugin,
                     is_add_acl=is_add_acl).execute(check_error=True)
 
 
-def add_acls(plugin, admin_context, port, sg_cache, subnet_cache):
+def update_acls_for_security_group_rules(plugin, admin_context, ovn,
+                                         security_group_id, rules_add=(),
+                                         rules_del=(), may_exist=False):
+    """Update the ACLs of several rules of a security group at once.
+
+    The ports of the security group are looked up once for all the rules,
+    and the ACLs of the rules are updated in a single transaction. When
+    may_exist is set, the ACLs of rules_add may already exist.
+    """
+    # Skip ACLs if security groups aren't enabled
+    if not is_sg_enabled():
+        return
+
+    pg_port_ids = None
+    if ovn.is_port_groups_supported():
+        pg_port_ids = _update_port_group_acls(ovn, security_group_id,
+                                              rules_add, rules_del)
+
+    update_port_list = _get_sg_acl_ports(plugin, admin_context,
+                                         security_group_id,
+                                         skip_port_ids=pg_port_ids)
+    if not update_port_list:
+        return
+
+    def get_commands(ports, may_exist):
+        lswitch_names = list(set([p['network_id'] for p in ports]))
+        commands = []
+        for rules, is_add_acl in ((rules_del, False), (rules_add, True)):
+            for r in rules:
+                acl_new_values_dict = {}
+                for port in ports:
+                    acl = _add_sg_rule_acl_for_port(port, r)
+                    acl.pop('lport')
+                    acl.pop('lswitch')
+                    acl_new_values_dict[port['id']] = acl
+                commands.append(ovn.update_acls(lswitch_names,
+                                                ports,
+                                                acl_new_values_dict,
+                                                need_compare=False,
+                                                is_add_acl=is_add_acl,
+                                                may_exist=may_exist))
+        return commands
+
+    _update_acls_in_chunks(ovn, security_group_id, update_port_list,
+                           get_commands, may_exist=may_exist)
+
+
+def _is_transient_error(error):
+    """Whether a failed transaction may succeed when attempted again
+
+    The transactions timing out, either waiting for their result or being
+    attempted again by the OVSDB connection after conflicting with other
+    transactions or losing the connection to the ovsdb-server, fail with a
+    TimeoutException.
+    """
+    return isinstance(error, ovsdbapp_exc.TimeoutException)
+
+
+def _update_acls_in_chunks(ovn, security_group_id, port_list, get_commands,
+                           may_exist=False):
+    """Update the ACLs of the ports of a security group.
+
+    get_commands(ports, may_exist) returns the commands updating the ACLs
+    of ports. When the ovn_acl_fanout_chunk_size option is set, the ports
+    are split in chunks of that many ports, each updated by its own
+    transaction, so that the transactions of the security groups with many
+    ports don't time out. A chunk failing with a transient error is
+    attempted again, up to ACL_FANOUT_CHUNK_ATTEMPTS times, without
+    updating the chunks already done again, and the other errors are
+    raised right away. Since a transaction timing out may still have been
+    committed, the ACLs added by a chunk attempted again may exist already,
+    as may those of all the chunks when may_exist is set.
+    """
+    chunk_size = config.get_ovn_acl_fanout_chunk_size() or len(port_list)
+    attempts = (ACL_FANOUT_CHUNK_ATTEMPTS
+                if chunk_size < len(port_list) else 1)
+    for start in range(0, len(port_list), chunk_size):
+        ports = port_list[start:start + chunk_size]
+        for attempt in range(1, attempts + 1):
+            try:
+                with ovn.transaction(check_error=True) as txn:
+                    for cmd in get_commands(ports, may_exist or attempt > 1):
+                        txn.add(cmd)
+                break
+            except Exception as e:
+                if attempt == attempts or not _is_transient_error(e):
+                    LOG.error(_LE('Failed to update the ACLs of security '
+                                  'group %(sg)s after updating those of '
+                                  '%(done)d of its %(total)d ports'),
+                              {'sg': security_group_id, 'done': start,
+                               'total': len(port_list)})
+                    raise
+                LOG.warning(_LW('Failed to update the ACLs of ports '
+                                '%(start)d to %(end)d of security group '
+                                '%(sg)s, retrying'),
+                            {'start': start + 1, 'end': start + len(ports),
+                             'sg': security_group_id})
+
+
+def add_acls(plugin, admin_context, port, sg_cache, subnet_cache,
+             port_groups=False):
+    """Return the ACLs of a port.
+
+    When port_groups is True the drop and security group rule ACLs are on
+    the port groups the port belongs to, and only the DHCP ACLs of the port
+    are returned.
+    """
     acl_list = []
 
     # Skip ACLs if security groups aren't enabled
@@ -293,7 +672,8 @@ def add_acls(plugin, admin_context, port, sg_cache, subnet_cache):
         return acl_list
 
     # Drop all IP traffic to and from the logical port by default.
-    acl_list += drop_all_ip_traffic_for_port(port)
+    if not port_groups:
+        acl_list += drop_all_ip_traffic_for_port(port)
 
     # Add DHCP ACLs.
     port_subnet_ids = set()
@@ -309,8 +689,12 @@ def add_acls(plugin, admin_context, port, sg_cache, subnet_cache):
             acl_list += add_acl_dhcp(port, subnet, True)
             port_subnet_ids.add(subnet['id'])
 
+    if port_groups:
+        return acl_list
+
     # We create an ACL entry for each rule on each security group applied
     # to this port.
+    acl_keys = set(acl_key(acl) for acl in acl_list)
     for sg_id in sec_groups:
         sg = _get_sg_from_cache(plugin,
                                 admin_context,
@@ -318,7 +702,9 @@ def add_acls(plugin, admin_context, port, sg_cache, subnet_cache):
                                 sg_id)
         for r in sg['security_group_rules']:
             acl = _add_sg_rule_acl_for_port(port, r)
-            if acl not in acl_list:
+            key = acl_key(acl)
+            if key not in acl_keys:
+                acl_keys.add(key)
                 acl_list.append(acl)
 
     return acl_list
@@ -119,7 +119,146 @@ ovn_opts = [
     cfg.IntOpt('dhcp_default_lease_time',
                default=(12 * 60 * 60),
                help=_('Default least time (in seconds) to use with '
-                      'OVN\'s native DHCP service.'))
+                      'OVN\'s native DHCP service.')),
+    cfg.BoolOpt('ovn_port_groups',
+                default=False,
+                help=_('Whether to implement security groups with OVN port '
+                       'groups. Each security group is mapped to a port '
+                       'group holding the ACLs of its rules, instead of '
+                       'creating the ACLs of every rule for every port. '
+                       'Only used if the OVN_Northbound schema has the '
+                       'Port_Group table.')),
+    cfg.IntOpt('ovn_txn_batch_window',
+               min=0,
+               default=0,
+               help=_('The time in milliseconds during which the '
+                      'OVN_Northbound transactions committed concurrently '
+                      'by a neutron-server process are grouped and '
+                      'committed as a single OVSDB transaction. Each '
+                      'process groups its own transactions only. A '
+                      'transaction whose batch fails before being committed '
+                      'is committed again on its own. If this is zero, the '
+                      'transactions are not grouped.')),
+    cfg.IntOpt('ovn_txn_batch_max_size',
+               min=1,
+               default=100,
+               help=_('The maximum number of OVN_Northbound transactions '
+                      'grouped in a single OVSDB transaction. A batch is '
+                      'committed as soon as it is full. Only used if '
+                      'ovn_txn_batch_window is not zero.')),
+    cfg.IntOpt('ovn_port_status_batch_window',
+               min=0,
+               default=0,
+               help=_('The time in milliseconds during which the port '
+                      'statuses reported by OVN are collected before being '
+                      'applied together to the Neutron database. Only the '
+                      'last status reported for a port during that time is '
+                      'applied. If this is zero, every status is applied '
+                      'as soon as it is reported.')),
+    cfg.IntOpt('ovn_event_workers',
+               min=1,
+               default=1,
+               help=_('The number of green threads running the OVSDB '
+                      'events handled by the OVN worker. The events of a '
+                      'row are always run in the order they were received, '
+                      'but with more than one worker the events of '
+                      'different rows are run concurrently.')),
+    cfg.IntOpt('ovn_event_shards',
+               min=0,
+               default=0,
+               help=_('The number of shards the OVSDB events are spread '
+                      'over. Each OVN worker handles the events of the rows '
+                      'of the shards whose lock it owns. The shards left '
+                      'without an owner, e.g. when there are fewer OVN '
+                      'workers than shards or when a worker goes down, are '
+                      'taken over by the other workers, each of them '
+                      'opening one more connection per shard to the OVSDB '
+                      'server, and the workers owning more than their fair '
+                      'share of the shards release some of them when other '
+                      'workers join. It must be the same for all the neutron '
+                      'servers. If this is zero, a single OVN worker '
+                      'handles all the events.')),
+    cfg.IntOpt('ovn_event_queue_high_water',
+               min=0,
+               default=10000,
+               help=_('The number of OVSDB events waiting to be handled by '
+                      'the OVN worker above which a warning is logged. The '
+                      'events of a port status or of a chassis waiting to '
+                      'be handled are replaced by the later ones. If this '
+                      'is zero, no warning is logged.')),
+    cfg.BoolOpt('ovn_monitor_profiles',
+                default=False,
+                help=_('Whether the API and RPC workers only monitor the '
+                       'tables and columns of the OVN_Northbound database '
+                       'they use, and all the workers only the columns of '
+                       'the OVN_Southbound Chassis table they use, instead '
+                       'of replicating them entirely. The OVN worker, which '
+                       'synchronizes the OVN_Northbound database, still '
+                       'monitors it entirely.')),
+    cfg.BoolOpt('ovn_idl_lazy_connect',
+                default=False,
+                help=_('Whether the API and RPC workers connect to the '
+                       'OVN_Northbound and OVN_Southbound databases the '
+                       'first time they use them, instead of when they '
+                       'start. The OVN worker always connects when it '
+                       'starts.')),
+    cfg.IntOpt('ovn_idl_warmup_window',
+               default=0,
+               min=0,
+               help=_('When ovn_idl_lazy_connect is enabled, the number of '
+                      'seconds over which the API and RPC workers connect '
+                      'to the OVN databases in the background after they '
+                      'start, each one after a random delay, so that the '
+                      'ovsdb-servers don\'t have to send their contents to '
+                      'all the workers at once. If this is zero, the '
+                      'workers only connect on first use.')),
+    cfg.StrOpt('ovn_idl_snapshot_dir',
+               help=_('Directory, for instance $state_path/ovn, where the '
+                      'workers save a snapshot of the contents of the OVN '
+                      'databases they monitor. When they start, they load '
+                      'it and, if the ovsdb-server supports it, only get '
+                      'the changes made since the snapshot was taken '
+                      'instead of the whole databases. If this is not set, '
+                      'no snapshot is taken.')),
+    cfg.IntOpt('ovn_idl_snapshot_interval',
+               default=300,
+               min=1,
+               help=_('The number of seconds between two snapshots of the '
+                      'OVN databases when ovn_idl_snapshot_dir is set.')),
+    cfg.IntOpt('ovn_acl_cache_ttl',
+               default=0,
+               min=0,
+               max=60,
+               help=_('The number of seconds the security groups and '
+                      'subnets used to build the ACLs of the ports are '
+                      'cached by each neutron-server process. They are '
+                      'evicted from the cache of the process changing them, '
+                      'the other processes see the changes once their '
+                      'entries expire. Until then, these processes can '
+                      'apply stale security group rules to the ports they '
+                      'create or update, so it should be kept to a few '
+                      'seconds. If this is zero, they are not cached '
+                      'between port operations.')),
+    cfg.IntOpt('ovn_sg_rule_batch_window',
+               min=0,
+               default=0,
+               help=_('The time in milliseconds during which the creations '
+                      'and deletions of the rules of a security group are '
+                      'collected before the ACLs of all of them are updated '
+                      'together in OVN. If this is zero, the ACLs of every '
+                      'rule are updated as soon as it is created or '
+                      'deleted.')),
+    cfg.IntOpt('ovn_acl_fanout_chunk_size',
+               min=0,
+               default=0,
+               help=_('The maximum number of ports whose ACLs are updated '
+                      'by a single OVN transaction when the rules of a '
+                      'security group change, if port groups are not '
+                      'supported by the OVN_Northbound database. The '
+                      'transaction of each chunk of ports timing out is '
+                      'attempted up to 3 times. If this is zero, the ACLs '
+                      'of all the ports of the security group are updated '
+                      'by a single transaction.')),
 ]
 
 cfg.CONF.register_opts(ovn_opts, group='ovn')
@@ -189,3 +328,63 @@ def get_ovn_vhost_sock_dir():
 
 def get_ovn_dhcp_default_lease_time():
     return cfg.CONF.ovn.dhcp_default_lease_time
+
+
+def is_ovn_port_groups_enabled():
+    return cfg.CONF.ovn.ovn_port_groups
+
+
+def get_ovn_txn_batch_window():
+    return cfg.CONF.ovn.ovn_txn_batch_window
+
+
+def get_ovn_txn_batch_max_size():
+    return cfg.CONF.ovn.ovn_txn_batch_max_size
+
+
+def get_ovn_port_status_batch_window():
+    return cfg.CONF.ovn.ovn_port_status_batch_window
+
+
+def get_ovn_event_workers():
+    return cfg.CONF.ovn.ovn_event_workers
+
+
+def get_ovn_event_shards():
+    return cfg.CONF.ovn.ovn_event_shards
+
+
+def get_ovn_event_queue_high_water():
+    return cfg.CONF.ovn.ovn_event_queue_high_water
+
+
+def is_ovn_monitor_profiles_enabled():
+    return cfg.CONF.ovn.ovn_monitor_profiles
+
+
+def is_ovn_idl_lazy_connect_enabled():
+    return cfg.CONF.ovn.ovn_idl_lazy_connect
+
+
+def get_ovn_idl_warmup_window():
+    return cfg.CONF.ovn.ovn_idl_warmup_window
+
+
+def get_ovn_idl_snapshot_dir():
+    return cfg.CONF.ovn.ovn_idl_snapshot_dir
+
+
+def get_ovn_idl_snapshot_interval():
+    return cfg.CONF.ovn.ovn_idl_snapshot_interval
+
+
+def get_ovn_acl_cache_ttl():
+    return cfg.CONF.ovn.ovn_acl_cache_ttl
+
+
+def get_ovn_sg_rule_batch_window():
+    return cfg.CONF.ovn.ovn_sg_rule_batch_window
+
+
+def get_ovn_acl_fanout_chunk_size():
+    return cfg.CONF.ovn.ovn_acl_fanout_chunk_size
@@ -18,6 +18,8 @@ OVN_NETWORK_NAME_EXT_ID_KEY = 'neutron:network_name'
 OVN_PORT_NAME_EXT_ID_KEY = 'neutron:port_name'
 OVN_ROUTER_NAME_EXT_ID_KEY = 'neutron:router_name'
 OVN_SG_NAME_EXT_ID_KEY = 'neutron:security_group_name'
+OVN_SG_EXT_ID_KEY = 'neutron:security_group_id'
+OVN_SG_RULE_EXT_ID_KEY = 'neutron:security_group_rule_id'
 OVN_PHYSNET_EXT_ID_KEY = 'neutron:provnet-physical-network'
 OVN_NETTYPE_EXT_ID_KEY = 'neutron:provnet-network-type'
 OVN_SEGID_EXT_ID_KEY = 'neutron:provnet-segmentation-id'
@@ -31,6 +33,11 @@ OVN_GATEWAY_CHASSIS_KEY = 'redirect-chassis'
 
 OVN_PROVNET_PORT_NAME_PREFIX = 'provnet-'
 
+# Port group all the ports with security groups belong to when the ACLs are
+# applied to port groups. It drops all the IP traffic not allowed by the
+# port groups of the security groups.
+OVN_DROP_PORT_GROUP_NAME = 'neutron_pg_drop'
+
 # OVN ACLs have priorities.  The highest priority ACL that matches is the one
 # that takes effect.  Our choice of priority numbers is arbitrary, but it
 # leaves room above and below the ACLs we create.  We only need two priorities.
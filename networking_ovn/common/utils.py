@@ -64,6 +64,15 @@ def ovn_addrset_name(sg_id, ip_version):
     return ('as-%s-%s' % (ip_version, sg_id)).replace('-', '_')
 
 
+def ovn_port_group_name(sg_id):
+    # The name of the port group for the given security group id. The
+    # format is:
+    #   pg-<security group uuid>
+    # with all '-' replaced with '_', as OVN doesn't support '-' in a port
+    # group name either.
+    return ('pg-%s' % sg_id).replace('-', '_')
+
+
 def get_lsp_dhcp_opts(port, ip_version):
     # Get dhcp options from Neutron port, for setting DHCP_Options row
     # in OVN.
@@ -95,6 +104,25 @@ def get_lsp_dhcp_opts(port, ip_version):
     return (lsp_dhcp_disabled, lsp_dhcp_opts)
 
 
+# The attributes of a Neutron port translated to its Logical_Switch_Port,
+# DHCP_Options, ACLs, port groups and address sets in the OVN NB database.
+OVN_PORT_ATTRIBUTES = ('name', 'mac_address', 'fixed_ips',
+                       'allowed_address_pairs', 'security_groups',
+                       'port_security_enabled', 'admin_state_up',
+                       'device_owner', 'qos_policy_id', edo_ext.EXTRADHCPOPTS,
+                       constants.OVN_PORT_BINDING_PROFILE)
+
+
+def is_ovn_port_changed(port, original_port):
+    """Whether the OVN NB database must be updated for a port update
+
+    Updates of the other attributes of the port, like its status, binding
+    host or description, don't change its OVN configuration.
+    """
+    return any(port.get(attr) != original_port.get(attr)
+               for attr in OVN_PORT_ATTRIBUTES)
+
+
 def is_lsp_trusted(port):
     return n_utils.is_port_trusted(port) if port.get('device_owner') else False
 
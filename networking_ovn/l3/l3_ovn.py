@@ -612,59 +612,71 @@ class OVNL3RouterPlugin(service_base.ServicePluginBase,
                                     filters={'port_id': [port_id]})
         router_ids = super(OVNL3RouterPlugin, self).disassociate_floatingips(
             context, port_id, do_notify)
+        # The NAT rules of the floating ips are deleted by transactions
+        # committed concurrently
+        pending = []
         for fip in fips:
             router_id = fip.get('router_id')
             fixed_ip_address = fip.get('fixed_ip_address')
             if router_id and fixed_ip_address:
                 update_fip = {'logical_ip': fixed_ip_address,
                               'external_ip': fip['floating_ip_address']}
-                try:
-                    self._update_floating_ip_in_ovn(
-                        context, router_id, update_fip, associate=False)
-                    self.update_floatingip_status(
-                        context, fip['id'], n_const.FLOATINGIP_STATUS_DOWN)
-                except Exception as e:
-                    LOG.error(_LE('Error in disassociating floatingip %(id)s: '
-                                  '%(error)s'), {'id': fip['id'], 'error': e})
+                txn = self._ovn.transaction(check_error=True)
+                self._add_floating_ip_commands(txn, router_id, update_fip,
+                                               associate=False)
+                pending.append((fip, txn.commit_async()))
+        for fip, future in pending:
+            try:
+                future.result()
+                self.update_floatingip_status(
+                    context, fip['id'], n_const.FLOATINGIP_STATUS_DOWN)
+            except Exception as e:
+                LOG.error(_LE('Error in disassociating floatingip %(id)s: '
+                              '%(error)s'), {'id': fip['id'], 'error': e})
         return router_ids
 
-    def _update_floating_ip_in_ovn(self, context, router_id, update,
-                                   associate=True):
+    def _add_floating_ip_commands(self, txn, router_id, update,
+                                  associate=True):
         fip_apis = {}
         fip_apis['nat'] = self._ovn.add_nat_rule_in_lrouter if \
             associate else self._ovn.delete_nat_rule_in_lrouter
         gw_lrouter_name = utils.ovn_name(router_id)
+        nat_rule_args = (gw_lrouter_name,)
+        if associate:
+            # TODO(chandrav): Since the floating ip port is not
+            # bound to any chassis, packets destined to floating ip
+            # will be dropped. To overcome this, delete the floating
+            # ip port. Proper fix for this would be to redirect packets
+            # destined to floating ip to the router port. This would
+            # require changes in ovn-northd.
+            txn.add(self._ovn.delete_lswitch_port(
+                update['fip_port_id'],
+                utils.ovn_name(update['fip_net_id'])))
+
+            # Get the list of nat rules and check if the external_ip
+            # with type 'dnat_and_snat' already exists or not.
+            # If exists, set the new value.
+            # This happens when the port associated to a floating ip
+            # is deleted before the disassociation.
+            lrouter_nat_rules = self._ovn.get_lrouter_nat_rules(
+                gw_lrouter_name)
+            for nat_rule in lrouter_nat_rules:
+                if nat_rule['external_ip'] == update['external_ip'] \
+                        and nat_rule['type'] == 'dnat_and_snat':
+                    fip_apis['nat'] = self._ovn.set_nat_rule_in_lrouter
+                    nat_rule_args = (gw_lrouter_name, nat_rule['uuid'])
+                    break
+
+        txn.add(fip_apis['nat'](*nat_rule_args, type='dnat_and_snat',
+                                logical_ip=update['logical_ip'],
+                                external_ip=update['external_ip']))
+
+    def _update_floating_ip_in_ovn(self, context, router_id, update,
+                                   associate=True):
         try:
             with self._ovn.transaction(check_error=True) as txn:
-                nat_rule_args = (gw_lrouter_name,)
-                if associate:
-                    # TODO(chandrav): Since the floating ip port is not
-                    # bound to any chassis, packets destined to floating ip
-                    # will be dropped. To overcome this, delete the floating
-                    # ip port. Proper fix for this would be to redirect packets
-                    # destined to floating ip to the router port. This would
-                    # require changes in ovn-northd.
-                    txn.add(self._ovn.delete_lswitch_port(
-                        update['fip_port_id'],
-                        utils.ovn_name(update['fip_net_id'])))
-
-                    # Get the list of nat rules and check if the external_ip
-                    # with type 'dnat_and_snat' already exists or not.
-                    # If exists, set the new value.
-                    # This happens when the port associated to a floating ip
-                    # is deleted before the disassociation.
-                    lrouter_nat_rules = self._ovn.get_lrouter_nat_rules(
-                        gw_lrouter_name)
-                    for nat_rule in lrouter_nat_rules:
-                        if nat_rule['external_ip'] == update['external_ip'] \
-                                and nat_rule['type'] == 'dnat_and_snat':
-                            fip_apis['nat'] = self._ovn.set_nat_rule_in_lrouter
-                            nat_rule_args = (gw_lrouter_name, nat_rule['uuid'])
-                            break
-
-                txn.add(fip_apis['nat'](*nat_rule_args, type='dnat_and_snat',
-                                        logical_ip=update['logical_ip'],
-                                        external_ip=update['external_ip']))
+                self._add_floating_ip_commands(txn, router_id, update,
+                                               associate=associate)
         except Exception:
             with excutils.save_and_reraise_exception():
                 LOG.error(_LE('Unable to update NAT rule in gateway router'))
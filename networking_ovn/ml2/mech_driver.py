@@ -12,8 +12,11 @@
 #    under the License.
 #
 
+import atexit
 import collections
+from eventlet import greenthread
 import netaddr
+import threading
 
 from neutron_lib.api.definitions import portbindings
 from neutron_lib.api.definitions import provider_net as pnet
@@ -37,7 +40,7 @@ from neutron.plugins.ml2 import driver_api
 from neutron.services.qos import qos_consts
 from neutron.services.segments import db as segment_service_db
 
-from networking_ovn._i18n import _, _LI, _LW
+from networking_ovn._i18n import _, _LE, _LI, _LW
 from networking_ovn.common import acl as ovn_acl
 from networking_ovn.common import config
 from networking_ovn.common import constants as ovn_const
@@ -58,6 +61,12 @@ OvnPortInfo = collections.namedtuple('OvnPortInfo', ['type', 'options',
                                                      'dhcpv4_options',
                                                      'dhcpv6_options'])
 
+# Number of ports fetched by a query when reconciling the port statuses
+PORT_STATUS_SYNC_CHUNK_SIZE = 500
+# Number of times the queued security group rule changes are flushed before
+# giving up on them
+SG_RULE_FLUSH_ATTEMPTS = 3
+
 
 class OVNMechanismDriver(driver_api.MechanismDriver):
     """OVN ML2 mechanism driver
@@ -94,6 +103,14 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         self._sb_ovn = None
         self._plugin_property = None
         self.sg_enabled = ovn_acl.is_sg_enabled()
+        self._sg_rule_window = (
+            config.get_ovn_sg_rule_batch_window() / 1000.0)
+        self._sg_rule_changes = {}
+        self._sg_rule_resyncs = {}
+        self._sg_rule_flushing = set()
+        self._sg_rule_lock = threading.Lock()
+        if self._sg_rule_window:
+            atexit.register(self._flush_all_sg_rule_changes)
         if cfg.CONF.SECURITYGROUP.firewall_driver:
             LOG.warning(_LW('Firewall driver configuration is ignored'))
         self._setup_vif_port_bindings()
@@ -154,14 +171,33 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
             registry.subscribe(self._process_sg_rule_notification,
                                resources.SECURITY_GROUP_RULE,
                                events.BEFORE_DELETE)
+            # The security groups are cached until they are deleted
+            registry.subscribe(self._evict_sg_notification,
+                               resources.SECURITY_GROUP,
+                               events.AFTER_DELETE)
+            registry.subscribe(self._evict_sg_notification,
+                               resources.SECURITY_GROUP_RULE,
+                               events.AFTER_DELETE)
 
     def post_fork_initialize(self, resource, event, trigger, **kwargs):
         # NOTE(rtheis): This will initialize all workers (API, RPC,
-        # plugin service and OVN) with OVN IDL connections.
-        self._nb_ovn, self._sb_ovn = impl_idl_ovn.get_ovn_idls(self,
-                                                               trigger)
+        # plugin service and OVN) with OVN IDL connections. The OVN worker
+        # always connects right away since it handles the OVN events.
+        is_ovn_worker = trigger.im_class == ovsdb_monitor.OvnWorker
+        lazy = (not is_ovn_worker and
+                config.is_ovn_idl_lazy_connect_enabled())
+        self._nb_ovn, self._sb_ovn = impl_idl_ovn.get_ovn_idls(
+            self, trigger, lazy=lazy)
+
+        if is_ovn_worker:
+            # The port group dropping the traffic of the ports with security
+            # groups must exist before any port is added to it.
+            if self.sg_enabled and self._nb_ovn.is_port_groups_supported():
+                self._nb_ovn.create_port_group(
+                    ovn_const.OVN_DROP_PORT_GROUP_NAME,
+                    acls=ovn_acl.drop_all_ip_traffic_for_port_group()
+                ).execute(check_error=True)
 
-        if trigger.im_class == ovsdb_monitor.OvnWorker:
             # Call the synchronization task if its ovn worker
             # This sync neutron DB to OVN-NB DB only in inconsistent states
             self.nb_synchronizer = ovn_db_sync.OvnNbSynchronizer(
@@ -184,6 +220,15 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         sg = kwargs.get('security_group')
         external_ids = {ovn_const.OVN_SG_NAME_EXT_ID_KEY: sg['name']}
         with self._nb_ovn.transaction(check_error=True) as txn:
+            if self._nb_ovn.is_port_groups_supported():
+                pg_name = utils.ovn_port_group_name(sg['id'])
+                if event == events.AFTER_CREATE:
+                    txn.add(self._nb_ovn.create_port_group(
+                        pg_name,
+                        acls=ovn_acl.add_acls_for_port_group(sg),
+                        external_ids={ovn_const.OVN_SG_EXT_ID_KEY: sg['id']}))
+                elif event == events.BEFORE_DELETE:
+                    txn.add(self._nb_ovn.delete_port_group(pg_name))
             for ip_version in ['ip4', 'ip6']:
                 if event == events.AFTER_CREATE:
                     txn.add(self._nb_ovn.create_address_set(
@@ -196,6 +241,22 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
                 elif event == events.BEFORE_DELETE:
                     txn.add(self._nb_ovn.delete_address_set(
                             name=utils.ovn_addrset_name(sg['id'], ip_version)))
+        ovn_acl.evict_security_group(sg['id'])
+        if event == events.BEFORE_DELETE:
+            for sg_rule in sg.get('security_group_rules', []):
+                ovn_acl.evict_sg_rule_match(sg_rule.get('id'))
+
+    def _evict_sg_notification(self, resource, event, trigger, **kwargs):
+        """Evict a security group from the cache once a deletion is done
+
+        The security group is evicted before its deletion or the deletion of
+        one of its rules, while it still exists, so the ports created or
+        updated meanwhile can cache it again. It is evicted again after the
+        deletion so that the next ports get it from the database.
+        """
+        ovn_acl.evict_security_group(kwargs.get('security_group_id'))
+        for sg_rule_id in kwargs.get('security_group_rule_ids') or []:
+            ovn_acl.evict_sg_rule_match(sg_rule_id)
 
     def _process_sg_rule_notification(
             self, resource, event, trigger, **kwargs):
@@ -213,6 +274,11 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
             sg_id = sg_rule['security_group_id']
             is_add_acl = False
 
+        ovn_acl.evict_security_group(sg_id)
+        if self._sg_rule_window:
+            self._queue_sg_rule_change(sg_id, sg_rule, is_add_acl)
+            return
+
         # TODO(russellb) It's possible for Neutron and OVN to get out of sync
         # here. If updating ACls fails somehow, we're out of sync until another
         # change causes another refresh attempt.
@@ -222,6 +288,101 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
                                                sg_id,
                                                sg_rule,
                                                is_add_acl=is_add_acl)
+        if not is_add_acl:
+            ovn_acl.evict_sg_rule_match(kwargs.get('security_group_rule_id'))
+
+    def _queue_sg_rule_change(self, sg_id, sg_rule, is_add_acl):
+        """Queue the creation or deletion of a security group rule
+
+        The rules of a security group created or deleted during the batch
+        window have their ACLs updated together, and the ACLs of a rule
+        created then deleted during the window are never added. The changes
+        queued while the previous ones of the security group are flushed
+        are only flushed after them, so that they are applied in order.
+        """
+        with self._sg_rule_lock:
+            changes = self._sg_rule_changes.get(sg_id)
+            if changes is None:
+                changes = collections.OrderedDict()
+                self._sg_rule_changes[sg_id] = changes
+                if sg_id not in self._sg_rule_flushing:
+                    greenthread.spawn_after(self._sg_rule_window,
+                                            self._flush_sg_rule_changes,
+                                            sg_id)
+            queued = changes.get(sg_rule['id'])
+            if not is_add_acl and queued is not None and queued[1]:
+                del changes[sg_rule['id']]
+                ovn_acl.evict_sg_rule_match(sg_rule['id'])
+            else:
+                changes[sg_rule['id']] = (sg_rule, is_add_acl)
+
+    def _flush_sg_rule_changes(self, sg_id):
+        with self._sg_rule_lock:
+            if sg_id in self._sg_rule_flushing:
+                # The flush in progress flushes these changes once done
+                return
+            changes = self._sg_rule_changes.pop(sg_id, {})
+            attempt = self._sg_rule_resyncs.pop(sg_id, 0) + 1
+            self._sg_rule_flushing.add(sg_id)
+        try:
+            self._update_sg_rule_acls(sg_id, changes, attempt)
+        finally:
+            with self._sg_rule_lock:
+                self._sg_rule_flushing.discard(sg_id)
+                if sg_id in self._sg_rule_changes:
+                    greenthread.spawn_after(self._sg_rule_window,
+                                            self._flush_sg_rule_changes,
+                                            sg_id)
+
+    def _update_sg_rule_acls(self, sg_id, changes, attempt):
+        rules_add = [rule for rule, is_add_acl in changes.values()
+                     if is_add_acl]
+        rules_del = [rule for rule, is_add_acl in changes.values()
+                     if not is_add_acl]
+        if not rules_add and not rules_del:
+            return
+        try:
+            # The ACLs of the changes flushed again may have been added by
+            # the failed attempts.
+            ovn_acl.update_acls_for_security_group_rules(
+                self._plugin, n_context.get_admin_context(), self._nb_ovn,
+                sg_id, rules_add=rules_add, rules_del=rules_del,
+                may_exist=attempt > 1)
+        except Exception:
+            if attempt == SG_RULE_FLUSH_ATTEMPTS:
+                LOG.exception(_LE('Failed to update the ACLs of the rules of '
+                                  'security group %s, they are out of sync '
+                                  'until the next database sync'), sg_id)
+            else:
+                LOG.exception(_LE('Failed to update the ACLs of the rules of '
+                                  'security group %s, resyncing them'),
+                              sg_id)
+                self._resync_sg_rule_changes(sg_id, changes, attempt)
+                return
+        for rule in rules_del:
+            ovn_acl.evict_sg_rule_match(rule['id'])
+
+    def _resync_sg_rule_changes(self, sg_id, changes, attempt):
+        """Queue again the security group rule changes failing to flush
+
+        They are flushed again with the changes queued in the meantime,
+        which override them, once the failed flush is done.
+        """
+        with self._sg_rule_lock:
+            queued = self._sg_rule_changes.get(sg_id, {})
+            resync = collections.OrderedDict(changes)
+            for rule_id, change in queued.items():
+                resync.pop(rule_id, None)
+                resync[rule_id] = change
+            self._sg_rule_changes[sg_id] = resync
+            self._sg_rule_resyncs[sg_id] = attempt
+
+    def _flush_all_sg_rule_changes(self):
+        """Flush the queued security group rule changes on exit"""
+        with self._sg_rule_lock:
+            sg_ids = list(self._sg_rule_changes)
+        for sg_id in sg_ids:
+            self._flush_sg_rule_changes(sg_id)
 
     def _is_network_type_supported(self, network_type):
         return (network_type in [plugin_const.TYPE_LOCAL,
@@ -373,12 +534,14 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
 
     def update_subnet_postcommit(self, context):
         subnet = context.current
+        ovn_acl.evict_subnet(subnet['id'])
         if subnet['enable_dhcp'] or context.original['enable_dhcp']:
             self.add_subnet_dhcp_options_in_ovn(subnet,
                                                 context.network.current)
 
     def delete_subnet_postcommit(self, context):
         subnet = context.current
+        ovn_acl.evict_subnet(subnet['id'])
         with self._nb_ovn.transaction(check_error=True) as txn:
             subnet_dhcp_options = self._nb_ovn.get_subnet_dhcp_options(
                 subnet['id'])
@@ -658,11 +821,19 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
                            parent_name, tag, dhcpv4_options, dhcpv6_options)
 
     def create_port_in_ovn(self, port, ovn_port_info):
-        external_ids = {ovn_const.OVN_PORT_NAME_EXT_ID_KEY: port['name']}
-        lswitch_name = utils.ovn_name(port['network_id'])
+        self.create_ports_in_ovn([(port, ovn_port_info)])
+
+    def create_ports_in_ovn(self, ports_info):
+        """Create the logical switch ports of several ports in one transaction
+
+        :param ports_info: List of (port, OvnPortInfo) tuples
+
+        The ACLs of the ports are built sharing the caches of their security
+        groups and subnets, and the ports joining the same port group or
+        address set are added to it by a single command.
+        """
         admin_context = n_context.get_admin_context()
-        sg_cache = {}
-        subnet_cache = {}
+        sg_cache, subnet_cache = ovn_acl.get_acl_caches()
 
         # It's possible to have a network created on one controller and then a
         # port created on a different controller quickly enough that the second
@@ -670,58 +841,98 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         # OVN northbound database.  Check if the logical switch is present
         # or not in the idl's local copy of the database before creating
         # the lswitch port.
-        self._nb_ovn.check_for_row_by_value_and_retry(
-            'Logical_Switch', 'name', lswitch_name)
-
+        lswitch_names = set()
+        for port, ovn_port_info in ports_info:
+            lswitch_name = utils.ovn_name(port['network_id'])
+            if lswitch_name not in lswitch_names:
+                self._nb_ovn.check_for_row_by_value_and_retry(
+                    'Logical_Switch', 'name', lswitch_name)
+                lswitch_names.add(lswitch_name)
+
+        port_groups = self._nb_ovn.is_port_groups_supported()
+        if port_groups:
+            sg_ids = set()
+            for port, ovn_port_info in ports_info:
+                sg_ids.update(utils.get_lsp_security_groups(port))
+            if sg_ids:
+                self._create_missing_port_groups(admin_context, sg_ids)
+        port_group_ports = collections.OrderedDict()
+        address_set_addrs = collections.OrderedDict()
         with self._nb_ovn.transaction(check_error=True) as txn:
-            if not ovn_port_info.dhcpv4_options:
-                dhcpv4_options = []
-            elif 'cmd' in ovn_port_info.dhcpv4_options:
-                dhcpv4_options = txn.add(ovn_port_info.dhcpv4_options['cmd'])
-            else:
-                dhcpv4_options = [ovn_port_info.dhcpv4_options['uuid']]
-            if not ovn_port_info.dhcpv6_options:
-                dhcpv6_options = []
-            elif 'cmd' in ovn_port_info.dhcpv6_options:
-                dhcpv6_options = txn.add(ovn_port_info.dhcpv6_options['cmd'])
-            else:
-                dhcpv6_options = [ovn_port_info.dhcpv6_options['uuid']]
-            # The lport_name *must* be neutron port['id'].  It must match the
-            # iface-id set in the Interfaces table of the Open_vSwitch
-            # database which nova sets to be the port ID.
-            txn.add(self._nb_ovn.create_lswitch_port(
-                    lport_name=port['id'],
-                    lswitch_name=lswitch_name,
-                    addresses=ovn_port_info.addresses,
-                    external_ids=external_ids,
-                    parent_name=ovn_port_info.parent_name,
-                    tag=ovn_port_info.tag,
-                    enabled=port.get('admin_state_up'),
-                    options=ovn_port_info.options,
-                    type=ovn_port_info.type,
-                    port_security=ovn_port_info.port_security,
-                    dhcpv4_options=dhcpv4_options,
-                    dhcpv6_options=dhcpv6_options))
-
-            acls_new = ovn_acl.add_acls(self._plugin, admin_context,
-                                        port, sg_cache, subnet_cache)
-            for acl in acls_new:
-                txn.add(self._nb_ovn.add_acl(**acl))
-
-            sg_ids = utils.get_lsp_security_groups(port)
-            if port.get('fixed_ips') and sg_ids:
-                addresses = ovn_acl.acl_port_ips(port)
-                # NOTE(rtheis): Fail port creation if the address set doesn't
-                # exist. This prevents ports from being created on any security
-                # groups out-of-sync between neutron and OVN.
-                for sg_id in sg_ids:
-                    for ip_version in addresses:
-                        if addresses[ip_version]:
-                            txn.add(self._nb_ovn.update_address_set(
-                                name=utils.ovn_addrset_name(sg_id, ip_version),
-                                addrs_add=addresses[ip_version],
-                                addrs_remove=None,
-                                if_exists=False))
+            for port, ovn_port_info in ports_info:
+                self._add_create_port_commands(txn, port, ovn_port_info)
+
+                acls_new = ovn_acl.add_acls(self._plugin, admin_context,
+                                            port, sg_cache, subnet_cache,
+                                            port_groups=port_groups)
+                for acl in acls_new:
+                    txn.add(self._nb_ovn.add_acl(**acl))
+
+                sg_ids = utils.get_lsp_security_groups(port)
+                if port_groups and sg_ids:
+                    for sg_id in sg_ids:
+                        port_group_ports.setdefault(
+                            utils.ovn_port_group_name(sg_id), []).append(
+                                port['id'])
+                    port_group_ports.setdefault(
+                        ovn_const.OVN_DROP_PORT_GROUP_NAME, []).append(
+                            port['id'])
+                if port.get('fixed_ips') and sg_ids:
+                    addresses = ovn_acl.acl_port_ips(port)
+                    for sg_id in sg_ids:
+                        for ip_version in addresses:
+                            if addresses[ip_version]:
+                                address_set_addrs.setdefault(
+                                    utils.ovn_addrset_name(sg_id, ip_version),
+                                    []).extend(addresses[ip_version])
+
+            # NOTE: The missing port groups were created above, fail adding
+            # the ports if the port group was deleted since, like for
+            # address sets, so that ports aren't attached to security groups
+            # out-of-sync between neutron and OVN.
+            for pg_name, port_ids in port_group_ports.items():
+                txn.add(self._nb_ovn.update_port_group_ports(
+                    pg_name, lports_add=port_ids, if_exists=False))
+            # NOTE(rtheis): Fail port creation if the address set doesn't
+            # exist. This prevents ports from being created on any security
+            # groups out-of-sync between neutron and OVN.
+            for addrset_name, addrs in address_set_addrs.items():
+                txn.add(self._nb_ovn.update_address_set(
+                    name=addrset_name,
+                    addrs_add=addrs,
+                    addrs_remove=None,
+                    if_exists=False))
+
+    def _add_create_port_commands(self, txn, port, ovn_port_info):
+        external_ids = {ovn_const.OVN_PORT_NAME_EXT_ID_KEY: port['name']}
+        if not ovn_port_info.dhcpv4_options:
+            dhcpv4_options = []
+        elif 'cmd' in ovn_port_info.dhcpv4_options:
+            dhcpv4_options = txn.add(ovn_port_info.dhcpv4_options['cmd'])
+        else:
+            dhcpv4_options = [ovn_port_info.dhcpv4_options['uuid']]
+        if not ovn_port_info.dhcpv6_options:
+            dhcpv6_options = []
+        elif 'cmd' in ovn_port_info.dhcpv6_options:
+            dhcpv6_options = txn.add(ovn_port_info.dhcpv6_options['cmd'])
+        else:
+            dhcpv6_options = [ovn_port_info.dhcpv6_options['uuid']]
+        # The lport_name *must* be neutron port['id'].  It must match the
+        # iface-id set in the Interfaces table of the Open_vSwitch
+        # database which nova sets to be the port ID.
+        txn.add(self._nb_ovn.create_lswitch_port(
+                lport_name=port['id'],
+                lswitch_name=utils.ovn_name(port['network_id']),
+                addresses=ovn_port_info.addresses,
+                external_ids=external_ids,
+                parent_name=ovn_port_info.parent_name,
+                tag=ovn_port_info.tag,
+                enabled=port.get('admin_state_up'),
+                options=ovn_port_info.options,
+                type=ovn_port_info.type,
+                port_security=ovn_port_info.port_security,
+                dhcpv4_options=dhcpv4_options,
+                dhcpv6_options=dhcpv6_options))
 
     def update_port_precommit(self, context):
         """Update resources of a port.
@@ -762,6 +973,10 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         """
         port = context.current
         original_port = context.original
+        if not utils.is_ovn_port_changed(port, original_port):
+            LOG.debug('Skipping the OVN update of port %s, none of its '
+                      'attributes used by OVN changed', port['id'])
+            return
         self.update_port(port, original_port)
 
     def update_port(self, port, original_port, qos_options=None):
@@ -772,8 +987,20 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         external_ids = {
             ovn_const.OVN_PORT_NAME_EXT_ID_KEY: port['name']}
         admin_context = n_context.get_admin_context()
-        sg_cache = {}
-        subnet_cache = {}
+        sg_cache, subnet_cache = ovn_acl.get_acl_caches()
+
+        # Determine if security groups or fixed IPs are updated.
+        old_sg_ids = set(utils.get_lsp_security_groups(original_port))
+        new_sg_ids = set(utils.get_lsp_security_groups(port))
+        detached_sg_ids = old_sg_ids - new_sg_ids
+        attached_sg_ids = new_sg_ids - old_sg_ids
+        is_fixed_ips_updated = \
+            original_port.get('fixed_ips') != port.get('fixed_ips')
+        is_acls_updated = (detached_sg_ids or attached_sg_ids or
+                           is_fixed_ips_updated)
+        port_groups = self._nb_ovn.is_port_groups_supported()
+        if port_groups and is_acls_updated and new_sg_ids:
+            self._create_missing_port_groups(admin_context, new_sg_ids)
 
         with self._nb_ovn.transaction(check_error=True) as txn:
             columns_dict = {}
@@ -814,16 +1041,21 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
                     if_exists=False,
                     **columns_dict))
 
-            # Determine if security groups or fixed IPs are updated.
-            old_sg_ids = set(utils.get_lsp_security_groups(original_port))
-            new_sg_ids = set(utils.get_lsp_security_groups(port))
-            detached_sg_ids = old_sg_ids - new_sg_ids
-            attached_sg_ids = new_sg_ids - old_sg_ids
-            is_fixed_ips_updated = \
-                original_port.get('fixed_ips') != port.get('fixed_ips')
+            # Refresh the port groups the port belongs to. The ACLs of the
+            # port are compared below with the ones of the port groups mode,
+            # which drops its own security group ACLs, so the port is added
+            # to the port groups of all its security groups: it may not be
+            # in them yet if it was created before port groups were enabled.
+            if port_groups and is_acls_updated:
+                self._update_port_groups_ports(
+                    txn, port['id'],
+                    sg_ids_add=new_sg_ids,
+                    sg_ids_del=detached_sg_ids,
+                    add_to_drop=bool(new_sg_ids),
+                    del_from_drop=bool(old_sg_ids and not new_sg_ids))
 
             # Refresh ACLs for changed security groups or fixed IPs.
-            if detached_sg_ids or attached_sg_ids or is_fixed_ips_updated:
+            if is_acls_updated:
                 # Note that update_acls will compare the port's ACLs to
                 # ensure only the necessary ACLs are added and deleted
                 # on the transaction.
@@ -831,7 +1063,8 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
                                             admin_context,
                                             port,
                                             sg_cache,
-                                            subnet_cache)
+                                            subnet_cache,
+                                            port_groups=port_groups)
                 txn.add(self._nb_ovn.update_acls([port['network_id']],
                                                  [port],
                                                  {port['id']: acls_new},
@@ -878,6 +1111,66 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
                                         addrs_add=addr_add,
                                         addrs_remove=addr_remove))
 
+    def _create_missing_port_groups(self, admin_context, sg_ids):
+        """Create the port groups of security groups missing from OVN
+
+        The port groups of the security groups created before port groups
+        were enabled, and the drop port group, are created by the first
+        port joining them rather than failing the port until a repair sync
+        creates them. The ports of the security group which aren't in its
+        port group keep their own ACLs, which are still updated when the
+        rules of the security group change.
+        """
+        port_groups = collections.OrderedDict()
+        if self._nb_ovn.get_port_group(
+                ovn_const.OVN_DROP_PORT_GROUP_NAME) is None:
+            port_groups[ovn_const.OVN_DROP_PORT_GROUP_NAME] = {
+                'acls': ovn_acl.drop_all_ip_traffic_for_port_group()}
+        for sg_id in sg_ids:
+            pg_name = utils.ovn_port_group_name(sg_id)
+            if self._nb_ovn.get_port_group(pg_name) is not None:
+                continue
+            sg = self._plugin.get_security_group(admin_context, sg_id)
+            port_groups[pg_name] = {
+                'acls': ovn_acl.add_acls_for_port_group(sg),
+                'external_ids': {ovn_const.OVN_SG_EXT_ID_KEY: sg_id}}
+        if not port_groups:
+            return
+
+        try:
+            with self._nb_ovn.transaction(check_error=True) as txn:
+                for pg_name, columns in port_groups.items():
+                    txn.add(self._nb_ovn.create_port_group(pg_name,
+                                                           **columns))
+        except RuntimeError:
+            # Port groups are indexed by name, the transaction fails when
+            # another worker created the same port groups concurrently.
+            if any(self._nb_ovn.get_port_group(pg_name) is None
+                   for pg_name in port_groups):
+                raise
+
+    def _update_port_groups_ports(self, txn, port_id, sg_ids_add=(),
+                                  sg_ids_del=(), add_to_drop=False,
+                                  del_from_drop=False):
+        # NOTE: The missing port groups are created before, fail adding the
+        # port if the port group was deleted since, like for address sets,
+        # so that ports aren't attached to security groups out-of-sync
+        # between neutron and OVN.
+        for sg_id in sg_ids_add:
+            txn.add(self._nb_ovn.update_port_group_ports(
+                utils.ovn_port_group_name(sg_id), lports_add=[port_id],
+                if_exists=False))
+        for sg_id in sg_ids_del:
+            txn.add(self._nb_ovn.update_port_group_ports(
+                utils.ovn_port_group_name(sg_id), lports_del=[port_id]))
+        if add_to_drop:
+            txn.add(self._nb_ovn.update_port_group_ports(
+                ovn_const.OVN_DROP_PORT_GROUP_NAME, lports_add=[port_id],
+                if_exists=False))
+        if del_from_drop:
+            txn.add(self._nb_ovn.update_port_group_ports(
+                ovn_const.OVN_DROP_PORT_GROUP_NAME, lports_del=[port_id]))
+
     def _get_subnet_dhcp_options_for_port(self, port, ip_version):
         """Returns the subnet dhcp options for the port.
 
@@ -961,6 +1254,8 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         deleted.
         """
         port = context.current
+        # NOTE: The ports of port groups are weak references, deleting the
+        # logical switch port also removes it from its port groups.
         with self._nb_ovn.transaction(check_error=True) as txn:
             txn.add(self._nb_ovn.delete_lswitch_port(port['id'],
                     utils.ovn_name(port['network_id'])))
@@ -1133,6 +1428,81 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
             LOG.debug("Port not found during OVN status down report: %s",
                       port_id)
 
+    def set_port_statuses(self, up_port_ids=(), down_port_ids=()):
+        """Apply the statuses reported by OVN for several ports at once
+
+        This is the bulk version of set_port_status_up() and
+        set_port_status_down(), sharing one admin context and fetching the
+        ports going down with a single query. As with the events of the
+        ports, a port failing to be updated doesn't prevent the others from
+        being updated.
+        """
+        LOG.info(_LI("OVN reports status up for %(up)d ports and down for "
+                     "%(down)d ports"),
+                 {'up': len(up_port_ids), 'down': len(down_port_ids)})
+        admin_context = n_context.get_admin_context()
+        for port_id in up_port_ids:
+            LOG.debug("OVN reports status up for port: %s", port_id)
+            try:
+                provisioning_blocks.provisioning_complete(
+                    admin_context,
+                    port_id,
+                    resources.PORT,
+                    provisioning_blocks.L2_AGENT_ENTITY)
+            except (os_db_exc.DBReferenceError, n_exc.PortNotFound):
+                LOG.debug("Port not found during OVN status up report: %s",
+                          port_id)
+            except Exception:
+                LOG.exception(_LE('Failed to set the status of port %s up'),
+                              port_id)
+
+        if not down_port_ids:
+            return
+        ports = self._plugin.get_ports(
+            admin_context, filters={'id': list(down_port_ids)},
+            fields=['id', 'status'])
+        for port in ports:
+            LOG.debug("OVN reports status down for port: %s", port['id'])
+            try:
+                self._insert_port_provisioning_block(admin_context, port)
+                if port['status'] != const.PORT_STATUS_DOWN:
+                    self._plugin.update_port_status(admin_context,
+                                                    port['id'],
+                                                    const.PORT_STATUS_DOWN)
+            except (os_db_exc.DBReferenceError, n_exc.PortNotFound):
+                LOG.debug("Port not found during OVN status down report: %s",
+                          port['id'])
+            except Exception:
+                LOG.exception(_LE('Failed to set the status of port %s '
+                                  'down'), port['id'])
+
+    def sync_port_statuses(self, port_statuses):
+        """Reconcile the status of the Neutron ports with their OVN status
+
+        Only the ports whose Neutron status differs from their OVN status
+        are updated.
+
+        :param port_statuses: Whether each port is up in OVN, by port id
+        """
+        admin_context = n_context.get_admin_context()
+        up_port_ids = []
+        down_port_ids = []
+        port_ids = list(port_statuses)
+        for i in range(0, len(port_ids), PORT_STATUS_SYNC_CHUNK_SIZE):
+            ports = self._plugin.get_ports(
+                admin_context,
+                filters={'id': port_ids[i:i + PORT_STATUS_SYNC_CHUNK_SIZE]},
+                fields=['id', 'status'])
+            for port in ports:
+                if port_statuses[port['id']]:
+                    if port['status'] != const.PORT_STATUS_ACTIVE:
+                        up_port_ids.append(port['id'])
+                elif port['status'] != const.PORT_STATUS_DOWN:
+                    down_port_ids.append(port['id'])
+        if up_port_ids or down_port_ids:
+            self.set_port_statuses(up_port_ids=up_port_ids,
+                                   down_port_ids=down_port_ids)
+
     def update_segment_host_mapping(self, host, phy_nets):
         """Update SegmentHostMapping in DB"""
         if not host:
@@ -11,6 +11,7 @@
 #    under the License.
 
 import abc
+import collections
 
 from datetime import datetime
 from eventlet import greenthread
@@ -38,6 +39,9 @@ SYNC_MODE_OFF = 'off'
 SYNC_MODE_LOG = 'log'
 SYNC_MODE_REPAIR = 'repair'
 
+# Number of missing ports created in OVN per transaction
+PORT_CREATE_CHUNK_SIZE = 100
+
 
 @six.add_metaclass(abc.ABCMeta)
 class OvnDbSynchronizer(object):
@@ -76,6 +80,8 @@ class OvnNbSynchronizer(OvnDbSynchronizer):
         ctx = context.get_admin_context()
         self.sync_address_sets(ctx)
         self.sync_networks_ports_and_dhcp_opts(ctx)
+        if self.ovn_api.is_port_groups_supported():
+            self.sync_port_groups(ctx)
         self.sync_acls(ctx)
         self.sync_routers_and_rports(ctx)
 
@@ -102,6 +108,15 @@ class OvnNbSynchronizer(OvnDbSynchronizer):
         ovn_port_info = self.ovn_driver.get_ovn_port_options(port)
         self.ovn_driver.create_port_in_ovn(port, ovn_port_info)
 
+    def _create_ports_in_ovn(self, ctx, ports):
+        with self.ovn_api.transaction(check_error=True) as txn:
+            for port in ports:
+                txn.add(self.ovn_api.delete_acl(
+                    utils.ovn_name(port['network_id']), port['id']))
+        self.ovn_driver.create_ports_in_ovn(
+            [(port, self.ovn_driver.get_ovn_port_options(port))
+             for port in ports])
+
     def remove_common_acls(self, neutron_acls, nb_acls):
         """Take out common acls of the two acl dictionaries.
 
@@ -111,11 +126,27 @@ class OvnNbSynchronizer(OvnDbSynchronizer):
         @type    nb_acls: {}
         @return: Nothing, original dictionary modified
         """
-        for port in neutron_acls.keys():
-            for acl in list(neutron_acls[port]):
-                if port in nb_acls and acl in nb_acls[port]:
-                    neutron_acls[port].remove(acl)
-                    nb_acls[port].remove(acl)
+        for port, acls in neutron_acls.items():
+            if port not in nb_acls:
+                continue
+            neutron_keys = collections.Counter(
+                acl_utils.acl_key(acl) for acl in acls)
+            nb_keys = collections.Counter(
+                acl_utils.acl_key(acl) for acl in nb_acls[port])
+            common_keys = neutron_keys & nb_keys
+            if not common_keys:
+                continue
+            for port_acls in (acls, nb_acls[port]):
+                # Take out as many occurrences of an ACL as both sides have
+                keys_to_remove = common_keys.copy()
+                remaining_acls = []
+                for acl in port_acls:
+                    key = acl_utils.acl_key(acl)
+                    if keys_to_remove[key] > 0:
+                        keys_to_remove[key] -= 1
+                    else:
+                        remaining_acls.append(acl)
+                port_acls[:] = remaining_acls
 
     def compute_address_set_difference(self, neutron_sgs, nb_sgs):
         neutron_sgs_name_set = set(neutron_sgs.keys())
@@ -218,6 +249,100 @@ class OvnNbSynchronizer(OvnDbSynchronizer):
             LOG.debug('Address-Set-SYNC: transaction finished @ %s' %
                       str(datetime.now()))
 
+    def sync_port_groups(self, ctx):
+        """Sync Port Groups between neutron and NB.
+
+        Each security group maps to a port group holding the ACLs of its
+        rules and the ports of the security group. All the ports with
+        security groups also belong to the drop port group.
+
+        @param ctx: neutron_lib.context
+        @type  ctx: object of type neutron_lib.context.Context
+        @return: Nothing
+        """
+        LOG.debug('Port-Group-SYNC: started @ %s' % str(datetime.now()))
+
+        neutron_pgs = {}
+        drop_pg = {'ports': set(),
+                   'acls': acl_utils.drop_all_ip_traffic_for_port_group(),
+                   'external_ids': {}}
+        neutron_pgs[const.OVN_DROP_PORT_GROUP_NAME] = drop_pg
+        for sg in self.core_plugin.get_security_groups(ctx):
+            neutron_pgs[utils.ovn_port_group_name(sg['id'])] = {
+                'ports': set(),
+                'acls': acl_utils.add_acls_for_port_group(sg),
+                'external_ids': {const.OVN_SG_EXT_ID_KEY: sg['id']}}
+        for port in self.core_plugin.get_ports(ctx):
+            sg_ids = utils.get_lsp_security_groups(port)
+            if not sg_ids:
+                continue
+            drop_pg['ports'].add(port['id'])
+            for sg_id in sg_ids:
+                pg = neutron_pgs.get(utils.ovn_port_group_name(sg_id))
+                if pg is not None:
+                    pg['ports'].add(port['id'])
+
+        nb_pgs = self.ovn_api.get_port_groups()
+
+        pgs_to_add = set(neutron_pgs) - set(nb_pgs)
+        pgs_to_delete = set(nb_pgs) - set(neutron_pgs)
+        pgs_to_update = {}
+        for name in set(neutron_pgs) & set(nb_pgs):
+            neutron_pg = neutron_pgs[name]
+            nb_pg = nb_pgs[name]
+            nb_ports = set(nb_pg['ports'])
+            neutron_acls = dict((acl_utils.acl_key(acl), acl)
+                                for acl in neutron_pg['acls'])
+            nb_acls = dict((acl_utils.acl_key(acl), acl)
+                           for acl in nb_pg['acls'])
+            update = {
+                'lports_add': list(neutron_pg['ports'] - nb_ports),
+                'lports_del': list(nb_ports - neutron_pg['ports']),
+                'acls_add': [acl for key, acl in neutron_acls.items()
+                             if key not in nb_acls],
+                'acls_del': [acl for key, acl in nb_acls.items()
+                             if key not in neutron_acls]}
+            if any(update.values()):
+                pgs_to_update[name] = update
+
+        if pgs_to_add or pgs_to_delete or pgs_to_update:
+            LOG.warning(_LW('Port_Groups added %(add)d, removed %(remove)d, '
+                            'updated %(update)d'),
+                        {'add': len(pgs_to_add),
+                         'remove': len(pgs_to_delete),
+                         'update': len(pgs_to_update)})
+
+        if self.mode == SYNC_MODE_REPAIR:
+            LOG.debug('Port-Group-SYNC: transaction started @ %s' %
+                      str(datetime.now()))
+            # NOTE: The ports whose logical switch port is missing from the
+            # NB DB are skipped rather than failing the whole transaction,
+            # they are added to their port groups when they are created.
+            with self.ovn_api.transaction(check_error=True) as txn:
+                for name in pgs_to_add:
+                    pg = neutron_pgs[name]
+                    txn.add(self.ovn_api.create_port_group(
+                        name, acls=pg['acls'],
+                        external_ids=pg['external_ids']))
+                    if pg['ports']:
+                        txn.add(self.ovn_api.update_port_group_ports(
+                            name, lports_add=list(pg['ports']),
+                            skip_missing_lports=True))
+                for name, update in pgs_to_update.items():
+                    if update['lports_add'] or update['lports_del']:
+                        txn.add(self.ovn_api.update_port_group_ports(
+                            name, lports_add=update['lports_add'],
+                            lports_del=update['lports_del'],
+                            skip_missing_lports=True))
+                    if update['acls_add'] or update['acls_del']:
+                        txn.add(self.ovn_api.update_port_group_acls(
+                            name, acls_add=update['acls_add'],
+                            acls_del=update['acls_del']))
+                for name in pgs_to_delete:
+                    txn.add(self.ovn_api.delete_port_group(name))
+            LOG.debug('Port-Group-SYNC: transaction finished @ %s' %
+                      str(datetime.now()))
+
     def sync_acls(self, ctx):
         """Sync ACLs between neutron and NB.
 
@@ -238,6 +363,9 @@ class OvnNbSynchronizer(OvnDbSynchronizer):
         for port in self.core_plugin.get_ports(ctx):
             db_ports[port['id']] = port
 
+        # The port groups of the security groups hold the ACLs of their
+        # rules, ports are only left with their DHCP ACLs.
+        port_groups = self.ovn_api.is_port_groups_supported()
         sg_cache = {}
         subnet_cache = {}
         neutron_acls = {}
@@ -247,7 +375,8 @@ class OvnNbSynchronizer(OvnDbSynchronizer):
                                               ctx,
                                               port,
                                               sg_cache,
-                                              subnet_cache)
+                                              subnet_cache,
+                                              port_groups=port_groups)
                 if port_id in neutron_acls:
                     neutron_acls[port_id].extend(acl_list)
                 else:
@@ -282,7 +411,7 @@ class OvnNbSynchronizer(OvnDbSynchronizer):
                                     'Neutron for port %s'), lportr)
                     txn.add(self.ovn_api.update_acls(
                         [lswitchr],
-                        [lportr],
+                        [{'id': lportr, 'network_id': lswitchr}],
                         aclr_dict,
                         need_compare=False,
                         is_add_acl=False
@@ -751,27 +880,42 @@ class OvnNbSynchronizer(OvnDbSynchronizer):
         self._sync_subnet_dhcp_options(
             ctx, db_network_cache, ovn_all_dhcp_options['subnets'])
 
+        create_ports_list = []
         for port_id, port in db_ports.items():
             LOG.warning(_LW("Port found in Neutron but not in OVN "
                             "DB, port_id=%s"), port['id'])
             if self.mode == SYNC_MODE_REPAIR:
-                try:
-                    LOG.debug('Creating the port %s in OVN NB DB',
-                              port['id'])
-                    self._create_port_in_ovn(ctx, port)
-                    if port_id in ovn_all_dhcp_options['ports_v4']:
-                        _, lsp_opts = utils.get_lsp_dhcp_opts(
-                            port, constants.IP_VERSION_4)
-                        if lsp_opts:
-                            ovn_all_dhcp_options['ports_v4'].pop(port_id)
-                    if port_id in ovn_all_dhcp_options['ports_v6']:
-                        _, lsp_opts = utils.get_lsp_dhcp_opts(
-                            port, constants.IP_VERSION_6)
-                        if lsp_opts:
-                            ovn_all_dhcp_options['ports_v6'].pop(port_id)
-                except RuntimeError:
-                    LOG.warning(_LW("Create port in OVN NB failed for"
-                                    " port %s"), port['id'])
+                create_ports_list.append(port)
+
+        for i in range(0, len(create_ports_list), PORT_CREATE_CHUNK_SIZE):
+            ports = create_ports_list[i:i + PORT_CREATE_CHUNK_SIZE]
+            try:
+                LOG.debug('Creating the ports %s in OVN NB DB',
+                          [port['id'] for port in ports])
+                self._create_ports_in_ovn(ctx, ports)
+                created_ports = ports
+            except RuntimeError:
+                # Create the ports one by one to skip only the failing ones
+                created_ports = []
+                for port in ports:
+                    try:
+                        self._create_port_in_ovn(ctx, port)
+                        created_ports.append(port)
+                    except RuntimeError:
+                        LOG.warning(_LW("Create port in OVN NB failed for"
+                                        " port %s"), port['id'])
+
+            for port in created_ports:
+                if port['id'] in ovn_all_dhcp_options['ports_v4']:
+                    _, lsp_opts = utils.get_lsp_dhcp_opts(
+                        port, constants.IP_VERSION_4)
+                    if lsp_opts:
+                        ovn_all_dhcp_options['ports_v4'].pop(port['id'])
+                if port['id'] in ovn_all_dhcp_options['ports_v6']:
+                    _, lsp_opts = utils.get_lsp_dhcp_opts(
+                        port, constants.IP_VERSION_6)
+                    if lsp_opts:
+                        ovn_all_dhcp_options['ports_v6'].pop(port['id'])
 
         with self.ovn_api.transaction(check_error=True) as txn:
             for lswitch in del_lswitchs_list:
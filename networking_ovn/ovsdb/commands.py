@@ -10,10 +10,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+
 from neutron.agent.ovsdb.native import commands
 from neutron.agent.ovsdb.native import idlutils
 
 from networking_ovn._i18n import _
+from networking_ovn.common import acl as ovn_acl
 from networking_ovn.common import utils
 
 
@@ -35,6 +38,19 @@ def _updatevalues_in_list(row, column, new_values=None, old_values=None):
         row.delvalue(column, old_value)
 
 
+def get_acl_values(acl):
+    # Get the columns of an ACL row that are used to compare it with the
+    # ACLs built by networking_ovn.common.acl.
+    values = {}
+    for col in ('priority', 'direction', 'action', 'match', 'log',
+                'external_ids'):
+        try:
+            values[col] = getattr(acl, col)
+        except AttributeError:
+            pass
+    return values
+
+
 def get_lsp_dhcp_options_uuids(lsp, lsp_name):
     # Get dhcpv4_options and dhcpv6_options uuids from Logical_Switch_Port,
     # which are references of port dhcp options in DHCP_Options table.
@@ -59,8 +75,7 @@ class AddLSwitchCommand(commands.BaseCommand):
 
     def run_idl(self, txn):
         if self.may_exist:
-            lswitch = idlutils.row_by_value(self.api.idl, 'Logical_Switch',
-                                            'name', self.name, None)
+            lswitch = self.api.lookup('Logical_Switch', self.name, None)
             if lswitch:
                 return
         row = txn.insert(self.api._tables['Logical_Switch'])
@@ -81,8 +96,7 @@ class DelLSwitchCommand(commands.BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lswitch = idlutils.row_by_value(self.api.idl, 'Logical_Switch',
-                                            'name', self.name)
+            lswitch = self.api.lookup('Logical_Switch', self.name)
         except idlutils.RowNotFound:
             if self.if_exists:
                 return
@@ -102,8 +116,7 @@ class LSwitchSetExternalIdCommand(commands.BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lswitch = idlutils.row_by_value(self.api.idl, 'Logical_Switch',
-                                            'name', self.name)
+            lswitch = self.api.lookup('Logical_Switch', self.name)
 
         except idlutils.RowNotFound:
             if self.if_exists:
@@ -128,15 +141,12 @@ class AddLSwitchPortCommand(commands.BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lswitch = idlutils.row_by_value(self.api.idl, 'Logical_Switch',
-                                            'name', self.lswitch)
+            lswitch = self.api.lookup('Logical_Switch', self.lswitch)
         except idlutils.RowNotFound:
             msg = _("Logical Switch %s does not exist") % self.lswitch
             raise RuntimeError(msg)
         if self.may_exist:
-            port = idlutils.row_by_value(self.api.idl,
-                                         'Logical_Switch_Port', 'name',
-                                         self.lport, None)
+            port = self.api.lookup('Logical_Switch_Port', self.lport, None)
             if port:
                 return
 
@@ -171,8 +181,7 @@ class SetLSwitchPortCommand(commands.BaseCommand):
 
     def run_idl(self, txn):
         try:
-            port = idlutils.row_by_value(self.api.idl, 'Logical_Switch_Port',
-                                         'name', self.lport)
+            port = self.api.lookup('Logical_Switch_Port', self.lport)
         except idlutils.RowNotFound:
             if self.if_exists:
                 return
@@ -217,10 +226,8 @@ class DelLSwitchPortCommand(commands.BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lport = idlutils.row_by_value(self.api.idl, 'Logical_Switch_Port',
-                                          'name', self.lport)
-            lswitch = idlutils.row_by_value(self.api.idl, 'Logical_Switch',
-                                            'name', self.lswitch)
+            lport = self.api.lookup('Logical_Switch_Port', self.lport)
+            lswitch = self.api.lookup('Logical_Switch', self.lswitch)
         except idlutils.RowNotFound:
             if self.if_exists:
                 return
@@ -246,8 +253,7 @@ class AddLRouterCommand(commands.BaseCommand):
 
     def run_idl(self, txn):
         if self.may_exist:
-            lrouter = idlutils.row_by_value(self.api.idl, 'Logical_Router',
-                                            'name', self.name, None)
+            lrouter = self.api.lookup('Logical_Router', self.name, None)
             if lrouter:
                 return
 
@@ -266,8 +272,7 @@ class UpdateLRouterCommand(commands.BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lrouter = idlutils.row_by_value(self.api.idl, 'Logical_Router',
-                                            'name', self.name, None)
+            lrouter = self.api.lookup('Logical_Router', self.name, None)
         except idlutils.RowNotFound:
             if self.if_exists:
                 return
@@ -288,8 +293,7 @@ class DelLRouterCommand(commands.BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lrouter = idlutils.row_by_value(self.api.idl, 'Logical_Router',
-                                            'name', self.name)
+            lrouter = self.api.lookup('Logical_Router', self.name)
         except idlutils.RowNotFound:
             if self.if_exists:
                 return
@@ -309,14 +313,12 @@ class AddLRouterPortCommand(commands.BaseCommand):
     def run_idl(self, txn):
 
         try:
-            lrouter = idlutils.row_by_value(self.api.idl, 'Logical_Router',
-                                            'name', self.lrouter)
+            lrouter = self.api.lookup('Logical_Router', self.lrouter)
         except idlutils.RowNotFound:
             msg = _("Logical Router %s does not exist") % self.lrouter
             raise RuntimeError(msg)
         try:
-            idlutils.row_by_value(self.api.idl, 'Logical_Router_Port',
-                                  'name', self.name)
+            self.api.lookup('Logical_Router_Port', self.name)
             # The LRP entry with certain name has already exist, raise an
             # exception to notice caller. It's caller's responsibility to
             # call UpdateLRouterPortCommand to get LRP entry processed
@@ -341,9 +343,7 @@ class UpdateLRouterPortCommand(commands.BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lrouter_port = idlutils.row_by_value(self.api.idl,
-                                                 'Logical_Router_Port',
-                                                 'name', self.name)
+            lrouter_port = self.api.lookup('Logical_Router_Port', self.name)
         except idlutils.RowNotFound:
             if self.if_exists:
                 return
@@ -365,17 +365,14 @@ class DelLRouterPortCommand(commands.BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lrouter_port = idlutils.row_by_value(self.api.idl,
-                                                 'Logical_Router_Port',
-                                                 'name', self.name)
+            lrouter_port = self.api.lookup('Logical_Router_Port', self.name)
         except idlutils.RowNotFound:
             if self.if_exists:
                 return
             msg = _("Logical Router Port %s does not exist") % self.name
             raise RuntimeError(msg)
         try:
-            lrouter = idlutils.row_by_value(self.api.idl, 'Logical_Router',
-                                            'name', self.lrouter)
+            lrouter = self.api.lookup('Logical_Router', self.lrouter)
         except idlutils.RowNotFound:
             msg = _("Logical Router %s does not exist") % self.lrouter
             raise RuntimeError(msg)
@@ -391,8 +388,7 @@ class SetLRouterPortInLSwitchPortCommand(commands.BaseCommand):
 
     def run_idl(self, txn):
         try:
-            port = idlutils.row_by_value(self.api.idl, 'Logical_Switch_Port',
-                                         'name', self.lswitch_port)
+            port = self.api.lookup('Logical_Switch_Port', self.lswitch_port)
         except idlutils.RowNotFound:
             msg = _("Logical Switch Port %s does not "
                     "exist") % self.lswitch_port
@@ -413,8 +409,7 @@ class AddACLCommand(commands.BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lswitch = idlutils.row_by_value(self.api.idl, 'Logical_Switch',
-                                            'name', self.lswitch)
+            lswitch = self.api.lookup('Logical_Switch', self.lswitch)
         except idlutils.RowNotFound:
             msg = _("Logical Switch %s does not exist") % self.lswitch
             raise RuntimeError(msg)
@@ -435,20 +430,14 @@ class DelACLCommand(commands.BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lswitch = idlutils.row_by_value(self.api.idl, 'Logical_Switch',
-                                            'name', self.lswitch)
+            lswitch = self.api.lookup('Logical_Switch', self.lswitch)
         except idlutils.RowNotFound:
             if self.if_exists:
                 return
             msg = _("Logical Switch %s does not exist") % self.lswitch
             raise RuntimeError(msg)
 
-        acls_to_del = []
-        acls = getattr(lswitch, 'acls', [])
-        for acl in acls:
-            ext_ids = getattr(acl, 'external_ids', {})
-            if ext_ids.get('neutron:lport') == self.lport:
-                acls_to_del.append(acl)
+        acls_to_del = self.api.get_acls_for_lport(lswitch, self.lport)
         for acl in acls_to_del:
             acl.delete()
         _updatevalues_in_list(lswitch, 'acls', old_values=acls_to_del)
@@ -456,7 +445,7 @@ class DelACLCommand(commands.BaseCommand):
 
 class UpdateACLsCommand(commands.BaseCommand):
     def __init__(self, api, lswitch_names, port_list, acl_new_values_dict,
-                 need_compare=True, is_add_acl=True):
+                 need_compare=True, is_add_acl=True, may_exist=False):
         """This command updates the acl list for the logical switches
 
         @param lswitch_names: List of Logical Switch Names
@@ -470,6 +459,9 @@ class UpdateACLsCommand(commands.BaseCommand):
         @type: Boolean.
         @is_add_acl: If updating is caused by acl adding action.
         @type: Boolean.
+        @may_exist: If the acls added without compare may already exist, in
+                    which case they are not added again.
+        @type: Boolean.
 
         """
         super(UpdateACLsCommand, self).__init__(api)
@@ -478,20 +470,7 @@ class UpdateACLsCommand(commands.BaseCommand):
         self.acl_new_values_dict = acl_new_values_dict
         self.need_compare = need_compare
         self.is_add_acl = is_add_acl
-
-    def _acl_list_sub(self, acl_list1, acl_list2):
-        """Compute the elements in acl_list1 but not in acl_list2.
-
-        If acl_list1 and acl_list2 were sets, the result of this routine
-        could be thought of as acl_list1 - acl_list2. Note that acl_list1
-        and acl_list2 cannot actually be sets as they contain dictionary
-        items i.e. set([{'a':1}) doesn't work.
-        """
-        acl_diff = []
-        for acl in acl_list1:
-            if acl not in acl_list2:
-                acl_diff.append(acl)
-        return acl_diff
+        self.may_exist = may_exist
 
     def _compute_acl_differences(self, port_list, acl_old_values_dict,
                                  acl_new_values_dict, acl_obj_dict):
@@ -503,8 +482,8 @@ class UpdateACLsCommand(commands.BaseCommand):
                                     by port id
         @param acl_new_values_dict: Dictionary of new acl values indexed
                                     by port id
-        @param acl_obj_dict: Dictionary of acl objects indexed by the acl
-                             value in string format.
+        @param acl_obj_dict: Dictionary of acl objects indexed by the
+                             AclKey of the acl value.
         @var acl_del_objs_dict: Dictionary of acl objects to be deleted
                                 indexed by the lswitch.
         @var acl_add_values_dict: Dictionary of acl values to be added
@@ -519,66 +498,86 @@ class UpdateACLsCommand(commands.BaseCommand):
             lswitch_name = port['network_id']
             acls_old = acl_old_values_dict.get(port['id'], [])
             acls_new = acl_new_values_dict.get(port['id'], [])
-            acls_del = self._acl_list_sub(acls_old, acls_new)
-            acls_add = self._acl_list_sub(acls_new, acls_old)
+            acls_old_keys = [ovn_acl.acl_key(acl) for acl in acls_old]
+            acls_new_keys = [ovn_acl.acl_key(acl) for acl in acls_new]
+            acl_del_keys = set(acls_old_keys) - set(acls_new_keys)
+            acl_add_keys = set(acls_new_keys) - set(acls_old_keys)
             acl_del_objs = acl_del_objs_dict.setdefault(lswitch_name, [])
-            for acl in acls_del:
-                acl_del_objs.append(acl_obj_dict[str(acl)])
+            for key in acls_old_keys:
+                if key in acl_del_keys:
+                    acl_del_objs.append(acl_obj_dict[key])
             acl_add_values = acl_add_values_dict.setdefault(lswitch_name, [])
-            for acl in acls_add:
+            for acl, key in zip(acls_new, acls_new_keys):
+                if key not in acl_add_keys:
+                    continue
                 # Remove lport and lswitch columns
                 del acl['lswitch']
                 del acl['lport']
                 acl_add_values.append(acl)
         return acl_del_objs_dict, acl_add_values_dict
 
-    def _get_update_data_without_compare(self):
+    def _acl_exists(self, lswitch, port_id, acl_dict):
+        if lswitch is None:
+            return False
+        return any(getattr(acl, 'match') == acl_dict['match']
+                   for acl in self.api.get_acls_for_lport(lswitch, port_id))
+
+    def _get_update_data_without_compare(self, port_list):
         lswitch_ovsdb_dict = {}
         for switch_name in self.lswitch_names:
             switch_name = utils.ovn_name(switch_name)
-            lswitch = idlutils.row_by_value(self.api.idl, 'Logical_Switch',
-                                            'name', switch_name)
+            lswitch = self.api.lookup('Logical_Switch', switch_name)
             lswitch_ovsdb_dict[switch_name] = lswitch
         if self.is_add_acl:
             acl_add_values_dict = {}
-            for port in self.port_list:
+            for port in port_list:
                 switch_name = utils.ovn_name(port['network_id'])
                 if switch_name not in acl_add_values_dict:
                     acl_add_values_dict[switch_name] = []
-                if port['id'] in self.acl_new_values_dict:
-                    acl_add_values_dict[switch_name].append(
-                        self.acl_new_values_dict[port['id']])
+                acl_dict = self.acl_new_values_dict.get(port['id'])
+                if acl_dict is None:
+                    continue
+                if self.may_exist and self._acl_exists(
+                        lswitch_ovsdb_dict.get(switch_name), port['id'],
+                        acl_dict):
+                    continue
+                acl_add_values_dict[switch_name].append(acl_dict)
             acl_del_objs_dict = {}
         else:
             acl_add_values_dict = {}
             acl_del_objs_dict = {}
-            del_acl_matches = []
-            for acl_dict in self.acl_new_values_dict.values():
-                del_acl_matches.append(acl_dict['match'])
-            for switch_name, lswitch in lswitch_ovsdb_dict.items():
-                if switch_name not in acl_del_objs_dict:
-                    acl_del_objs_dict[switch_name] = []
-                acls = getattr(lswitch, 'acls', [])
-                for acl in acls:
-                    if getattr(acl, 'match') in del_acl_matches:
-                        acl_del_objs_dict[switch_name].append(acl)
+            for port in port_list:
+                acl_dict = self.acl_new_values_dict.get(port['id'])
+                switch_name = utils.ovn_name(port['network_id'])
+                lswitch = lswitch_ovsdb_dict.get(switch_name)
+                if acl_dict is None or lswitch is None:
+                    continue
+                # Only the ACLs of the port are looked at instead of all
+                # the ACLs of its logical switch.
+                acl_del_objs = acl_del_objs_dict.setdefault(switch_name, [])
+                for acl in self.api.get_acls_for_lport(lswitch, port['id']):
+                    if getattr(acl, 'match') == acl_dict['match']:
+                        acl_del_objs.append(acl)
         return lswitch_ovsdb_dict, acl_del_objs_dict, acl_add_values_dict
 
     def run_idl(self, txn):
+        # The port list may be an iterator and it is walked more than once
+        port_list = list(self.port_list)
 
         if self.need_compare:
-            # Get all relevant ACLs in 1 shot
+            # Get the ACLs of the ports being updated in 1 shot
             acl_values_dict, acl_obj_dict, lswitch_ovsdb_dict = \
-                self.api.get_acls_for_lswitches(self.lswitch_names)
+                self.api.get_acls_for_lswitches(self.lswitch_names,
+                                                ports=port_list)
 
             # Compute the difference between the new and old set of ACLs
             acl_del_objs_dict, acl_add_values_dict = \
                 self._compute_acl_differences(
-                    self.port_list, acl_values_dict,
+                    port_list, acl_values_dict,
                     self.acl_new_values_dict, acl_obj_dict)
         else:
             lswitch_ovsdb_dict, acl_del_objs_dict, acl_add_values_dict = \
-                self._get_update_data_without_compare()
+                self._get_update_data_without_compare(port_list)
 
         for lswitch_name, lswitch in lswitch_ovsdb_dict.items():
             acl_del_objs = acl_del_objs_dict.get(lswitch_name, [])
@@ -617,8 +616,7 @@ class AddStaticRouteCommand(commands.BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lrouter = idlutils.row_by_value(self.api.idl, 'Logical_Router',
-                                            'name', self.lrouter)
+            lrouter = self.api.lookup('Logical_Router', self.lrouter)
         except idlutils.RowNotFound:
             msg = _("Logical Router %s does not exist") % self.lrouter
             raise RuntimeError(msg)
@@ -639,8 +637,7 @@ class DelStaticRouteCommand(commands.BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lrouter = idlutils.row_by_value(self.api.idl, 'Logical_Router',
-                                            'name', self.lrouter)
+            lrouter = self.api.lookup('Logical_Router', self.lrouter)
         except idlutils.RowNotFound:
             if self.if_exists:
                 return
@@ -666,8 +663,7 @@ class AddAddrSetCommand(commands.BaseCommand):
 
     def run_idl(self, txn):
         if self.may_exist:
-            addrset = idlutils.row_by_value(self.api.idl, 'Address_Set',
-                                            'name', self.name, None)
+            addrset = self.api.lookup('Address_Set', self.name, None)
             if addrset:
                 return
         row = txn.insert(self.api._tables['Address_Set'])
@@ -684,8 +680,7 @@ class DelAddrSetCommand(commands.BaseCommand):
 
     def run_idl(self, txn):
         try:
-            addrset = idlutils.row_by_value(self.api.idl, 'Address_Set',
-                                            'name', self.name)
+            addrset = self.api.lookup('Address_Set', self.name)
         except idlutils.RowNotFound:
             if self.if_exists:
                 return
@@ -706,8 +701,7 @@ class UpdateAddrSetCommand(commands.BaseCommand):
 
     def run_idl(self, txn):
         try:
-            addrset = idlutils.row_by_value(self.api.idl, 'Address_Set',
-                                            'name', self.name)
+            addrset = self.api.lookup('Address_Set', self.name)
         except idlutils.RowNotFound:
             if self.if_exists:
                 return
@@ -721,6 +715,55 @@ class UpdateAddrSetCommand(commands.BaseCommand):
             old_values=self.addrs_remove)
 
 
+def coalesce_address_set_updates(cmds):
+    """Fold the updates of the same address set into a single command.
+
+    The addresses added and removed by all the UpdateAddrSetCommand of an
+    address set are folded into one net delta, run where the first of them
+    was. Updates aren't folded across the creation or deletion of the
+    address set.
+
+    :param cmds: The commands of a transaction, in order
+    :returns:    The list of commands to run
+    """
+    result = []
+    pending = {}
+    folded = []
+    for command in cmds:
+        if isinstance(command, (AddAddrSetCommand, DelAddrSetCommand)):
+            pending.pop(command.name, None)
+        elif isinstance(command, UpdateAddrSetCommand):
+            entry = pending.get(command.name)
+            if entry is None:
+                entry = {'index': len(result), 'command': command,
+                         'addrs': collections.OrderedDict(),
+                         'if_exists': command.if_exists, 'count': 0}
+                pending[command.name] = entry
+                folded.append(entry)
+                result.append(command)
+            entry['count'] += 1
+            entry['if_exists'] = entry['if_exists'] and command.if_exists
+            # The addresses are added before the ones removed are removed
+            for addr in command.addrs_add or []:
+                entry['addrs'][addr] = True
+            for addr in command.addrs_remove or []:
+                entry['addrs'][addr] = False
+            continue
+        result.append(command)
+
+    for entry in folded:
+        if entry['count'] == 1:
+            continue
+        addrs = entry['addrs']
+        command = entry['command']
+        result[entry['index']] = UpdateAddrSetCommand(
+            command.api, command.name,
+            [addr for addr, add in addrs.items() if add] or None,
+            [addr for addr, add in addrs.items() if not add] or None,
+            entry['if_exists'])
+    return result
+
+
 class UpdateAddrSetExtIdsCommand(commands.BaseCommand):
     def __init__(self, api, name, external_ids, if_exists):
         super(UpdateAddrSetExtIdsCommand, self).__init__(api)
@@ -730,8 +773,7 @@ class UpdateAddrSetExtIdsCommand(commands.BaseCommand):
 
     def run_idl(self, txn):
         try:
-            addrset = idlutils.row_by_value(self.api.idl, 'Address_Set',
-                                            'name', self.name)
+            addrset = self.api.lookup('Address_Set', self.name)
         except idlutils.RowNotFound:
             if self.if_exists:
                 return
@@ -746,6 +788,134 @@ class UpdateAddrSetExtIdsCommand(commands.BaseCommand):
         addrset.external_ids = addrset_external_ids
 
 
+class AddPortGroupCommand(commands.BaseCommand):
+    def __init__(self, api, name, may_exist, acls=None, **columns):
+        super(AddPortGroupCommand, self).__init__(api)
+        self.name = name
+        self.may_exist = may_exist
+        self.acls = acls or []
+        self.columns = columns
+
+    def run_idl(self, txn):
+        if self.may_exist:
+            port_group = self.api.lookup('Port_Group', self.name, None)
+            if port_group:
+                return
+        row = txn.insert(self.api._tables['Port_Group'])
+        row.name = self.name
+        for col, val in self.columns.items():
+            setattr(row, col, val)
+        for acl in self.acls:
+            acl_row = txn.insert(self.api._tables['ACL'])
+            for col, val in acl.items():
+                setattr(acl_row, col, val)
+            _addvalue_to_list(row, 'acls', acl_row.uuid)
+
+
+class DelPortGroupCommand(commands.BaseCommand):
+    def __init__(self, api, name, if_exists):
+        super(DelPortGroupCommand, self).__init__(api)
+        self.name = name
+        self.if_exists = if_exists
+
+    def run_idl(self, txn):
+        try:
+            port_group = self.api.lookup('Port_Group', self.name)
+        except idlutils.RowNotFound:
+            if self.if_exists:
+                return
+            msg = _("Port group %s does not exist. "
+                    "Can't delete.") % self.name
+            raise RuntimeError(msg)
+
+        # The ACLs of the port group aren't root rows, they are garbage
+        # collected by the ovsdb-server once they are no longer referenced.
+        port_group.delete()
+
+
+class UpdatePortGroupPortsCommand(commands.BaseCommand):
+    def __init__(self, api, name, lports_add, lports_del, if_exists,
+                 skip_missing_lports=False):
+        super(UpdatePortGroupPortsCommand, self).__init__(api)
+        self.name = name
+        self.lports_add = lports_add or []
+        self.lports_del = lports_del or []
+        self.if_exists = if_exists
+        self.skip_missing_lports = skip_missing_lports
+
+    def run_idl(self, txn):
+        try:
+            port_group = self.api.lookup('Port_Group', self.name)
+        except idlutils.RowNotFound:
+            if self.if_exists:
+                return
+            msg = _("Port group %s does not exist. "
+                    "Can't update ports") % self.name
+            raise RuntimeError(msg)
+
+        lsps_add = []
+        for lport in self.lports_add:
+            try:
+                lsps_add.append(
+                    self.api.lookup('Logical_Switch_Port', lport).uuid)
+            except idlutils.RowNotFound:
+                if self.skip_missing_lports:
+                    continue
+                msg = _("Logical Switch Port %s does not exist") % lport
+                raise RuntimeError(msg)
+        # The ports of a port group are weak references, ports which no
+        # longer exist are already gone from the port group.
+        lsps_del = [lsp for lsp in (
+            self.api.lookup('Logical_Switch_Port', lport, None)
+            for lport in self.lports_del) if lsp is not None]
+        _updatevalues_in_list(port_group, 'ports', new_values=lsps_add,
+                              old_values=lsps_del)
+
+
+class UpdatePortGroupACLsCommand(commands.BaseCommand):
+    def __init__(self, api, name, acls_add, acls_del, if_exists):
+        super(UpdatePortGroupACLsCommand, self).__init__(api)
+        self.name = name
+        self.acls_add = acls_add or []
+        self.acls_del = acls_del or []
+        self.if_exists = if_exists
+
+    def run_idl(self, txn):
+        try:
+            port_group = self.api.lookup('Port_Group', self.name)
+        except idlutils.RowNotFound:
+            if self.if_exists:
+                return
+            msg = _("Port group %s does not exist. "
+                    "Can't update ACLs") % self.name
+            raise RuntimeError(msg)
+
+        acl_rows = {}
+        for acl_row in getattr(port_group, 'acls', []):
+            acl_rows.setdefault(
+                ovn_acl.acl_key(get_acl_values(acl_row)), []).append(acl_row)
+
+        acls_del = []
+        for acl in self.acls_del:
+            acls_del.extend(acl_rows.pop(ovn_acl.acl_key(acl), []))
+        for acl_row in acls_del:
+            acl_row.delete()
+
+        acls_add = []
+        for acl in self.acls_add:
+            key = ovn_acl.acl_key(acl)
+            if key in acl_rows:
+                continue
+            acl_row = txn.insert(self.api._tables['ACL'])
+            for col, val in acl.items():
+                setattr(acl_row, col, val)
+            acl_rows[key] = [acl_row]
+            acls_add.append(acl_row.uuid)
+
+        _updatevalues_in_list(port_group, 'acls', new_values=acls_add,
+                              old_values=acls_del)
+
+
 class AddDHCPOptionsCommand(commands.BaseCommand):
     def __init__(self, api, subnet_id, port_id=None, may_exists=True,
                  **columns):
@@ -756,18 +926,10 @@ class AddDHCPOptionsCommand(commands.BaseCommand):
         self.port_id = port_id
         self.new_insert = False
 
-    def _get_dhcp_options_row(self):
-        for row in self.api._tables['DHCP_Options'].rows.values():
-            external_ids = getattr(row, 'external_ids', {})
-            port_id = external_ids.get('port_id')
-            if self.subnet_id == external_ids.get('subnet_id'):
-                if self.port_id == port_id:
-                    return row
-
     def run_idl(self, txn):
         row = None
         if self.may_exists:
-            row = self._get_dhcp_options_row()
+            row = self.api.get_dhcp_options_row(self.subnet_id, self.port_id)
 
         if not row:
             row = txn.insert(self.api._tables['DHCP_Options'])
@@ -808,8 +970,7 @@ class AddNATRuleInLRouterCommand(commands.BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lrouter = idlutils.row_by_value(self.api.idl, 'Logical_Router',
-                                            'name', self.lrouter)
+            lrouter = self.api.lookup('Logical_Router', self.lrouter)
         except idlutils.RowNotFound:
             msg = _("Logical Router %s does not exist") % self.lrouter
             raise RuntimeError(msg)
@@ -837,8 +998,7 @@ class DeleteNATRuleInLRouterCommand(commands.BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lrouter = idlutils.row_by_value(self.api.idl, 'Logical_Router',
-                                            'name', self.lrouter)
+            lrouter = self.api.lookup('Logical_Router', self.lrouter)
         except idlutils.RowNotFound:
             if self.if_exists:
                 return
@@ -870,8 +1030,7 @@ class SetNATRuleInLRouterCommand(commands.BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lrouter = idlutils.row_by_value(self.api.idl, 'Logical_Router',
-                                            'name', self.lrouter)
+            lrouter = self.api.lookup('Logical_Router', self.lrouter)
         except idlutils.RowNotFound:
             msg = _("Logical Router %s does not exist") % self.lrouter
             raise RuntimeError(msg)
@@ -894,8 +1053,7 @@ class AddNatIpToLRPortPeerOptionsCommand(commands.BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lport = idlutils.row_by_value(self.api.idl, 'Logical_Switch_Port',
-                                          'name', self.lport)
+            lport = self.api.lookup('Logical_Switch_Port', self.lport)
         except idlutils.RowNotFound:
             msg = _("Logical Switch Port %s does not exist") % self.lport
             raise RuntimeError(msg)
@@ -926,8 +1084,7 @@ class DeleteNatIpFromLRPortPeerOptionsCommand(commands.BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lport = idlutils.row_by_value(self.api.idl, 'Logical_Switch_Port',
-                                          'name', self.lport)
+            lport = self.api.lookup('Logical_Switch_Port', self.lport)
 
         except idlutils.RowNotFound:
             msg = _("Logical Switch Port %s does not exist") % self.port
@@ -0,0 +1,234 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+import json
+import os
+import time
+import uuid
+import zlib
+
+from eventlet import greenthread
+from oslo_log import log
+from oslo_utils import fileutils
+from ovs.db import data
+from ovs.db import idl
+
+from networking_ovn._i18n import _LI, _LW
+
+LOG = log.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+ZERO_TXN_ID = str(uuid.UUID(int=0))
+# Number of rows serialized between two yields to the other greenthreads
+SERIALIZE_BATCH_ROWS = 1000
+
+
+def is_supported(idl_):
+    """Whether the IDL can resume its monitor from a transaction id
+
+    Only the IDLs sending monitor_cond_since requests track the id of the
+    last transaction they received. The other ones clear their tables and
+    get the whole database again when they connect.
+    """
+    return hasattr(idl_, 'last_id')
+
+
+def _monitored_columns(idl_):
+    return dict((table.name, sorted(table.columns))
+                for table in idl_.tables.values())
+
+
+class IdlSnapshot(object):
+    """Copy on disk of the contents of an IDL
+
+    The snapshot holds the rows of the tables monitored by the IDL along
+    with the id of the last transaction they reflect. Loading it in a new
+    IDL before it connects makes the IDL request only the changes made to
+    the database since that transaction, rather than all its contents,
+    when the ovsdb-server supports monitor_cond_since. Otherwise the
+    ovsdb-server sends the whole database again, which replaces the rows
+    loaded.
+
+    Snapshots are zlib compressed JSON files named after the database and
+    the tables and columns monitored, so that the workers monitoring the
+    same ones share them.
+    """
+
+    def __init__(self, idl_, snapshot_dir, interval):
+        fileutils.ensure_tree(snapshot_dir)
+        self.idl = idl_
+        self.interval = interval
+        self.columns = _monitored_columns(idl_)
+        digest = hashlib.sha1(json.dumps(
+            self.columns, sort_keys=True).encode('utf-8')).hexdigest()
+        self.path = os.path.join(
+            snapshot_dir, '%s-%s.snapshot' % (idl_._db.name, digest[:16]))
+        self._saved_id = None
+        self._saving = False
+        self._next_save = time.time() + interval
+
+    def _header(self):
+        return {'format': SNAPSHOT_FORMAT,
+                'schema': [self.idl._db.name, self.idl._db.version],
+                'columns': self.columns}
+
+    def load(self):
+        """Load the rows of the snapshot in the IDL
+
+        This must be called before the IDL connects to the ovsdb-server.
+
+        :returns: Whether the snapshot was loaded
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                snapshot = json.loads(zlib.decompress(f.read()).decode(
+                    'utf-8'))
+        except EnvironmentError:
+            # There is no snapshot yet
+            return False
+        except (ValueError, zlib.error) as e:
+            LOG.warning(_LW('Ignoring the corrupted OVSDB snapshot %(path)s: '
+                            '%(error)s'), {'path': self.path, 'error': e})
+            return False
+
+        if snapshot.get('header') != self._header():
+            LOG.info(_LI('Ignoring the OVSDB snapshot %s, which was taken '
+                         'with another schema or other columns'), self.path)
+            return False
+
+        try:
+            for table_name, rows in snapshot['tables'].items():
+                table = self.idl.tables[table_name]
+                for row_uuid, row_json in rows.items():
+                    row_uuid = uuid.UUID(row_uuid)
+                    row_data = {}
+                    for column_name, column in table.columns.items():
+                        if column_name in row_json:
+                            row_data[column_name] = data.Datum.from_json(
+                                column.type, row_json[column_name])
+                        else:
+                            row_data[column_name] = data.Datum.default(
+                                column.type)
+                    table.rows[row_uuid] = idl.Row(self.idl, table, row_uuid,
+                                                   row_data)
+        except Exception as e:
+            LOG.warning(_LW('Ignoring the OVSDB snapshot %(path)s which '
+                            'failed to load: %(error)s'),
+                        {'path': self.path, 'error': e})
+            for table in self.idl.tables.values():
+                table.rows.clear()
+            return False
+
+        self.idl.last_id = snapshot['last_id']
+        self._saved_id = snapshot['last_id']
+        LOG.info(_LI('Loaded the OVSDB snapshot %(path)s of transaction '
+                     '%(txn)s'), {'path': self.path, 'txn': self.idl.last_id})
+        return True
+
+    def _copy_tables(self):
+        """Copy the data of the rows of the IDL without serializing them
+
+        The IDL replaces the data of the columns which change rather than
+        updating it in place, so a shallow copy of the data of the rows
+        keeps matching the last transaction id while the IDL runs.
+        """
+        tables = {}
+        for table in self.idl.tables.values():
+            tables[table.name] = [
+                (row.uuid, dict((column, datum)
+                                for column, datum in row._data.items()
+                                if column in table.columns))
+                for row in table.rows.values()]
+        return tables
+
+    def _serialize(self, last_id, tables):
+        rows_serialized = 0
+        tables_json = {}
+        for table_name, rows in tables.items():
+            rows_json = tables_json[table_name] = {}
+            for row_uuid, row_data in rows:
+                rows_json[str(row_uuid)] = dict(
+                    (column, datum.to_json())
+                    for column, datum in row_data.items())
+                rows_serialized += 1
+                if rows_serialized % SERIALIZE_BATCH_ROWS == 0:
+                    greenthread.sleep(0)
+        return zlib.compress(json.dumps(
+            {'header': self._header(), 'last_id': last_id,
+             'tables': tables_json}).encode('utf-8'))
+
+    def _write(self, last_id, tables):
+        snapshot = self._serialize(last_id, tables)
+
+        # Write the snapshot in a file of this process first, so that the
+        # other workers never read a partially written snapshot. Only the
+        # user running neutron may read it, whatever its umask.
+        tmp_path = '%s.%d' % (self.path, os.getpid())
+        try:
+            fileutils.delete_if_exists(tmp_path)
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                         0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(snapshot)
+            os.rename(tmp_path, self.path)
+        except EnvironmentError as e:
+            LOG.warning(_LW('Failed to save the OVSDB snapshot %(path)s: '
+                            '%(error)s'), {'path': self.path, 'error': e})
+            return
+        self._saved_id = last_id
+
+    def _save_in_background(self, last_id, tables):
+        try:
+            self._write(last_id, tables)
+        finally:
+            self._saving = False
+
+    def save(self, background=False):
+        """Save the rows of the IDL in the snapshot
+
+        The rows are copied all at once, without yielding to the IDL
+        connection thread, so that they match the last transaction id.
+
+        :param background: Whether to serialize and write the rows in
+                           another greenthread rather than before returning
+        """
+        last_id = self.idl.last_id
+        if (self._saving or last_id == ZERO_TXN_ID or
+                last_id == self._saved_id):
+            return
+        tables = self._copy_tables()
+        if background:
+            self._saving = True
+            greenthread.spawn_n(self._save_in_background, last_id, tables)
+        else:
+            self._write(last_id, tables)
+
+    def maybe_save(self):
+        """Save the snapshot if it wasn't refreshed for interval seconds
+
+        The snapshot may have been refreshed by another worker monitoring
+        the same tables and columns, in which case it is left as is. It is
+        serialized and written in another greenthread, so that the IDL keeps
+        processing the updates of the ovsdb-server meanwhile.
+        """
+        now = time.time()
+        if now < self._next_save:
+            return
+        try:
+            age = now - os.path.getmtime(self.path)
+        except EnvironmentError:
+            age = self.interval
+        if age >= self.interval:
+            self.save(background=True)
+            age = 0
+        self._next_save = now + self.interval - age
@@ -10,6 +10,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import operator
+import random
+import threading
+import time
+
+from eventlet import greenthread
 from neutron_lib import exceptions as n_exc
 from oslo_log import log
 import tenacity
@@ -17,8 +23,10 @@ import tenacity
 from neutron.agent.ovsdb.native import idlutils
 from neutron_lib.utils import helpers
 from ovsdbapp.backend.ovs_idl import transaction as idl_trans
+from ovsdbapp import exceptions as ovsdbapp_exc
 
-from networking_ovn._i18n import _, _LI
+from networking_ovn._i18n import _, _LE, _LI
+from networking_ovn.common import acl as ovn_acl
 from networking_ovn.common import config as cfg
 from networking_ovn.common import constants as ovn_const
 from networking_ovn.common import utils
@@ -30,6 +38,204 @@ from networking_ovn.ovsdb import vlog
 
 LOG = log.getLogger(__name__)
 
+_NO_DEFAULT = ovn_api._NO_DEFAULT
+
+# Tables of the OVN_Northbound database looked up by their name column.
+NAME_INDEXED_TABLES = ('Logical_Switch', 'Logical_Switch_Port',
+                       'Logical_Router', 'Logical_Router_Port',
+                       'Address_Set', 'Port_Group')
+
+# Tables and columns of the OVN_Northbound database used by the API and RPC
+# workers, None meaning all the columns of the table.
+NB_API_PROFILE = {
+    'Logical_Switch': None,
+    'Logical_Switch_Port': ('name', 'type', 'options', 'parent_name', 'tag',
+                            'enabled', 'addresses', 'port_security',
+                            'external_ids', 'dhcpv4_options',
+                            'dhcpv6_options'),
+    'Logical_Router': None,
+    'Logical_Router_Port': None,
+    'Logical_Router_Static_Route': None,
+    'NAT': None,
+    'ACL': None,
+    'Address_Set': None,
+    'DHCP_Options': None,
+    'Port_Group': None,
+}
+
+# Tables and columns of the OVN_Southbound database used by all the workers
+SB_PROFILE = {
+    'Chassis': ('name', 'hostname', 'external_ids'),
+}
+
+DHCP_OPTIONS_SUBNET_INDEX = 'DHCP_Options:subnet_id'
+DHCP_OPTIONS_SUBNET_PORT_INDEX = 'DHCP_Options:subnet_id,port_id'
+ACL_LPORT_INDEX = 'ACL:neutron:lport'
+
+# Time in seconds to wait for a row created by another controller
+ROW_WAIT_TIMEOUT = 10
+
+
+def _dhcp_options_subnet_key(row):
+    return row.external_ids.get('subnet_id') or None
+
+
+def _dhcp_options_subnet_port_key(row):
+    subnet_id = row.external_ids.get('subnet_id')
+    if not subnet_id:
+        return None
+    return subnet_id, row.external_ids.get('port_id') or None
+
+
+def _acl_lport_key(row):
+    return row.external_ids.get('neutron:lport') or None
+
+
+class NbTransaction(idl_trans.Transaction, ovn_api.Transaction):
+    """Transaction folding the updates of an address set before commit
+
+    If a batcher is given, the transaction is committed along with the
+    ones committed concurrently by other callers.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.batcher = kwargs.pop('batcher', None)
+        super(NbTransaction, self).__init__(*args, **kwargs)
+
+    def commit(self):
+        if self.batcher is not None and self.commands:
+            return self.batcher.commit(self)
+        return self.commit_alone()
+
+    def commit_alone(self):
+        self.commands = cmd.coalesce_address_set_updates(self.commands)
+        return super(NbTransaction, self).commit()
+
+    def do_commit(self):
+        try:
+            return super(NbTransaction, self).do_commit()
+        except RuntimeError:
+            # The transactions attempted again until they time out fail with
+            # a RuntimeError, raise the same error as the transactions whose
+            # result is not received in time instead.
+            if self.timeout_exceeded():
+                raise ovsdbapp_exc.TimeoutException(commands=self.commands,
+                                                    timeout=self.timeout)
+            raise
+
+    def commit_async(self):
+        """Commit the transaction without waiting for its result
+
+        :returns: A :class:`TransactionFuture` of the result of the commit
+        """
+        return TransactionFuture(self)
+
+
+class TransactionFuture(object):
+    """Result of a transaction being committed in the background"""
+
+    def __init__(self, txn):
+        self.txn = txn
+        self._thread = greenthread.spawn(txn.commit)
+
+    def done(self):
+        return self._thread.dead
+
+    def result(self):
+        """Wait for the commit to complete and return its result
+
+        Raises the error of the commit, if the transaction checks errors.
+        """
+        return self._thread.wait()
+
+
+class _TransactionBatch(object):
+    def __init__(self):
+        self.txns = []
+        self.done = threading.Event()
+        # Whether the transactions have to be committed on their own
+        self.split = True
+        # The error of the batch to return to all its transactions
+        self.error = None
+
+
+class TransactionBatcher(object):
+    """Group commit of the NB transactions of concurrent callers.
+
+    The first transaction committed opens a batch and waits for up to
+    window seconds, or until max_size transactions joined it, before the
+    commands of all the transactions of the batch are committed as a single
+    OVSDB transaction. If it fails before being committed, e.g. because one
+    of its commands fails or the ovsdb-server rejects it, every transaction
+    of the batch is committed again on its own, so that each caller gets its
+    own result or error. If it times out, it may still have been committed,
+    so the error is returned to all the transactions of the batch rather
+    than committing their commands again.
+    """
+
+    def __init__(self, window, max_size):
+        self.window = window
+        self.max_size = max_size
+        self._cond = threading.Condition()
+        self._batch = None
+
+    def commit(self, txn):
+        with self._cond:
+            batch = self._batch
+            leader = batch is None
+            if leader:
+                batch = self._batch = _TransactionBatch()
+            batch.txns.append(txn)
+            if len(batch.txns) >= self.max_size:
+                self._batch = None
+                self._cond.notify_all()
+            if leader:
+                deadline = time.time() + self.window
+                while self._batch is batch:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        self._batch = None
+                        break
+                    self._cond.wait(remaining)
+
+        if leader:
+            self._commit_batch(batch)
+        else:
+            batch.done.wait()
+        if batch.error is not None:
+            if txn.log_errors:
+                LOG.error(_LE('Batch of transactions failed: %s'),
+                          batch.error)
+            if txn.check_error:
+                raise batch.error
+            return
+        if batch.split:
+            return txn.commit_alone()
+        return [command.result for command in txn.commands]
+
+    def _commit_batch(self, batch):
+        try:
+            if len(batch.txns) < 2:
+                return
+            first = batch.txns[0]
+            batch_txn = NbTransaction(
+                first.api, first.ovsdb_connection,
+                max(txn.timeout for txn in batch.txns),
+                check_error=True, log_errors=False)
+            for txn in batch.txns:
+                batch_txn.commands.extend(txn.commands)
+            batch_txn.commit_alone()
+            batch.split = False
+        except ovsdbapp_exc.TimeoutException as e:
+            batch.error = e
+            batch.split = False
+        except Exception as e:
+            LOG.debug('Batch of %(count)d transactions failed, committing '
+                      'them one by one: %(error)s',
+                      {'count': len(batch.txns), 'error': e})
+        finally:
+            batch.done.set()
+
 
 class OvsdbConnectionUnavailable(n_exc.ServiceUnavailable):
     message = _("OVS database connection to %(db_schema)s failed with error: "
@@ -38,9 +244,9 @@ class OvsdbConnectionUnavailable(n_exc.ServiceUnavailable):
                 "'ovn_sb_connection' configuration options are correct.")
 
 
-# Retry forever to get the OVN NB and SB IDLs. Wait 2^x * 1 seconds between
-# each retry, up to 180 seconds, then 180 seconds afterwards.
-def get_ovn_idls(driver, trigger):
+def _get_ovn_idl_retry(cls, driver, trigger):
+    # Retry forever to get the OVN IDL. Wait 2^x * 1 seconds between each
+    # retry, up to 180 seconds, then 180 seconds afterwards.
     @tenacity.retry(
         wait=tenacity.wait_exponential(max=180),
         reraise=True)
@@ -49,9 +255,89 @@ def get_ovn_idls(driver, trigger):
                  {'cls': cls.__name__, 'trigger': trigger.im_class.__name__})
         return cls(driver, trigger)
 
+    return get_ovn_idl_retry(cls, driver, trigger)
+
+
+class LazyOvnIdl(object):
+    """Proxy to an OVN IDL connecting to its database on first use
+
+    Every IDL connection downloads a snapshot of the tables it monitors, so
+    connecting all the workers at once when neutron-server starts makes the
+    ovsdb-servers serve as many snapshots at the same time. The proxy
+    instead creates the IDL the first time one of its attributes is
+    accessed, or when warm_up() is called.
+    """
+
+    def __init__(self, cls, driver, trigger):
+        self._cls = cls
+        self._driver = driver
+        self._trigger = trigger
+        self._idl = None
+        self._lock = threading.Lock()
+
+    @property
+    def connected(self):
+        return self._idl is not None
+
+    def connect(self, retry=False):
+        """Return the IDL, creating it if needed
+
+        :param retry: Whether to retry until the IDL is created. Otherwise
+                      the OvsdbConnectionUnavailable error is raised to the
+                      caller, rather than blocking it indefinitely.
+        """
+        if self._idl is not None:
+            return self._idl
+        if not retry:
+            return self._create_idl()
+
+        # The lock is only held by each attempt, so that the callers not
+        # retrying are not blocked while the retries are waited for.
+        @tenacity.retry(
+            wait=tenacity.wait_exponential(max=180),
+            reraise=True)
+        def create_idl_retry():
+            LOG.info(_LI('Getting %(cls)s for %(trigger)s with retry'),
+                     {'cls': self._cls.__name__,
+                      'trigger': self._trigger.im_class.__name__})
+            return self._create_idl()
+
+        return create_idl_retry()
+
+    def _create_idl(self):
+        with self._lock:
+            if self._idl is None:
+                self._idl = self._cls(self._driver, self._trigger)
+        return self._idl
+
+    def warm_up(self, delay):
+        """Create the IDL in the background after delay seconds"""
+        greenthread.spawn_after(delay, self.connect, retry=True)
+
+    def __getattr__(self, name):
+        return getattr(self.connect(), name)
+
+
+def get_ovn_idls(driver, trigger, lazy=False):
+    """Return the OVN NB and SB IDLs of the worker started by trigger
+
+    :param lazy: Whether to return LazyOvnIdl proxies connecting on first
+                 use, or after a random delay of up to the
+                 ovn_idl_warmup_window configuration option if it is set.
+    """
     vlog.use_oslo_logger()
-    nb_ovn_idl = get_ovn_idl_retry(OvsdbNbOvnIdl, driver, trigger)
-    sb_ovn_idl = get_ovn_idl_retry(OvsdbSbOvnIdl, driver, trigger)
+    if lazy:
+        nb_ovn_idl = LazyOvnIdl(OvsdbNbOvnIdl, driver, trigger)
+        sb_ovn_idl = LazyOvnIdl(OvsdbSbOvnIdl, driver, trigger)
+        window = cfg.get_ovn_idl_warmup_window()
+        if window:
+            # Spread the connections of the workers over the window
+            for idl in (nb_ovn_idl, sb_ovn_idl):
+                idl.warm_up(random.uniform(0, window))
+        return nb_ovn_idl, sb_ovn_idl
+
+    nb_ovn_idl = _get_ovn_idl_retry(OvsdbNbOvnIdl, driver, trigger)
+    sb_ovn_idl = _get_ovn_idl_retry(OvsdbSbOvnIdl, driver, trigger)
     return nb_ovn_idl, sb_ovn_idl
 
 
@@ -73,6 +359,7 @@ def get_connection(db_class, trigger=None):
 class OvsdbNbOvnIdl(ovn_api.API):
 
     ovsdb_connection = None
+    txn_batcher = None
 
     def __init__(self, driver, trigger=None):
         super(OvsdbNbOvnIdl, self).__init__()
@@ -82,11 +369,20 @@ class OvsdbNbOvnIdl(ovn_api.API):
                     OvsdbNbOvnIdl, trigger)
             if isinstance(OvsdbNbOvnIdl.ovsdb_connection,
                           ovsdb_monitor.OvnConnection):
+                # The OVN worker also synchronizes the whole database
                 OvsdbNbOvnIdl.ovsdb_connection.start(driver)
+            elif cfg.is_ovn_monitor_profiles_enabled():
+                OvsdbNbOvnIdl.ovsdb_connection.start(profile=NB_API_PROFILE)
             else:
                 OvsdbNbOvnIdl.ovsdb_connection.start()
             self.idl = OvsdbNbOvnIdl.ovsdb_connection.idl
             self.ovsdb_timeout = cfg.get_ovn_ovsdb_timeout()
+            self._add_row_indexes()
+            if (OvsdbNbOvnIdl.txn_batcher is None and
+                    cfg.get_ovn_txn_batch_window()):
+                OvsdbNbOvnIdl.txn_batcher = TransactionBatcher(
+                    cfg.get_ovn_txn_batch_window() / 1000.0,
+                    cfg.get_ovn_txn_batch_max_size())
 
             # FIXME(lucasagomes): We should not access the _session
             # private attribute like this, ideally the IDL class would
@@ -104,11 +400,47 @@ class OvsdbNbOvnIdl(ovn_api.API):
     def _tables(self):
         return self.idl.tables
 
+    def _add_row_indexes(self):
+        if not isinstance(self.idl, ovsdb_monitor.OvnBaseIdl):
+            return
+        for table in NAME_INDEXED_TABLES:
+            if table in self._tables:
+                self.idl.add_row_index(table, table,
+                                       operator.attrgetter('name'))
+        if 'DHCP_Options' in self._tables:
+            self.idl.add_row_index(DHCP_OPTIONS_SUBNET_INDEX, 'DHCP_Options',
+                                   _dhcp_options_subnet_key)
+            self.idl.add_row_index(DHCP_OPTIONS_SUBNET_PORT_INDEX,
+                                   'DHCP_Options',
+                                   _dhcp_options_subnet_port_key)
+        if 'ACL' in self._tables:
+            self.idl.add_row_index(ACL_LPORT_INDEX, 'ACL', _acl_lport_key)
+
+    def _get_row_index(self, name):
+        if not isinstance(self.idl, ovsdb_monitor.OvnBaseIdl):
+            return None
+        return self.idl.row_indexes.get(name)
+
+    def lookup(self, table, name, default=_NO_DEFAULT):
+        index = self._get_row_index(table)
+        if index is None:
+            # The IDL doesn't maintain an index for this table
+            if default is _NO_DEFAULT:
+                return idlutils.row_by_value(self.idl, table, 'name', name)
+            return idlutils.row_by_value(self.idl, table, 'name', name,
+                                         default)
+
+        rows = index.get(name)
+        if rows:
+            return rows[0]
+        if default is _NO_DEFAULT:
+            raise idlutils.RowNotFound(table=table, col='name', match=name)
+        return default
+
     def transaction(self, check_error=False, log_errors=True, **kwargs):
-        return idl_trans.Transaction(self,
-                                     OvsdbNbOvnIdl.ovsdb_connection,
-                                     self.ovsdb_timeout,
-                                     check_error, log_errors)
+        return NbTransaction(self, OvsdbNbOvnIdl.ovsdb_connection,
+                             self.ovsdb_timeout, check_error, log_errors,
+                             batcher=OvsdbNbOvnIdl.txn_batcher)
 
     def create_lswitch(self, lswitch_name, may_exist=True, **columns):
         return cmd.AddLSwitchCommand(self, lswitch_name,
@@ -207,16 +539,36 @@ class OvsdbNbOvnIdl(ovn_api.API):
                            'dnat_and_snats': dnat_and_snats})
         return result
 
-    def get_acls_for_lswitches(self, lswitch_names):
+    def get_acls_for_lport(self, lswitch, lport):
+        """Get the acls of the logical switch that belong to the port
+
+        @param lswitch: Logical switch idl object
+        @param lport: Port id
+        @return: List of acl idl objects
+        """
+        index = self._get_row_index(ACL_LPORT_INDEX)
+        if index is None:
+            return [acl for acl in getattr(lswitch, 'acls', [])
+                    if getattr(acl, 'external_ids', {}).get(
+                        'neutron:lport') == lport]
+        # NOTE: The ACLs of a port are only ever created on the logical
+        # switch of the port's network, so the index doesn't need to be
+        # cross-checked against the acls column of lswitch.
+        return index.get(lport)
+
+    def get_acls_for_lswitches(self, lswitch_names, ports=None):
         """Get the existing set of acls that belong to the logical switches
 
         @param lswitch_names: List of logical switch names
         @type lswitch_names: []
+        @param ports: Optional list of ports. If given, only the acls that
+                      belong to these ports are returned.
+        @type ports: []
         @var acl_values_dict: A dictionary indexed by port_id containing the
                               list of acl values in string format that belong
                               to that port
-        @var acl_obj_dict: A dictionary indexed by acl value containing the
-                           corresponding acl idl object.
+        @var acl_obj_dict: A dictionary indexed by the AclKey of an acl value
+                           containing the corresponding acl idl object.
         @var lswitch_ovsdb_dict: A dictionary mapping from logical switch
                                  name to lswitch idl object
         @return: (acl_values_dict, acl_obj_dict, lswitch_ovsdb_dict)
@@ -224,18 +576,27 @@ class OvsdbNbOvnIdl(ovn_api.API):
         acl_values_dict = {}
         acl_obj_dict = {}
         lswitch_ovsdb_dict = {}
+        lswitch_port_ids = None
+        if ports is not None:
+            lswitch_port_ids = {}
+            for port in ports:
+                lswitch_port_ids.setdefault(
+                    port['network_id'], []).append(port['id'])
         for lswitch_name in lswitch_names:
             try:
-                lswitch = idlutils.row_by_value(self.idl,
-                                                'Logical_Switch',
-                                                'name',
-                                                utils.ovn_name(lswitch_name))
+                lswitch = self.lookup('Logical_Switch',
+                                      utils.ovn_name(lswitch_name))
             except idlutils.RowNotFound:
                 # It is possible for the logical switch to be deleted
                 # while we are searching for it by name in idl.
                 continue
             lswitch_ovsdb_dict[lswitch_name] = lswitch
-            acls = getattr(lswitch, 'acls', [])
+            if lswitch_port_ids is None:
+                acls = getattr(lswitch, 'acls', [])
+            else:
+                acls = []
+                for port_id in lswitch_port_ids.get(lswitch_name, []):
+                    acls.extend(self.get_acls_for_lport(lswitch, port_id))
 
             # Iterate over each acl in a lswitch and store the acl in
             # a key:value representation for e.g. acl_string. This
@@ -252,7 +613,7 @@ class OvsdbNbOvnIdl(ovn_api.API):
                         acl_string[acl_key] = getattr(acl, acl_key)
                     except AttributeError:
                         pass
-                acl_obj_dict[str(acl_string)] = acl
+                acl_obj_dict[ovn_acl.acl_key(acl_string)] = acl
                 acl_list.append(acl_string)
         return acl_values_dict, acl_obj_dict, lswitch_ovsdb_dict
 
@@ -288,11 +649,12 @@ class OvsdbNbOvnIdl(ovn_api.API):
         return cmd.DelACLCommand(self, lswitch, lport, if_exists)
 
     def update_acls(self, lswitch_names, port_list, acl_new_values_dict,
-                    need_compare=True, is_add_acl=True):
+                    need_compare=True, is_add_acl=True, may_exist=False):
         return cmd.UpdateACLsCommand(self, lswitch_names,
                                      port_list, acl_new_values_dict,
                                      need_compare=need_compare,
-                                     is_add_acl=is_add_acl)
+                                     is_add_acl=is_add_acl,
+                                     may_exist=may_exist)
 
     def add_static_route(self, lrouter, **columns):
         return cmd.AddStaticRouteCommand(self, lrouter, **columns)
@@ -335,10 +697,7 @@ class OvsdbNbOvnIdl(ovn_api.API):
 
     def get_gateway_chassis_binding(self, gateway_name):
         try:
-            router = idlutils.row_by_value(self.idl,
-                                           'Logical_Router_Port',
-                                           'name',
-                                           gateway_name)
+            router = self.lookup('Logical_Router_Port', gateway_name)
             chassis_name = router.options.get(
                 ovn_const.OVN_GATEWAY_CHASSIS_KEY)
             if chassis_name == ovn_const.OVN_GATEWAY_INVALID_CHASSIS:
@@ -373,28 +732,37 @@ class OvsdbNbOvnIdl(ovn_api.API):
     def delete_dhcp_options(self, row_uuid, if_exists=True):
         return cmd.DelDHCPOptionsCommand(self, row_uuid, if_exists=if_exists)
 
+    def _get_subnet_dhcp_options_rows(self, subnet_id):
+        index = self._get_row_index(DHCP_OPTIONS_SUBNET_INDEX)
+        if index is not None:
+            return index.get(subnet_id)
+        return [row for row in self._tables['DHCP_Options'].rows.values()
+                if _dhcp_options_subnet_key(row) == subnet_id]
+
+    def get_dhcp_options_row(self, subnet_id, port_id=None):
+        index = self._get_row_index(DHCP_OPTIONS_SUBNET_PORT_INDEX)
+        if index is not None:
+            rows = index.get((subnet_id, port_id))
+        else:
+            rows = [row for row in self._get_subnet_dhcp_options_rows(
+                    subnet_id) if _dhcp_options_subnet_port_key(row) == (
+                    subnet_id, port_id)]
+        return rows[0] if rows else None
+
     def get_subnet_dhcp_options(self, subnet_id):
-        for row in self._tables['DHCP_Options'].rows.values():
-            external_ids = getattr(row, 'external_ids', {})
-            port_id = external_ids.get('port_id')
-            if subnet_id == external_ids.get('subnet_id') and not port_id:
-                return {'cidr': row.cidr, 'options': dict(row.options),
-                        'external_ids': dict(external_ids),
-                        'uuid': row.uuid}
-        return None
+        row = self.get_dhcp_options_row(subnet_id)
+        if row is None:
+            return None
+        return {'cidr': row.cidr, 'options': dict(row.options),
+                'external_ids': dict(row.external_ids),
+                'uuid': row.uuid}
 
     def get_subnets_dhcp_options(self, subnet_ids):
         ret_opts = []
-        for row in self._tables['DHCP_Options'].rows.values():
-            external_ids = getattr(row, 'external_ids', {})
-            if (external_ids.get('subnet_id') in subnet_ids
-                    and not external_ids.get('port_id')):
-                ret_opts.append({
-                    'cidr': row.cidr, 'options': dict(row.options),
-                    'external_ids': dict(external_ids),
-                    'uuid': row.uuid})
-                if len(ret_opts) == len(subnet_ids):
-                    break
+        for subnet_id in subnet_ids:
+            subnet_opts = self.get_subnet_dhcp_options(subnet_id)
+            if subnet_opts:
+                ret_opts.append(subnet_opts)
         return ret_opts
 
     def get_all_dhcp_options(self):
@@ -427,13 +795,11 @@ class OvsdbNbOvnIdl(ovn_api.API):
         # Check if there are any port DHCP options which
         # belongs to this 'subnet_id' and frame the commands to update them.
         port_dhcp_options = []
-        for row in self._tables['DHCP_Options'].rows.values():
-            external_ids = getattr(row, 'external_ids', {})
-            port_id = external_ids.get('port_id')
-            if subnet_id == external_ids.get('subnet_id'):
-                if port_id:
-                    port_dhcp_options.append({'port_id': port_id,
-                                             'port_dhcp_opts': row.options})
+        for row in self._get_subnet_dhcp_options_rows(subnet_id):
+            port_id = row.external_ids.get('port_id')
+            if port_id:
+                port_dhcp_options.append({'port_id': port_id,
+                                         'port_dhcp_opts': row.options})
 
         for port_dhcp_opt in port_dhcp_options:
             if columns.get('options'):
@@ -460,10 +826,49 @@ class OvsdbNbOvnIdl(ovn_api.API):
             address_sets[name] = data
         return address_sets
 
+    def is_port_groups_supported(self):
+        return (cfg.is_ovn_port_groups_enabled() and
+                'Port_Group' in self._tables)
+
+    def create_port_group(self, name, may_exist=True, acls=None, **columns):
+        return cmd.AddPortGroupCommand(self, name, may_exist, acls=acls,
+                                       **columns)
+
+    def delete_port_group(self, name, if_exists=True):
+        return cmd.DelPortGroupCommand(self, name, if_exists)
+
+    def update_port_group_ports(self, name, lports_add=None, lports_del=None,
+                                if_exists=True, skip_missing_lports=False):
+        return cmd.UpdatePortGroupPortsCommand(self, name, lports_add,
+                                               lports_del, if_exists,
+                                               skip_missing_lports)
+
+    def update_port_group_acls(self, name, acls_add=None, acls_del=None,
+                               if_exists=True):
+        return cmd.UpdatePortGroupACLsCommand(self, name, acls_add,
+                                              acls_del, if_exists)
+
+    def get_port_groups(self):
+        port_groups = {}
+        for row in self._tables['Port_Group'].rows.values():
+            external_ids = getattr(row, 'external_ids', {})
+            if (ovn_const.OVN_SG_EXT_ID_KEY not in external_ids and
+                    row.name != ovn_const.OVN_DROP_PORT_GROUP_NAME):
+                continue
+            port_groups[row.name] = {
+                'name': row.name,
+                'external_ids': external_ids,
+                'ports': [lsp.name for lsp in getattr(row, 'ports', [])],
+                'acls': [cmd.get_acl_values(acl)
+                         for acl in getattr(row, 'acls', [])]}
+        return port_groups
+
+    def get_port_group(self, name):
+        return self.lookup('Port_Group', name, None)
+
     def get_router_port_options(self, lsp_name):
         try:
-            lsp = idlutils.row_by_value(self.idl, 'Logical_Switch_Port',
-                                        'name', lsp_name)
+            lsp = self.lookup('Logical_Switch_Port', lsp_name)
             options = getattr(lsp, 'options')
             for key in options.keys():
                 if key not in ovn_const.OVN_ROUTER_PORT_OPTION_KEYS:
@@ -483,8 +888,7 @@ class OvsdbNbOvnIdl(ovn_api.API):
 
     def get_lrouter_nat_rules(self, lrouter_name):
         try:
-            lrouter = idlutils.row_by_value(self.idl, 'Logical_Router',
-                                            'name', lrouter_name)
+            lrouter = self.lookup('Logical_Router', lrouter_name)
         except idlutils.RowNotFound:
             msg = _("Logical Router %s does not exist") % lrouter_name
             raise RuntimeError(msg)
@@ -507,23 +911,39 @@ class OvsdbNbOvnIdl(ovn_api.API):
     def delete_nat_ip_from_lrport_peer_options(self, lport, nat_ip):
         return cmd.DeleteNatIpFromLRPortPeerOptionsCommand(self, lport, nat_ip)
 
-    # Check for a column match in the table. If not found do a retry with
-    # a stop delay of 10 secs. This function would be useful if the caller
-    # wants to verify for the presence of a particular row in the table
-    # with the column match before doing any transaction.
+    # Check for a column match in the table. If not found wait for up to
+    # ROW_WAIT_TIMEOUT secs for the row to be created. This function would
+    # be useful if the caller wants to verify for the presence of a
+    # particular row in the table with the column match before doing any
+    # transaction.
     # Eg. We can check if Logical_Switch row is present before adding a
     # logical switch port to it.
+    def check_for_row_by_value_and_retry(self, table, column, match):
+        index = self._get_row_index(table) if column == 'name' else None
+        if index is None:
+            return self._check_for_row_by_value_and_retry(table, column,
+                                                          match)
+        # The index is notified by the IDL as soon as the row is created
+        if not index.wait(match, ROW_WAIT_TIMEOUT):
+            raise RuntimeError(self._row_not_found_msg(table, column, match))
+
+    @staticmethod
+    def _row_not_found_msg(table, column, match):
+        return (_("%(match)s does not exist in %(column)s of %(table)s")
+                % {'match': match, 'column': column, 'table': table})
+
     @tenacity.retry(retry=tenacity.retry_if_exception_type(RuntimeError),
                     wait=tenacity.wait_exponential(),
-                    stop=tenacity.stop_after_delay(10),
+                    stop=tenacity.stop_after_delay(ROW_WAIT_TIMEOUT),
                     reraise=True)
-    def check_for_row_by_value_and_retry(self, table, column, match):
+    def _check_for_row_by_value_and_retry(self, table, column, match):
         try:
-            idlutils.row_by_value(self.idl, table, column, match)
+            if column == 'name':
+                self.lookup(table, match)
+            else:
+                idlutils.row_by_value(self.idl, table, column, match)
         except idlutils.RowNotFound:
-            msg = (_("%(match)s does not exist in %(column)s of %(table)s")
-                   % {'match': match, 'column': column, 'table': table})
-            raise RuntimeError(msg)
+            raise RuntimeError(self._row_not_found_msg(table, column, match))
 
 
 class OvsdbSbOvnIdl(ovn_api.SbAPI):
@@ -536,14 +956,16 @@ class OvsdbSbOvnIdl(ovn_api.SbAPI):
             if OvsdbSbOvnIdl.ovsdb_connection is None:
                 OvsdbSbOvnIdl.ovsdb_connection = get_connection(OvsdbSbOvnIdl,
                                                                 trigger)
+            # We only need to know the content of Chassis in OVN_Southbound
+            if cfg.is_ovn_monitor_profiles_enabled():
+                kwargs = {'profile': SB_PROFILE}
+            else:
+                kwargs = {'table_name_list': ['Chassis']}
             if isinstance(OvsdbSbOvnIdl.ovsdb_connection,
                           ovsdb_monitor.OvnConnection):
-                # We only need to know the content of Chassis in OVN_Southbound
-                OvsdbSbOvnIdl.ovsdb_connection.start(
-                    driver, table_name_list=['Chassis'])
+                OvsdbSbOvnIdl.ovsdb_connection.start(driver, **kwargs)
             else:
-                OvsdbSbOvnIdl.ovsdb_connection.start(
-                    table_name_list=['Chassis'])
+                OvsdbSbOvnIdl.ovsdb_connection.start(**kwargs)
             self.idl = OvsdbSbOvnIdl.ovsdb_connection.idl
             self.ovsdb_timeout = cfg.get_ovn_ovsdb_timeout()
 
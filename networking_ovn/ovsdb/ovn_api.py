@@ -11,8 +11,31 @@
 #    under the License.
 
 import abc
+
+from ovsdbapp import api as ovsdbapp_api
 import six
 
+# Default of API.lookup() telling that no default was given
+_NO_DEFAULT = object()
+
+
+@six.add_metaclass(abc.ABCMeta)
+class Transaction(ovsdbapp_api.Transaction):
+
+    @abc.abstractmethod
+    def commit_async(self):
+        """Commit the transaction without waiting for its result
+
+        The transaction is committed in the background, so that the caller
+        can queue other transactions before waiting for the result of this
+        one. The errors of the commit are raised by the result of the
+        future rather than by this call, if the transaction checks errors.
+
+        :returns: A future whose done() method tells whether the commit
+                  completed and whose result() method waits for it and
+                  returns its result
+        """
+
 
 @six.add_metaclass(abc.ABCMeta)
 class API(object):
@@ -29,6 +52,19 @@ class API(object):
         :rtype: :class:`Transaction`
         """
 
+    @abc.abstractmethod
+    def lookup(self, table, name, default=_NO_DEFAULT):
+        """Look up a row of an OVN table by its name column
+
+        :param table:   The name of the table
+        :type table:    string
+        :param name:    The value of the name column of the row
+        :type name:     string
+        :param default: Value to return if the row does not exist. If not
+                        given, RowNotFound is raised instead
+        :returns:       The row of the table
+        """
+
     @abc.abstractmethod
     def create_lswitch(self, name, may_exist=True, **columns):
         """Create a command to add an OVN lswitch
@@ -242,7 +278,7 @@ class API(object):
 
     @abc.abstractmethod
     def update_acls(self, lswitch_names, port_list, acl_new_values_dict,
-                    need_compare=True, is_add_acl=True):
+                    need_compare=True, is_add_acl=True, may_exist=False):
         """Update the list of acls on logical switches with new values.
 
         :param lswitch_names:         List of logical switch names
@@ -256,6 +292,21 @@ class API(object):
         :type need_compare:           bool
         :is_add_acl:                  If updating is caused by adding acl
         :type is_add_acl:             bool
+        :param may_exist:             If the acls added without compare
+                                      may already exist, in which case
+                                      they are not added again
+        :type may_exist:              bool
+        """
+
+    @abc.abstractmethod
+    def get_acls_for_lport(self, lswitch, lport):
+        """Return the ACLs of a logical switch that belong to a logical port.
+
+        :param lswitch:      The logical switch the port is attached to.
+        :type lswitch:       ovsdb row
+        :param lport:        The logical port the ACLs are associated with.
+        :type lport:         string
+        :returns:            List of ACL rows
         """
 
     @abc.abstractmethod
@@ -404,6 +455,18 @@ class API(object):
         :type if_exists:       bool
         """
 
+    @abc.abstractmethod
+    def get_dhcp_options_row(self, subnet_id, port_id=None):
+        """Returns the DHCP_Options row of a subnet or of a port in a subnet
+
+        :param subnet_id:      The subnet id of the DHCP options
+        :type subnet_id:       string
+        :param port_id:        The port id of the DHCP options, None for the
+                               DHCP options of the subnet itself
+        :type port_id:         string
+        :returns:              The DHCP_Options row, or None if not found
+        """
+
     @abc.abstractmethod
     def get_subnet_dhcp_options(self, subnet_id):
         """Returns the Subnet DHCP options as a dictionary
@@ -447,6 +510,93 @@ class API(object):
         :returns: dictionary indexed by name, DB columns as values
         """
 
+    @abc.abstractmethod
+    def is_port_groups_supported(self):
+        """Whether the ACLs of security groups are applied to port groups
+
+        :returns: True if port groups are enabled and the OVN_Northbound
+                  schema has the Port_Group table
+        """
+
+    @abc.abstractmethod
+    def create_port_group(self, name, may_exist=True, acls=None, **columns):
+        """Create a port group
+
+        :param name:         The name of the port group
+        :type name:          string
+        :param may_exist:    Do not fail if the port group already exists
+        :type may_exist:     bool
+        :param acls:         List of ACLs of the port group
+        :type acls:          list of dictionaries
+        :param columns:      Dictionary of port group columns
+                             Supported columns: external_ids
+        :type columns:       dictionary
+        :returns:            :class:`Command` with no result
+        """
+
+    @abc.abstractmethod
+    def delete_port_group(self, name, if_exists=True):
+        """Delete a port group and its ACLs
+
+        :param name:         The name of the port group
+        :type name:          string
+        :param if_exists:    Do not fail if the port group does not exist
+        :type if_exists:     bool
+        :returns:            :class:`Command` with no result
+        """
+
+    @abc.abstractmethod
+    def update_port_group_ports(self, name, lports_add=None, lports_del=None,
+                                if_exists=True, skip_missing_lports=False):
+        """Add and remove logical ports to and from a port group
+
+        :param name:         The name of the port group
+        :type name:          string
+        :param lports_add:   The logical ports to add to the port group
+        :type lports_add:    []
+        :param lports_del:   The logical ports to remove from the port group
+        :type lports_del:    []
+        :param if_exists:    Do not fail if the port group does not exist
+        :type if_exists:     bool
+        :param skip_missing_lports: Do not fail if logical ports to add do
+                             not exist, skip them instead
+        :type skip_missing_lports: bool
+        :returns:            :class:`Command` with no result
+        """
+
+    @abc.abstractmethod
+    def update_port_group_acls(self, name, acls_add=None, acls_del=None,
+                               if_exists=True):
+        """Add and remove ACLs to and from a port group
+
+        :param name:         The name of the port group
+        :type name:          string
+        :param acls_add:     The ACLs to add to the port group
+        :type acls_add:      list of dictionaries
+        :param acls_del:     The ACLs to remove from the port group
+        :type acls_del:      list of dictionaries
+        :param if_exists:    Do not fail if the port group does not exist
+        :type if_exists:     bool
+        :returns:            :class:`Command` with no result
+        """
+
+    @abc.abstractmethod
+    def get_port_groups(self):
+        """Gets the port groups of security groups in the OVN_Northbound DB
+
+        :returns: dictionary indexed by name, with the external_ids, the
+                  names of the ports and the ACLs of each port group
+        """
+
+    @abc.abstractmethod
+    def get_port_group(self, name):
+        """Get a port group of the OVN_Northbound DB
+
+        :param name:         The name of the port group
+        :type name:          string
+        :returns:            The Port_Group row, None if it doesn't exist
+        """
+
     @abc.abstractmethod
     def get_router_port_options(self, lsp_name):
         """Get options set for lsp of type router
@@ -13,19 +13,27 @@
 #    under the License.
 
 import atexit
+import collections
+from eventlet import greenpool
 from eventlet import greenthread
-from six.moves import queue
+import random
+import six
 import tenacity
 import threading
+import time
+import zlib
 
 from oslo_log import log
 from ovs.db import idl
+from ovs import jsonrpc
 from ovs import poller
 from ovs.stream import Stream
 
-from networking_ovn._i18n import _LE
+from networking_ovn._i18n import _LE, _LI, _LW
 from networking_ovn.common import config as ovn_config
+from networking_ovn.ovsdb import idl_snapshot
 from networking_ovn.ovsdb import row_event
+from networking_ovn.ovsdb import row_index
 from neutron.agent.ovsdb.native import connection
 from neutron.agent.ovsdb.native import idlutils
 from neutron.common import config
@@ -36,6 +44,131 @@ from neutron_lib.utils import helpers
 
 LOG = log.getLogger(__name__)
 
+EVENT_LOCK_NAME = 'neutron_ovn_event_lock'
+# Time in seconds a worker waits for the lock of a shard before requesting
+# the lock of the next one, and between two counts of the workers
+SHARD_LOCK_WAIT = 10
+# Time in seconds the gateways rescheduling waits for other chassis changes
+GATEWAY_RESCHEDULE_DELAY = 1
+
+
+def _shard_lock_name(shard):
+    return '%s_%d' % (EVENT_LOCK_NAME, shard)
+
+
+def _slot_lock_name(slot):
+    return '%s_worker_%d' % (EVENT_LOCK_NAME, slot)
+
+
+def _idle_lock_name(slot):
+    return '%s_idle_%d' % (EVENT_LOCK_NAME, slot)
+
+
+class LockSession(object):
+    """Connection to the ovsdb-server requesting locks.
+
+    An ovsdb idl only requests a single lock. The session requests other
+    locks over a connection of its own, without monitoring any table.
+    """
+
+    def __init__(self, remote):
+        self._session = jsonrpc.Session.open(remote)
+        self._seqno = None
+        # The time each lock is to be requested at, None once requested
+        self._requests = {}
+        # The lock names of the lock requests waiting for their reply
+        self._replies = {}
+        self._owned = set()
+        self._contended = set()
+
+    def lock(self, name, delay=0):
+        """Request the lock name after delay seconds"""
+        if name not in self._requests:
+            self._requests[name] = time.time() + delay
+
+    def unlock(self, name):
+        """Release or stop waiting for the lock name"""
+        if name not in self._requests:
+            return
+        requested = self._requests.pop(name) is None
+        self._owned.discard(name)
+        self._contended.discard(name)
+        for msg_id, lock_name in list(self._replies.items()):
+            if lock_name == name:
+                del self._replies[msg_id]
+        if requested and self._session.is_connected():
+            self._session.send(jsonrpc.Message.create_request(
+                'unlock', [name]))
+
+    def has_lock(self, name):
+        return name in self._owned
+
+    def is_lock_contended(self, name):
+        """Whether the lock name is owned by another session"""
+        return name in self._contended
+
+    def run(self):
+        self._session.run()
+        seqno = self._session.get_seqno()
+        if seqno != self._seqno:
+            # The locks are released by the ovsdb-server on disconnection,
+            # request them again.
+            self._seqno = seqno
+            self._replies.clear()
+            self._owned.clear()
+            self._contended.clear()
+            now = time.time()
+            for name, request_at in self._requests.items():
+                if request_at is None:
+                    self._requests[name] = now
+        if self._session.is_connected():
+            now = time.time()
+            for name, request_at in list(self._requests.items()):
+                if request_at is not None and now >= request_at:
+                    msg = jsonrpc.Message.create_request('lock', [name])
+                    self._replies[msg.id] = name
+                    self._session.send(msg)
+                    self._requests[name] = None
+        # The echo requests are replied by the session itself
+        for i in range(50):
+            msg = self._session.recv()
+            if msg is None:
+                break
+            self._handle_msg(msg)
+
+    def _set_owned(self, name, owned):
+        if owned:
+            self._owned.add(name)
+            self._contended.discard(name)
+        else:
+            self._owned.discard(name)
+            self._contended.add(name)
+
+    def _handle_msg(self, msg):
+        if msg.type == jsonrpc.Message.T_REPLY:
+            name = self._replies.pop(msg.id, None)
+            if name is not None and isinstance(msg.result, dict):
+                self._set_owned(name, bool(msg.result.get('locked')))
+        elif (msg.type == jsonrpc.Message.T_NOTIFY and
+                isinstance(msg.params, list) and len(msg.params) == 1 and
+                msg.params[0] in self._requests):
+            if msg.method == 'locked':
+                self._set_owned(msg.params[0], True)
+            elif msg.method == 'stolen':
+                self._set_owned(msg.params[0], False)
+
+    def wait(self, poller):
+        self._session.wait(poller)
+        self._session.recv_wait(poller)
+        pending = [request_at for request_at in self._requests.values()
+                   if request_at is not None]
+        if pending:
+            poller.timer_wait(
+                max(0, int((min(pending) - time.time()) * 1000)))
+
+    def close(self):
+        self._session.close()
+
 
 class ChassisEvent(row_event.RowEvent):
     """Chassis create update delete event."""
@@ -47,6 +180,27 @@ class ChassisEvent(row_event.RowEvent):
         events = (self.ROW_CREATE, self.ROW_UPDATE, self.ROW_DELETE)
         super(ChassisEvent, self).__init__(events, table, None)
         self.event_name = 'ChassisEvent'
+        self._reschedule_pending = False
+        self._reschedule_lock = threading.Lock()
+
+    def matches(self, event, row, old=None):
+        if not super(ChassisEvent, self).matches(event, row, old):
+            return False
+        if event != self.ROW_UPDATE:
+            return True
+        # Chassis are often updated for columns we don't use, like nb_cfg.
+        # The old row only has the columns which changed.
+        if getattr(old, 'hostname', row.hostname) != row.hostname:
+            return True
+        old_external_ids = getattr(old, 'external_ids', None)
+        if old_external_ids is None:
+            return False
+        return (old_external_ids.get('ovn-bridge-mappings') !=
+                row.external_ids.get('ovn-bridge-mappings'))
+
+    def merge_key(self, event, row):
+        # The host mapping is computed from the last state of the chassis
+        return ('chassis', row.uuid)
 
     def run(self, event, row, old):
         host = row.hostname
@@ -58,86 +212,141 @@ class ChassisEvent(row_event.RowEvent):
 
         self.driver.update_segment_host_mapping(host, phy_nets)
         if ovn_config.is_ovn_l3():
-            self.l3_plugin.schedule_unhosted_gateways()
-
+            self.schedule_unhosted_gateways()
 
-class LogicalSwitchPortCreateUpEvent(row_event.RowEvent):
-    """Row create event - Logical_Switch_Port 'up' = True.
+    def schedule_unhosted_gateways(self):
+        # The gateways are rescheduled once for a burst of chassis changes
+        with self._reschedule_lock:
+            if self._reschedule_pending:
+                return
+            self._reschedule_pending = True
+        greenthread.spawn_after(GATEWAY_RESCHEDULE_DELAY,
+                                self._reschedule_gateways)
 
-    On connection, we get a dump of all ports, so if there is a neutron
-    port that is down that has since been activated, we'll catch it here.
-    This event will not be generated for new ports getting created.
-    """
+    def _reschedule_gateways(self):
+        with self._reschedule_lock:
+            self._reschedule_pending = False
+        try:
+            self.l3_plugin.schedule_unhosted_gateways()
+        except Exception:
+            LOG.exception(_LE('Unexpected exception scheduling the unhosted '
+                              'gateways'))
 
-    def __init__(self, driver):
-        self.driver = driver
-        table = 'Logical_Switch_Port'
-        events = (self.ROW_CREATE)
-        super(LogicalSwitchPortCreateUpEvent, self).__init__(
-            events, table, (('up', '=', True),))
-        self.event_name = 'LogicalSwitchPortCreateUpEvent'
 
-    def run(self, event, row, old):
-        self.driver.set_port_status_up(row.name)
+class LogicalSwitchPortStatusEvent(row_event.RowEvent):
+    """Base class of the events reporting the status of a port.
 
+    port_up is the status of the port reported by the event.
+    """
 
-class LogicalSwitchPortCreateDownEvent(row_event.RowEvent):
-    """Row create event - Logical_Switch_Port 'up' = False
+    port_up = None
 
-    On connection, we get a dump of all ports, so if there is a neutron
-    port that is up that has since been deactivated, we'll catch it here.
-    This event will not be generated for new ports getting created.
-    """
-    def __init__(self, driver):
+    def __init__(self, driver, events, conditions, old_conditions=None):
         self.driver = driver
-        table = 'Logical_Switch_Port'
-        events = (self.ROW_CREATE)
-        super(LogicalSwitchPortCreateDownEvent, self).__init__(
-            events, table, (('up', '=', False),))
-        self.event_name = 'LogicalSwitchPortCreateDownEvent'
+        super(LogicalSwitchPortStatusEvent, self).__init__(
+            events, 'Logical_Switch_Port', conditions,
+            old_conditions=old_conditions)
+
+    def merge_key(self, event, row):
+        # Only the last status reported for a port matters
+        return ('port_status', row.uuid)
 
     def run(self, event, row, old):
-        self.driver.set_port_status_down(row.name)
+        if self.port_up:
+            self.driver.set_port_status_up(row.name)
+        else:
+            self.driver.set_port_status_down(row.name)
 
 
-class LogicalSwitchPortUpdateUpEvent(row_event.RowEvent):
+class LogicalSwitchPortUpdateUpEvent(LogicalSwitchPortStatusEvent):
     """Row update event - Logical_Switch_Port 'up' going from False to True
 
     This happens when the VM goes up.
     New value of Logical_Switch_Port 'up' will be True and the old value will
     be False.
     """
+
+    port_up = True
+
     def __init__(self, driver):
-        self.driver = driver
-        table = 'Logical_Switch_Port'
         events = (self.ROW_UPDATE)
         super(LogicalSwitchPortUpdateUpEvent, self).__init__(
-            events, table, (('up', '=', True),),
+            driver, events, (('up', '=', True),),
             old_conditions=(('up', '=', False),))
         self.event_name = 'LogicalSwitchPortUpdateUpEvent'
 
-    def run(self, event, row, old):
-        self.driver.set_port_status_up(row.name)
-
 
-class LogicalSwitchPortUpdateDownEvent(row_event.RowEvent):
+class LogicalSwitchPortUpdateDownEvent(LogicalSwitchPortStatusEvent):
     """Row update event - Logical_Switch_Port 'up' going from True to False
 
     This happens when the VM goes down.
     New value of Logical_Switch_Port 'up' will be False and the old value will
     be True.
     """
+
+    port_up = False
+
     def __init__(self, driver):
-        self.driver = driver
-        table = 'Logical_Switch_Port'
         events = (self.ROW_UPDATE)
         super(LogicalSwitchPortUpdateDownEvent, self).__init__(
-            events, table, (('up', '=', False),),
+            driver, events, (('up', '=', False),),
             old_conditions=(('up', '=', True),))
         self.event_name = 'LogicalSwitchPortUpdateDownEvent'
 
-    def run(self, event, row, old):
-        self.driver.set_port_status_down(row.name)
+
+class NotificationQueue(object):
+    """Queue of the notifications to run.
+
+    A notification put with a key replaces the notification of the same key
+    still queued, keeping its place in the queue, so that the queue holds at
+    most one notification per key. The size of the queue reaching the high
+    water mark is logged once, until it drops under half of it.
+    """
+
+    def __init__(self, high_water=0):
+        self.high_water = high_water
+        self.merged = 0
+        self.high_water_hits = 0
+        self._entries = collections.deque()
+        self._keyed_entries = {}
+        self._above_high_water = False
+        self._cond = threading.Condition()
+
+    def put(self, item, key=None):
+        with self._cond:
+            if key is not None:
+                entry = self._keyed_entries.get(key)
+                if entry is not None:
+                    entry[1] = item
+                    self.merged += 1
+                    return
+            entry = [key, item]
+            if key is not None:
+                self._keyed_entries[key] = entry
+            self._entries.append(entry)
+            if (self.high_water and not self._above_high_water and
+                    len(self._entries) >= self.high_water):
+                self._above_high_water = True
+                self.high_water_hits += 1
+                LOG.warning(_LW('The queue of the OVSDB notifications to run '
+                                'reached %d entries'), len(self._entries))
+            self._cond.notify()
+
+    def get(self):
+        with self._cond:
+            while not self._entries:
+                self._cond.wait()
+            entry = self._entries.popleft()
+            if (entry[0] is not None and
+                    self._keyed_entries.get(entry[0]) is entry):
+                del self._keyed_entries[entry[0]]
+            if (self._above_high_water and
+                    len(self._entries) < self.high_water / 2):
+                self._above_high_water = False
+            return entry[1]
+
+    def qsize(self):
+        return len(self._entries)
 
 
 class OvnDbNotifyHandler(object):
@@ -147,42 +356,77 @@ class OvnDbNotifyHandler(object):
     def __init__(self, driver):
         self.driver = driver
         self.__watched_events = set()
+        # The watched events by (table, event type)
+        self.__watched_index = {}
         self.__lock = threading.Lock()
-        self.notifications = queue.Queue()
+        self.notifications = NotificationQueue(
+            ovn_config.get_ovn_event_queue_high_water())
+        # The port statuses reported during the batch window, by port id
+        self._port_status_window = (
+            ovn_config.get_ovn_port_status_batch_window() / 1000.0)
+        self._port_statuses = collections.OrderedDict()
+        self._port_status_lock = threading.Lock()
+        # With more than one worker, the notifications of different rows
+        # are run concurrently, the ones of a row in the order they came.
+        workers = ovn_config.get_ovn_event_workers()
+        self._pool = greenpool.GreenPool(workers) if workers > 1 else None
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._event_stats = {}
+        self._stats_lock = threading.Lock()
         self.notify_thread = greenthread.spawn_n(self.notify_loop)
         atexit.register(self.shutdown)
 
+    @staticmethod
+    def _index_keys(watched_event):
+        events = watched_event.events
+        if isinstance(events, six.string_types):
+            events = (events,)
+        return [(watched_event.table, event) for event in events]
+
+    def _add_watched_event(self, watched_event):
+        self.__watched_events.add(watched_event)
+        for key in self._index_keys(watched_event):
+            self.__watched_index.setdefault(key, set()).add(watched_event)
+
+    def _remove_watched_event(self, watched_event):
+        # For ONETIME events, they should normally clear on their own
+        self.__watched_events.discard(watched_event)
+        for key in self._index_keys(watched_event):
+            watched = self.__watched_index.get(key)
+            if watched is None:
+                continue
+            watched.discard(watched_event)
+            if not watched:
+                del self.__watched_index[key]
+
     def matching_events(self, event, row, updates):
+        # Rows of tables or events nobody watches are rejected without
+        # checking the conditions of every watched event
         with self.__lock:
-            return tuple(t for t in self.__watched_events
-                         if t.matches(event, row, updates))
+            watched = self.__watched_index.get((row._table.name, event))
+            if not watched:
+                return ()
+            watched = tuple(watched)
+        return tuple(t for t in watched if t.matches(event, row, updates))
 
     def watch_event(self, event):
         with self.__lock:
-            self.__watched_events.add(event)
+            self._add_watched_event(event)
 
     def watch_events(self, events):
         with self.__lock:
             for event in events:
-                self.__watched_events.add(event)
+                self._add_watched_event(event)
 
     def unwatch_event(self, event):
         with self.__lock:
-            try:
-                self.__watched_events.remove(event)
-            except KeyError:
-                # For ONETIME events, they should normally clear on their own
-                pass
+            self._remove_watched_event(event)
 
     def unwatch_events(self, events):
         with self.__lock:
             for event in events:
-                try:
-                    self.__watched_events.remove(event)
-                except KeyError:
-                    # For ONETIME events, they should normally clear on
-                    # their own
-                    pass
+                self._remove_watched_event(event)
 
     def shutdown(self):
         self.notifications.put(OvnDbNotifyHandler.STOP_EVENT)
@@ -194,25 +438,189 @@ class OvnDbNotifyHandler(object):
                 if (not isinstance(match, row_event.RowEvent) and
                         (match, event, row, updates) == (
                             OvnDbNotifyHandler.STOP_EVENT)):
-                    self.notifications.task_done()
                     break
-                match.run(event, row, updates)
-                if match.ONETIME:
-                    self.unwatch_event(match)
-                self.notifications.task_done()
+                if self._pool is None:
+                    self._run_notification(match, event, row, updates)
+                else:
+                    self._dispatch(match, event, row, updates)
             except Exception:
                 # If any unexpected exception happens we don't want the
                 # notify_loop to exit.
                 LOG.exception(_LE('Unexpected exception in notify_loop'))
 
+    def _run_notification(self, match, event, row, updates):
+        start = time.time()
+        if (self._port_status_window and
+                isinstance(match, LogicalSwitchPortStatusEvent)):
+            self.queue_port_status(row.name, match.port_up)
+        else:
+            match.run(event, row, updates)
+        self._record_event_time(match.event_name, time.time() - start)
+        if match.ONETIME:
+            self.unwatch_event(match)
+
+    def _dispatch(self, match, event, row, updates):
+        key = (row._table.name, row.uuid)
+        with self._pending_lock:
+            pending = self._pending.get(key)
+            if pending is not None:
+                # A worker is running the notifications of this row
+                pending.append((match, event, row, updates))
+                return
+            self._pending[key] = collections.deque(
+                [(match, event, row, updates)])
+        self._pool.spawn_n(self._run_row_notifications, key)
+
+    def _run_row_notifications(self, key):
+        with self._pending_lock:
+            pending = self._pending[key]
+        while True:
+            try:
+                self._run_notification(*pending[0])
+            except Exception:
+                LOG.exception(_LE('Unexpected exception in notify_loop'))
+            with self._pending_lock:
+                pending.popleft()
+                if not pending:
+                    del self._pending[key]
+                    return
+
+    def _record_event_time(self, event_name, elapsed):
+        with self._stats_lock:
+            stats = self._event_stats.get(event_name)
+            if stats is None:
+                stats = self._event_stats[event_name] = {
+                    'count': 0, 'total_time': 0.0, 'max_time': 0.0}
+            stats['count'] += 1
+            stats['total_time'] += elapsed
+            stats['max_time'] = max(stats['max_time'], elapsed)
+
+    def get_stats(self):
+        """Return statistics about the notifications handled
+
+        :returns: A dict with the number of notifications waiting to be run
+                  in 'queue_depth', the number of notifications replaced by
+                  a later one in 'merged', the number of times the queue
+                  reached its high water mark in 'high_water_hits', and in
+                  'events' the number of runs and the total and maximum run
+                  time in seconds of each event class, by event name.
+        """
+        with self._pending_lock:
+            pending = sum(len(p) for p in self._pending.values())
+        with self._stats_lock:
+            events = {name: dict(stats)
+                      for name, stats in self._event_stats.items()}
+        return {'queue_depth': self.notifications.qsize() + pending,
+                'merged': self.notifications.merged,
+                'high_water_hits': self.notifications.high_water_hits,
+                'events': events}
+
     def notify(self, event, row, updates=None):
         matching = self.matching_events(
             event, row, updates)
         for match in matching:
-            self.notifications.put((match, event, row, updates))
+            self.notifications.put((match, event, row, updates),
+                                   key=match.merge_key(event, row))
+
+    def queue_port_status(self, port_id, up):
+        """Queue the status of a port reported by OVN
+
+        The statuses queued during the batch window are applied together,
+        and only the last status reported for a port during the window is
+        applied.
+        """
+        with self._port_status_lock:
+            if not self._port_statuses:
+                greenthread.spawn_after(self._port_status_window,
+                                        self.flush_port_statuses)
+            self._port_statuses.pop(port_id, None)
+            self._port_statuses[port_id] = up
+
+    def flush_port_statuses(self):
+        with self._port_status_lock:
+            statuses = self._port_statuses
+            self._port_statuses = collections.OrderedDict()
+        if not statuses:
+            return
+        try:
+            self.driver.set_port_statuses(
+                up_port_ids=[p for p, up in statuses.items() if up],
+                down_port_ids=[p for p, up in statuses.items() if not up])
+        except Exception:
+            LOG.exception(_LE('Unexpected exception setting the status of '
+                              'ports'))
+
+
+class OvnBaseIdl(idl.Idl):
+    """IDL maintaining secondary row indexes from its notifications."""
 
+    def __init__(self, remote, schema):
+        super(OvnBaseIdl, self).__init__(remote, schema)
+        self.row_indexes = {}
+        self._table_row_indexes = {}
+        self.snapshot = None
 
-class OvnIdl(idl.Idl):
+    def enable_snapshot(self, snapshot_dir, interval):
+        """Load the rows from a snapshot and save them every interval seconds
+
+        This must be called before the IDL connects to the ovsdb-server.
+        """
+        if not idl_snapshot.is_supported(self):
+            LOG.info(_LI('The OVSDB snapshots are not supported by this '
+                         'version of the OVS python library'))
+            return
+        self.snapshot = idl_snapshot.IdlSnapshot(self, snapshot_dir, interval)
+        self.snapshot.load()
+
+    def run(self):
+        changed = super(OvnBaseIdl, self).run()
+        if self.snapshot is not None:
+            self.snapshot.maybe_save()
+        return changed
+
+    def add_row_index(self, name, table_name, key_func):
+        """Add a RowIndex named name over the rows of table_name
+
+        Adding an index which already exists is a no-op. The index is
+        populated with the rows already present in the table.
+        """
+        if name in self.row_indexes:
+            return self.row_indexes[name]
+        index = row_index.RowIndex(self, table_name, key_func)
+        index.rebuild()
+        self.row_indexes[name] = index
+        self._table_row_indexes.setdefault(table_name, []).append(index)
+        return index
+
+    @property
+    def txn(self):
+        return self._txn
+
+    @txn.setter
+    def txn(self, txn):
+        # The transactions being built register themselves as the one of
+        # the IDL. The rows they insert are tracked by the row indexes of
+        # their table, which would otherwise have to walk all the rows of
+        # the transaction to find them.
+        self._txn = txn
+        if txn is None:
+            return
+        insert = txn.insert
+
+        def _insert(table, *args, **kwargs):
+            row = insert(table, *args, **kwargs)
+            for index in self._table_row_indexes.get(table.name, []):
+                index.add_pending(txn, row)
+            return row
+
+        txn.insert = _insert
+
+    def notify(self, event, row, updates=None):
+        for index in self._table_row_indexes.get(row._table.name, []):
+            index.notify(event, row)
+
+
+class OvnIdl(OvnBaseIdl):
 
     def __init__(self, driver, remote, schema):
         super(OvnIdl, self).__init__(remote, schema)
@@ -235,15 +643,240 @@ class OvnIdl(idl.Idl):
         #  - In case the neutron server which owns this lock goes down,
         #    ovsdb server would assign the lock to one of the other neutron
         #    servers.
-        self.event_lock_name = "neutron_ovn_event_lock"
+        #
+        # In sharded mode, the rows are spread over several shards, each
+        # with its own lock, and the OvnWorker owning the lock of a shard
+        # only handles the notify events of the rows of this shard. The
+        # worker also requests the lock of every shard over the lock
+        # session of the shard, so that the shards left without an owner
+        # are taken over by the other workers, and releases the shards it
+        # owns beyond its fair share of them when other workers join.
+        self.event_lock_name = EVENT_LOCK_NAME
+        self._remote = remote
+        self._shards = ovn_config.get_ovn_event_shards()
+        self._shard = None
+        self._shard_wait_start = None
+        self._lock_sessions = None
+        # The worker slot lock held by the worker, used to count the workers
+        self._slot = None
+        self._slot_wait_start = None
+        self._slot_names = set(_slot_lock_name(slot)
+                               for slot in range(self._shards))
+        self._slot_probes = {}
+        self._slot_probe_at = None
+        self._slots_owned = {}
+        self._workers = None
+        self._idle_workers = 0
+        self._may_release_shard = False
+        # The shards whose port statuses are reconciled
+        self._synced_shards = None
+        if self._shards:
+            self._set_shard(random.randrange(self._shards))
+
+    def _set_shard(self, shard):
+        self._shard = shard
+        self.event_lock_name = _shard_lock_name(shard)
+        self._shard_wait_start = None
+
+    def owned_shards(self):
+        """The shards whose lock is owned by the worker"""
+        shards = set(shard for shard, session
+                     in enumerate(self._lock_sessions or [])
+                     if session.has_lock(_shard_lock_name(shard)))
+        if self.has_lock or not self.is_lock_contended:
+            shards.add(self._shard)
+        return shards
+
+    def handles_row(self, row, shards=None):
+        """Whether the notify events of the row belong to our shards"""
+        if not self._shards:
+            return True
+        if shards is None:
+            shards = self.owned_shards()
+        key = str(row.uuid).encode('utf-8')
+        return (zlib.crc32(key) & 0xffffffff) % self._shards in shards
+
+    def has_event_lock(self):
+        """Whether the worker handles the notify events of some rows"""
+        if self._shards:
+            return bool(self.owned_shards())
+        return self.has_lock or not self.is_lock_contended
+
+    def run(self):
+        changed = super(OvnIdl, self).run()
+        if self._shards:
+            self._rebalance_shard()
+            self._run_lock_sessions()
+            self._sync_acquired_shards()
+        return changed
+
+    def wait(self, poller):
+        super(OvnIdl, self).wait(poller)
+        for session in self._lock_sessions or []:
+            session.wait(poller)
+
+    def close(self):
+        for session in self._lock_sessions or []:
+            session.close()
+        self._lock_sessions = None
+        super(OvnIdl, self).close()
+
+    def _run_lock_sessions(self):
+        if self._lock_sessions is None:
+            # The backup requests wait for the workers to go once through
+            # all the shards.
+            delay = (self._shards + 1) * SHARD_LOCK_WAIT
+            self._lock_sessions = [LockSession(self._remote)
+                                   for shard in range(self._shards)]
+            for shard, session in enumerate(self._lock_sessions):
+                session.lock(_shard_lock_name(shard), delay)
+            self._set_slot(self._shard)
+            self._slot_probe_at = time.time() + SHARD_LOCK_WAIT
+        owned = self.owned_shards()
+        for session in self._lock_sessions:
+            session.run()
+        for shard in self.owned_shards() - owned:
+            LOG.info(_LI("Took over the event lock %s"),
+                     _shard_lock_name(shard))
+        self._run_slot()
+        self._run_idle()
+        self._probe_slots()
+        self._release_shard()
+
+    def _set_slot(self, slot):
+        self._slot = slot
+        self._slot_wait_start = None
+        # The request of the slot being probed is kept
+        self._slot_probes.pop(_slot_lock_name(slot), None)
+        self._slot_probes.pop(_idle_lock_name(slot), None)
+        self._lock_sessions[slot].lock(_slot_lock_name(slot))
+
+    def _run_slot(self):
+        # As for the shards, a worker waiting for a slot owned by another
+        # worker moves on to the next one.
+        session = self._lock_sessions[self._slot]
+        if not session.is_lock_contended(_slot_lock_name(self._slot)):
+            self._slot_wait_start = None
+            return
+        now = time.time()
+        if self._slot_wait_start is None:
+            self._slot_wait_start = now
+        elif now - self._slot_wait_start >= SHARD_LOCK_WAIT:
+            session.unlock(_slot_lock_name(self._slot))
+            session.unlock(_idle_lock_name(self._slot))
+            self._set_slot((self._slot + 1) % self._shards)
+
+    def _run_idle(self):
+        # A worker owning no shard also owns the idle lock of its slot, so
+        # that the workers owning several shards release one of them.
+        session = self._lock_sessions[self._slot]
+        name = _idle_lock_name(self._slot)
+        if (session.has_lock(_slot_lock_name(self._slot)) and
+                not self.owned_shards()):
+            session.lock(name)
+        else:
+            session.unlock(name)
+
+    def _probe_slots(self):
+        # The workers are counted by requesting the slot and idle locks of
+        # the other workers, and releasing them as soon as the ovsdb-server
+        # tells whether they are owned.
+        for name, slot in list(self._slot_probes.items()):
+            session = self._lock_sessions[slot]
+            if session.has_lock(name) or session.is_lock_contended(name):
+                self._slots_owned[name] = session.is_lock_contended(name)
+                session.unlock(name)
+                del self._slot_probes[name]
+        if self._slot_probes or time.time() < self._slot_probe_at:
+            return
+        if self._slots_owned:
+            workers = 1 + sum(owned for name, owned
+                              in self._slots_owned.items()
+                              if name in self._slot_names)
+            if workers != self._workers:
+                LOG.info(_LI("Counted %d workers handling the events"),
+                         workers)
+            self._workers = workers
+            self._idle_workers = sum(owned for name, owned
+                                     in self._slots_owned.items()
+                                     if name not in self._slot_names)
+            self._may_release_shard = True
+        self._slots_owned = {}
+        for slot in range(self._shards):
+            if slot == self._slot:
+                continue
+            for name in (_slot_lock_name(slot), _idle_lock_name(slot)):
+                self._lock_sessions[slot].lock(name)
+                self._slot_probes[name] = slot
+        self._slot_probe_at = time.time() + SHARD_LOCK_WAIT
+
+    def _release_shard(self):
+        # A worker owning more than its fair share of the shards, or more
+        # than one shard while other workers own none, releases one of
+        # those it took over. It requests its lock again at once, so that
+        # the shard goes to the next worker waiting for it, if any. At most
+        # one shard is released per count of the workers, so that the
+        # shards are not moved on an outdated count.
+        if not self._may_release_shard:
+            return
+        fair_share = -(-self._shards // self._workers)
+        owned = self.owned_shards()
+        if len(owned) <= (1 if self._idle_workers else fair_share):
+            return
+        for shard in sorted(owned - set([self._shard])):
+            session = self._lock_sessions[shard]
+            name = _shard_lock_name(shard)
+            if session.has_lock(name):
+                LOG.info(_LI("Releasing the event lock %(lock)s, owning "
+                             "%(owned)d of the %(shards)d shards"),
+                         {'lock': name, 'owned': len(owned),
+                          'shards': self._shards})
+                session.unlock(name)
+                session.lock(name)
+                self._may_release_shard = False
+                return
+
+    def _sync_acquired_shards(self):
+        if self._synced_shards is None:
+            return
+        owned = self.owned_shards()
+        acquired = owned - self._synced_shards
+        self._synced_shards = owned
+        if acquired:
+            self.shards_acquired(acquired)
+
+    def shards_acquired(self, shards):
+        """Called when the worker acquires the locks of shards"""
+        pass
+
+    def _rebalance_shard(self):
+        # A worker waiting for the lock of a shard owned by another worker
+        # moves on to the next shard, so that the shards left by the workers
+        # going down are taken over by the idle ones.
+        if self.has_lock or not self.is_lock_contended:
+            self._shard_wait_start = None
+            return
+        now = time.time()
+        if self._shard_wait_start is None:
+            self._shard_wait_start = now
+            return
+        if now - self._shard_wait_start < SHARD_LOCK_WAIT:
+            return
+        self._set_shard((self._shard + 1) % self._shards)
+        LOG.info(_LI("Requesting the event lock %s"), self.event_lock_name)
+        self.set_lock(self.event_lock_name)
 
     def notify(self, event, row, updates=None):
+        # The row indexes are kept current regardless of the event lock.
+        super(OvnIdl, self).notify(event, row, updates)
         # Do not handle the notification if the event lock is requested,
         # but not granted by the ovsdb-server.
-        if (self.is_lock_contended and not self.has_lock):
+        if not self.has_event_lock():
             LOG.debug("Don't have the event lock to handle the notify"
                       " events. Ignoring the event : %s", event)
             return
+        if not self.handles_row(row):
+            return
         LOG.debug("Have the event lock to handle the notify events")
         self.notify_handler.notify(event, row, updates)
 
@@ -256,32 +889,51 @@ class OvnNbIdl(OvnIdl):
 
     def __init__(self, driver, remote, schema):
         super(OvnNbIdl, self).__init__(driver, remote, schema)
+        self._driver = driver
         self._lsp_update_up_event = LogicalSwitchPortUpdateUpEvent(driver)
         self._lsp_update_down_event = LogicalSwitchPortUpdateDownEvent(driver)
-        self._lsp_create_up_event = LogicalSwitchPortCreateUpEvent(driver)
-        self._lsp_create_down_event = LogicalSwitchPortCreateDownEvent(driver)
 
-        self.notify_handler.watch_events([self._lsp_create_up_event,
-                                          self._lsp_create_down_event,
-                                          self._lsp_update_up_event,
+        self.notify_handler.watch_events([self._lsp_update_up_event,
                                           self._lsp_update_down_event])
 
-    def unwatch_logical_switch_port_create_events(self):
-        """Unwatch the logical switch port create events.
+    def sync_port_statuses(self, driver, shards=None):
+        """Reconcile the status of the Neutron ports with the OVN one.
 
         When the ovs idl client connects to the ovsdb-server, it gets
-        a dump of all logical switch ports as events and we need to process
-        them at start up.
-        After the startup, there is no need to watch these events.
-        So unwatch these events.
+        a dump of all logical switch ports. Rather than handling an event
+        per port, the status of the ports is compared in bulk with the
+        Neutron one, and the update events handle the later changes.
+
+        :param shards: The shards whose ports are reconciled, by default
+                       all those owned by the worker in sharded mode.
         """
-        self.notify_handler.unwatch_events([self._lsp_create_up_event,
-                                            self._lsp_create_down_event])
-        self._lsp_create_up_event = None
-        self._lsp_create_down_event = None
+        # As for the events, only the neutron server having the event lock
+        # handles the status of the ports.
+        if not self.has_event_lock():
+            return
+        lsp_table = self.tables.get('Logical_Switch_Port')
+        if lsp_table is None:
+            return
+        if shards is None and self._shards:
+            shards = self.owned_shards()
+        port_statuses = {row.name: row.up[0]
+                         for row in lsp_table.rows.values()
+                         if row.up and self.handles_row(row, shards)}
+        try:
+            driver.sync_port_statuses(port_statuses)
+        except Exception:
+            LOG.exception(_LE('Unexpected exception reconciling the status '
+                              'of the ports'))
+
+    def shards_acquired(self, shards):
+        # The events of the rows of the shards acquired were handled by
+        # other workers until now, or not handled at all.
+        self.sync_port_statuses(self._driver, shards)
 
     def post_initialize(self, driver):
-        self.unwatch_logical_switch_port_create_events()
+        self.sync_port_statuses(driver)
+        if self._shards:
+            self._synced_shards = self.owned_shards()
 
 
 class OvnSbIdl(OvnIdl):
@@ -318,6 +970,47 @@ def _check_and_set_ssl_files(schema_name):
         Stream.ssl_set_ca_cert_file(ca_cert_file)
 
 
+def _column_ref_tables(column_json):
+    column_type = column_json['type']
+    if not isinstance(column_type, dict):
+        return set()
+    ref_tables = set()
+    for part in ('key', 'value'):
+        base_type = column_type.get(part)
+        if isinstance(base_type, dict) and 'refTable' in base_type:
+            ref_tables.add(base_type['refTable'])
+    return ref_tables
+
+
+def register_profile(helper, profile):
+    """Register the tables and columns of a profile in a schema helper
+
+    :param helper:  The ovs SchemaHelper
+    :param profile: The columns to register by table name, None meaning all
+                    the columns of the table. The tables and columns missing
+                    from the schema are skipped, and so are the columns
+                    referencing tables which are not registered.
+    """
+    tables = helper.schema_json['tables']
+    for table_name, columns in profile.items():
+        if table_name not in tables:
+            continue
+        table_columns = tables[table_name]['columns']
+        if columns is None:
+            columns = table_columns
+        helper.register_columns(
+            table_name,
+            [column for column in columns if column in table_columns and
+             _column_ref_tables(table_columns[column]) <= set(profile)])
+
+
+def _maybe_enable_snapshot(idl_):
+    snapshot_dir = ovn_config.get_ovn_idl_snapshot_dir()
+    if snapshot_dir:
+        idl_.enable_snapshot(snapshot_dir,
+                             ovn_config.get_ovn_idl_snapshot_interval())
+
+
 class OvnBaseConnection(connection.Connection):
 
     def get_schema_helper(self):
@@ -341,6 +1034,31 @@ class OvnBaseConnection(connection.Connection):
 
         return helper
 
+    def start(self, table_name_list=None, profile=None):
+        # The implementation of this function is same as the base class start()
+        # except that OvnBaseIdl object is created instead of idl.Idl.
+        with self.lock:
+            if self.idl is not None:
+                return
+
+            helper = self.get_schema_helper()
+
+            if profile is not None:
+                register_profile(helper, profile)
+            elif table_name_list is None:
+                helper.register_all()
+            else:
+                for table_name in table_name_list:
+                    helper.register_table(table_name)
+
+            self.idl = OvnBaseIdl(self.connection, helper)
+            _maybe_enable_snapshot(self.idl)
+            idlutils.wait_for_change(self.idl, self.timeout)
+            self.poller = poller.Poller()
+            self.thread = threading.Thread(target=self.run)
+            self.thread.setDaemon(True)
+            self.thread.start()
+
 
 class OvnConnection(OvnBaseConnection):
 
@@ -356,7 +1074,7 @@ class OvnConnection(OvnBaseConnection):
         # Return the ovn nb idl for the backward compatibility
         return OvnNbIdl
 
-    def start(self, driver, table_name_list=None):
+    def start(self, driver, table_name_list=None, profile=None):
         # The implementation of this function is same as the base class start()
         # except that OvnIdl object is created instead of idl.Idl.
         with self.lock:
@@ -365,7 +1083,9 @@ class OvnConnection(OvnBaseConnection):
 
             helper = self.get_schema_helper()
 
-            if table_name_list is None:
+            if profile is not None:
+                register_profile(helper, profile)
+            elif table_name_list is None:
                 helper.register_all()
             else:
                 for table_name in table_name_list:
@@ -374,6 +1094,7 @@ class OvnConnection(OvnBaseConnection):
             idl_cls = self.get_ovn_idl_cls()
             self.idl = idl_cls(driver, self.connection, helper)
             self.idl.set_lock(self.idl.event_lock_name)
+            _maybe_enable_snapshot(self.idl)
             idlutils.wait_for_change(self.idl, self.timeout)
             self.idl.post_initialize(driver)
             self.poller = poller.Poller()
@@ -66,11 +66,20 @@ class RowEvent(object):
                 # Its possible that old row may not have all columns in it
                 return False
 
+        # The arguments are only formatted if debug logging is enabled
         LOG.debug("%s : Matched %s, %s, %s %s", self.event_name, self.table,
-                  str(self.events), str(self.conditions),
-                  str(self.old_conditions))
+                  self.events, self.conditions, self.old_conditions)
         return True
 
+    def merge_key(self, event, row):
+        """Key of the queued notifications replaced by this one
+
+        A notification of the event replaces the notification of the same
+        key still waiting to be run. None, the default, means that the
+        notifications of the event are never replaced.
+        """
+        return None
+
     @abc.abstractmethod
     def run(self, event, row, old):
         """Method to run when the event matches"""
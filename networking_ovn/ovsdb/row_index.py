@@ -0,0 +1,147 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+
+from ovs.db import idl
+
+
+class RowIndex(object):
+    """Secondary index over the rows of an IDL table.
+
+    The index maps the key computed by key_func for every row of the table
+    to the rows sharing that key. It is kept current from the row
+    notifications emitted by the IDL, so that looking up a row doesn't
+    require walking the whole table. Callers can also wait for a row to be
+    indexed under a key.
+    """
+
+    def __init__(self, idl_, table_name, key_func):
+        self.idl = idl_
+        self.table_name = table_name
+        self.key_func = key_func
+        self._rows = {}
+        self._row_keys = {}
+        self._waiters = {}
+        self._waiters_lock = threading.Lock()
+        # Rows inserted by the transaction being built, not keyed yet, and
+        # keyed, which are not notified until the transaction is committed.
+        self._pending_txn = None
+        self._pending_rows = []
+        self._pending_keys = {}
+
+    def _get_key(self, row):
+        try:
+            return self.key_func(row)
+        except (KeyError, AttributeError):
+            # The row may not have all the columns the key is built from
+            return None
+
+    def _discard(self, row):
+        key = self._row_keys.pop(row.uuid, None)
+        if key is None:
+            return
+        rows = self._rows.get(key)
+        if rows is None:
+            return
+        rows.pop(row.uuid, None)
+        if not rows:
+            del self._rows[key]
+
+    def notify(self, event, row):
+        self._discard(row)
+        if event == idl.ROW_DELETE:
+            return
+        key = self._get_key(row)
+        if key is None:
+            return
+        self._row_keys[row.uuid] = key
+        self._rows.setdefault(key, {})[row.uuid] = row
+        if self._waiters:
+            with self._waiters_lock:
+                for event in self._waiters.pop(key, []):
+                    event.set()
+
+    def rebuild(self):
+        self._rows = {}
+        self._row_keys = {}
+        table = self.idl.tables.get(self.table_name)
+        if table is None:
+            return
+        for row in list(table.rows.values()):
+            self.notify(idl.ROW_CREATE, row)
+
+    def get(self, key):
+        """Return the list of rows of the table indexed under key"""
+        table = self.idl.tables[self.table_name]
+        # NOTE: The IDL replaces its rows without notifying when it
+        # reconnects to the ovsdb-server, and rows deleted by the
+        # transaction being built are removed from table.rows until it
+        # completes, so only rows still known to the table are returned.
+        rows = [row for row in list(self._rows.get(key, {}).values())
+                if table.rows.get(row.uuid) is row]
+
+        # Rows inserted by the transaction being built are already part of
+        # table.rows, but they are not notified until the ovsdb-server
+        # echoes them back after the commit.
+        rows.extend(self._get_pending(key))
+        return rows
+
+    def add_pending(self, txn, row):
+        """Track a row inserted by the transaction txn being built"""
+        if txn is not self._pending_txn:
+            self._pending_txn = txn
+            self._pending_rows = []
+            self._pending_keys = {}
+        self._pending_rows.append(row)
+
+    def _get_pending(self, key):
+        txn = self.idl.txn
+        if txn is None or txn is not self._pending_txn:
+            return []
+        # The key columns of a row are set by the command inserting it, so
+        # the rows inserted are keyed by the first lookup which follows.
+        for row in self._pending_rows:
+            row_key = self._get_key(row)
+            if row_key is not None:
+                self._pending_keys.setdefault(row_key, {})[row.uuid] = row
+        self._pending_rows = []
+        return [row for row in list(self._pending_keys.get(key, {}).values())
+                if txn._txn_rows.get(row.uuid) is row and
+                row._data is None and row._changes is not None and
+                self._get_key(row) == key]
+
+    def wait(self, key, timeout):
+        """Wait for up to timeout seconds for a row indexed under key
+
+        :returns: The list of rows of the table indexed under key, empty if
+                  none was notified before the timeout expired
+        """
+        rows = self.get(key)
+        if rows:
+            return rows
+        event = threading.Event()
+        with self._waiters_lock:
+            self._waiters.setdefault(key, []).append(event)
+        try:
+            # The row may have been notified before the waiter was added
+            rows = self.get(key)
+            if not rows and event.wait(timeout):
+                rows = self.get(key)
+        finally:
+            with self._waiters_lock:
+                waiters = self._waiters.get(key, [])
+                if event in waiters:
+                    waiters.remove(event)
+                if not waiters:
+                    self._waiters.pop(key, None)
+        return rows
@@ -12,8 +12,15 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import json
+import uuid
+import zlib
+
+import fixtures
 import mock
+from ovs.db import idl as ovs_idl
 
+from networking_ovn.common import config as ovn_config
 from networking_ovn.ovsdb import commands as cmd
 from networking_ovn.ovsdb import ovsdb_monitor
 from networking_ovn.tests.functional import base
@@ -137,6 +144,63 @@ class TestNBDbMonitor(base.TestOVNFunctionalBase):
             self.assertFalse(self.mech_driver.set_port_status_down.called)
 
 
+class TestNBDbSnapshot(base.TestOVNFunctionalBase):
+
+    def setUp(self):
+        super(TestNBDbSnapshot, self).setUp()
+        ovn_config.cfg.CONF.set_override(
+            'ovn_idl_snapshot_dir', self.useFixture(fixtures.TempDir()).path,
+            'ovn')
+
+    def _start_connection(self):
+        conn = ovsdb_monitor.OvnBaseConnection(
+            self.ovsdb_server_mgr.get_ovsdb_connection_path(), 10,
+            'OVN_Northbound')
+        conn.start()
+        if conn.idl.snapshot is None:
+            self.skipTest('The OVS python library does not support '
+                          'monitor_cond_since')
+        return conn
+
+    def _wait_for_lswitches(self, idl):
+        def get_names(idl_):
+            return set(row.name for row in
+                       idl_.tables['Logical_Switch'].rows.values())
+
+        n_utils.wait_until_true(
+            lambda: get_names(idl) == get_names(self.monitor_nb_db_idl))
+
+    def _test_snapshot(self, resume=True):
+        with self.network():
+            conn = self._start_connection()
+            self._wait_for_lswitches(conn.idl)
+            conn.idl.snapshot.save()
+            path = conn.idl.snapshot.path
+            if not resume:
+                # The ovsdb-server doesn't know the transaction of the
+                # snapshot, it must send the whole database
+                with open(path, 'rb') as f:
+                    snapshot = json.loads(zlib.decompress(f.read()))
+                snapshot['last_id'] = str(uuid.uuid4())
+                with open(path, 'wb') as f:
+                    f.write(zlib.compress(json.dumps(snapshot).encode()))
+
+            with self.network():
+                with mock.patch.object(ovs_idl.Idl, '_Idl__clear',
+                                       autospec=True,
+                                       side_effect=ovs_idl.Idl._Idl__clear
+                                       ) as mock_clear:
+                    new_conn = self._start_connection()
+                    self._wait_for_lswitches(new_conn.idl)
+                self.assertEqual(not resume, mock_clear.called)
+
+    def test_resume_from_snapshot(self):
+        self._test_snapshot()
+
+    def test_snapshot_unknown_transaction(self):
+        self._test_snapshot(resume=False)
+
+
 class TestNBDbMonitorOverTcp(TestNBDbMonitor):
     def get_ovsdb_server_protocol(self):
         return 'tcp'
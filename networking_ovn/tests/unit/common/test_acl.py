@@ -16,8 +16,10 @@ import copy
 import mock
 
 from neutron_lib import constants as const
+from ovsdbapp import exceptions as ovsdbapp_exc
 
 from networking_ovn.common import acl as ovn_acl
+from networking_ovn.common import config as ovn_config
 from networking_ovn.common import constants as ovn_const
 from networking_ovn.common import utils as ovn_utils
 from networking_ovn.ovsdb import commands as cmd
@@ -156,6 +158,74 @@ class TestACLs(base.TestCase):
                                             'from-lport',
                                             match)
 
+    def test_sg_rule_match_cache(self):
+        ovn_acl.clear_sg_rule_match_cache()
+        self.addCleanup(ovn_acl.clear_sg_rule_match_cache)
+        sg_rule = {'id': 'sgr-id',
+                   'direction': 'ingress',
+                   'ethertype': 'IPv4',
+                   'remote_group_id': None,
+                   'remote_ip_prefix': '1.1.1.0/24',
+                   'protocol': 'tcp',
+                   'port_range_min': 22,
+                   'port_range_max': 22}
+        port1 = {'id': 'port-id1', 'network_id': 'network-id'}
+        port2 = {'id': 'port-id2', 'network_id': 'network-id'}
+        with mock.patch.object(ovn_acl, 'acl_protocol_and_ports',
+                               wraps=ovn_acl.acl_protocol_and_ports) as comp:
+            acl1 = ovn_acl._add_sg_rule_acl_for_port(port1, sg_rule)
+            acl2 = ovn_acl._add_sg_rule_acl_for_port(port2, sg_rule)
+            self.assertEqual(1, comp.call_count)
+            self.assertEqual('outport == "port-id1" && ip4 && '
+                             'ip4.src == 1.1.1.0/24 && tcp && tcp.dst == 22',
+                             acl1['match'])
+            self.assertEqual('outport == "port-id2" && ip4 && '
+                             'ip4.src == 1.1.1.0/24 && tcp && tcp.dst == 22',
+                             acl2['match'])
+
+            ovn_acl.evict_sg_rule_match(sg_rule['id'])
+            ovn_acl._add_sg_rule_acl_for_port(port1, sg_rule)
+            self.assertEqual(2, comp.call_count)
+
+    @mock.patch.object(ovn_acl, '_sg_rule_match_cache', ovn_acl.LRUCache(1))
+    def test_sg_rule_match_cache_bounded(self):
+        sg_rule1, sg_rule2 = [{'id': rule_id,
+                               'direction': 'ingress',
+                               'ethertype': 'IPv4',
+                               'remote_group_id': None,
+                               'remote_ip_prefix': None,
+                               'protocol': None} for rule_id in ('sgr1',
+                                                                 'sgr2')]
+        port = {'id': 'port-id1', 'network_id': 'network-id'}
+        ovn_acl._add_sg_rule_acl_for_port(port, sg_rule1)
+        ovn_acl._add_sg_rule_acl_for_port(port, sg_rule2)
+        self.assertEqual(1, len(ovn_acl._sg_rule_match_cache))
+        self.assertIsNone(ovn_acl._sg_rule_match_cache.get('sgr1'))
+
+        # A rule deleted and created again by another process with the same
+        # id and other attributes is compiled again
+        sg_rule2['remote_ip_prefix'] = '1.1.1.0/24'
+        acl = ovn_acl._add_sg_rule_acl_for_port(port, sg_rule2)
+        self.assertEqual('outport == "port-id1" && ip4 && '
+                         'ip4.src == 1.1.1.0/24', acl['match'])
+
+    def test_acl_key(self):
+        acl = ovn_acl.add_sg_rule_acl_for_port(
+            self.fake_port, {'direction': 'ingress'}, 'fake-match')
+        # ACLs read back from the NB database carry all the ACL columns,
+        # while update_acls_for_security_group() drops lport and lswitch.
+        nb_acl = dict(acl, name=[], severity=[])
+        stripped_acl = dict(acl)
+        del stripped_acl['lport']
+        del stripped_acl['lswitch']
+        key = ovn_acl.acl_key(acl)
+        self.assertEqual(key, ovn_acl.acl_key(nb_acl))
+        self.assertEqual(key, ovn_acl.acl_key(stripped_acl))
+        self.assertEqual(self.fake_port['id'], key.lport)
+        self.assertEqual(1, len(set([key, ovn_acl.acl_key(nb_acl)])))
+        self.assertNotEqual(
+            key, ovn_acl.acl_key(dict(acl, match='other-match')))
+
     def test__update_acls_compute_difference(self):
         lswitch_name = 'lswitch-1'
         port1 = {'id': 'port-id1',
@@ -200,12 +270,12 @@ class TestACLs(base.TestCase):
         port2_acls_old = [aclport2_old1, aclport2_old2, aclport2_old3]
         acls_old_dict = {'%s' % (port1['id']): port1_acls_old,
                          '%s' % (port2['id']): port2_acls_old}
-        acl_obj_dict = {str(aclport1_old1): 'row1',
-                        str(aclport1_old2): 'row2',
-                        str(aclport1_old3): 'row3',
-                        str(aclport2_old1): 'row4',
-                        str(aclport2_old2): 'row5',
-                        str(aclport2_old3): 'row6'}
+        acl_obj_dict = {ovn_acl.acl_key(aclport1_old1): 'row1',
+                        ovn_acl.acl_key(aclport1_old2): 'row2',
+                        ovn_acl.acl_key(aclport1_old3): 'row3',
+                        ovn_acl.acl_key(aclport2_old1): 'row4',
+                        ovn_acl.acl_key(aclport2_old2): 'row5',
+                        ovn_acl.acl_key(aclport2_old3): 'row6'}
         # NEW ACLs, allow IPv6 communication
         aclport1_new1 = {'priority': 1002, 'direction': 'from-lport',
                          'lport': port1['id'], 'lswitch': lswitch_name,
@@ -303,7 +373,7 @@ class TestACLs(base.TestCase):
                                                    need_compare=False,
                                                    is_add_acl=True)
         lswitch_dict, acl_del_dict, acl_add_dict = \
-            update_cmd_add_acl._get_update_data_without_compare()
+            update_cmd_add_acl._get_update_data_without_compare(ports)
         self.assertIn('neutron-lswitch-1', lswitch_dict)
         self.assertEqual({}, acl_del_dict)
         expected_acls = {'neutron-lswitch-1': [aclport1_new, aclport2_new]}
@@ -311,11 +381,14 @@ class TestACLs(base.TestCase):
 
         # test for deleting existing acls
         acl1 = mock.Mock(
-            match='outport == port-id1 && ip4 && icmp4')
+            match='outport == port-id1 && ip4 && icmp4',
+            external_ids={'neutron:lport': port1['id']})
         acl2 = mock.Mock(
-            match='outport == port-id2 && ip4 && icmp4')
+            match='outport == port-id2 && ip4 && icmp4',
+            external_ids={'neutron:lport': port2['id']})
         acl3 = mock.Mock(
-            match='outport == port-id1 && ip4 && (ip4.src == fake_ip)')
+            match='outport == port-id1 && ip4 && (ip4.src == fake_ip)',
+            external_ids={'neutron:lport': port1['id']})
         lswitch_obj = mock.Mock(
             name='neutron-lswitch-1', acls=[acl1, acl2, acl3])
         with mock.patch('ovsdbapp.backend.ovs_idl.idlutils.row_by_value',
@@ -327,7 +400,7 @@ class TestACLs(base.TestCase):
                                                        need_compare=False,
                                                        is_add_acl=False)
             lswitch_dict, acl_del_dict, acl_add_dict = \
-                update_cmd_del_acl._get_update_data_without_compare()
+                update_cmd_del_acl._get_update_data_without_compare(ports)
             self.assertIn('neutron-lswitch-1', lswitch_dict)
             expected_acls = {'neutron-lswitch-1': [acl1, acl2]}
             self.assertEqual(expected_acls, acl_del_dict)
@@ -520,6 +593,219 @@ class TestACLs(base.TestCase):
     def test_update_acls_for_security_group_no_cache(self):
         self._test_update_acls_for_security_group(use_cache=False)
 
+    def test_update_acls_for_security_group_port_groups(self):
+        self.driver._nb_ovn.is_port_groups_supported.return_value = True
+        sg_rule = fakes.FakeSecurityGroupRule.create_one_security_group_rule({
+            'security_group_id': 'sg-id'
+        }).info()
+        pg_name = ovn_utils.ovn_port_group_name('sg-id')
+        expected_acl = ovn_acl.add_sg_rule_acl_for_port_group(pg_name,
+                                                              sg_rule)
+        lsp = mock.Mock()
+        lsp.name = 'port-id'
+        self.driver._nb_ovn.get_port_group.return_value = mock.Mock(
+            ports=[lsp])
+        self.plugin._get_port_security_group_bindings.return_value = [
+            {'port_id': 'port-id'}]
+        for is_add_acl in (True, False):
+            self.driver._nb_ovn.update_port_group_acls.reset_mock()
+            ovn_acl.update_acls_for_security_group(self.plugin,
+                                                   self.admin_context,
+                                                   self.driver._nb_ovn,
+                                                   'sg-id',
+                                                   sg_rule,
+                                                   is_add_acl=is_add_acl)
+            if is_add_acl:
+                self.driver._nb_ovn.update_port_group_acls.\
+                    assert_called_once_with(pg_name, acls_add=[expected_acl],
+                                            acls_del=[])
+            else:
+                self.driver._nb_ovn.update_port_group_acls.\
+                    assert_called_once_with(pg_name, acls_add=[],
+                                            acls_del=[expected_acl])
+        self.driver._nb_ovn.get_port_group.assert_called_with(pg_name)
+        # All the ports of the security group are in its port group
+        self.plugin.get_ports.assert_not_called()
+        self.driver._nb_ovn.update_acls.assert_not_called()
+
+    def test_update_acls_for_security_group_port_groups_not_in_group(self):
+        # Port groups were enabled after the port was created
+        self.driver._nb_ovn.is_port_groups_supported.return_value = True
+        sg_rule = fakes.FakeSecurityGroupRule.create_one_security_group_rule({
+            'security_group_id': 'sg-id'
+        }).info()
+        port = fakes.FakePort.create_one_port({
+            'security_groups': ['sg-id']}).info()
+        self.plugin.get_ports.return_value = [port]
+        self.plugin._get_port_security_group_bindings.return_value = [
+            {'port_id': port['id']}]
+        expected_acl = ovn_acl._add_sg_rule_acl_for_port(port, sg_rule)
+        expected_acl.pop('lport')
+        expected_acl.pop('lswitch')
+        for port_group in (None, mock.Mock(ports=[])):
+            self.driver._nb_ovn.get_port_group.return_value = port_group
+            self.driver._nb_ovn.update_acls.reset_mock()
+            ovn_acl.update_acls_for_security_group(self.plugin,
+                                                   self.admin_context,
+                                                   self.driver._nb_ovn,
+                                                   'sg-id',
+                                                   sg_rule)
+            self.driver._nb_ovn.update_acls.assert_called_once_with(
+                [port['network_id']], mock.ANY, {port['id']: expected_acl},
+                need_compare=False, is_add_acl=True)
+        # The rule is only added to the port group once it exists
+        self.assertEqual(
+            1, self.driver._nb_ovn.update_port_group_acls.call_count)
+
+    def test_update_acls_for_security_group_rules(self):
+        sg = fakes.FakeSecurityGroup.create_one_security_group().info()
+        sg_rule1, sg_rule2 = [
+            fakes.FakeSecurityGroupRule.create_one_security_group_rule({
+                'security_group_id': sg['id'], 'port_range_min': port,
+                'port_range_max': port, 'protocol': 'tcp'}).info()
+            for port in (22, 80)]
+        port = fakes.FakePort.create_one_port({
+            'security_groups': [sg['id']]
+        }).info()
+        self.plugin.get_ports.return_value = [port]
+        self.plugin._get_port_security_group_bindings.return_value = \
+            [{'port_id': port['id']}]
+        expected_acls = []
+        for sg_rule in (sg_rule1, sg_rule2):
+            acl = ovn_acl._add_sg_rule_acl_for_port(port, sg_rule)
+            acl.pop('lport')
+            acl.pop('lswitch')
+            expected_acls.append(acl)
+
+        ovn_acl.update_acls_for_security_group_rules(
+            self.plugin, self.admin_context, self.driver._nb_ovn, sg['id'],
+            rules_add=[sg_rule1], rules_del=[sg_rule2])
+        # The ports of the security group are only looked up once
+        self.plugin.get_ports.assert_called_once_with(
+            self.admin_context, filters={'id': [port['id']]})
+        self.driver._nb_ovn.update_acls.assert_has_calls([
+            mock.call([port['network_id']], [port],
+                      {port['id']: expected_acls[1]},
+                      need_compare=False, is_add_acl=False,
+                      may_exist=False),
+            mock.call([port['network_id']], [port],
+                      {port['id']: expected_acls[0]},
+                      need_compare=False, is_add_acl=True,
+                      may_exist=False)])
+
+    def test_update_acls_for_security_group_chunks(self):
+        ovn_config.cfg.CONF.set_override('ovn_acl_fanout_chunk_size', 2,
+                                         'ovn')
+        sg = fakes.FakeSecurityGroup.create_one_security_group().info()
+        sg_rule = fakes.FakeSecurityGroupRule.create_one_security_group_rule({
+            'security_group_id': sg['id']}).info()
+        ports = [fakes.FakePort.create_one_port({
+            'security_groups': [sg['id']]}).info() for i in range(5)]
+        self.plugin.get_ports.return_value = ports
+        sg_ports_cache = {sg['id']: [{'port_id': p['id']} for p in ports]}
+        # The transaction of the second chunk times out once
+        txns = [mock.MagicMock() for i in range(4)]
+        txns[1].__exit__.side_effect = [
+            ovsdbapp_exc.TimeoutException(commands=[], timeout=180)]
+        self.driver._nb_ovn.transaction = mock.Mock(side_effect=txns)
+
+        ovn_acl.update_acls_for_security_group(self.plugin,
+                                               self.admin_context,
+                                               self.driver._nb_ovn,
+                                               sg['id'],
+                                               sg_rule,
+                                               sg_ports_cache=sg_ports_cache)
+        self.assertEqual(4, self.driver._nb_ovn.transaction.call_count)
+        calls = self.driver._nb_ovn.update_acls.call_args_list
+        self.assertEqual([ports[0:2], ports[2:4], ports[2:4], ports[4:]],
+                         [c[0][1] for c in calls])
+        # The ACLs of the chunk attempted again may have been added
+        self.assertEqual([False, False, True, False],
+                         [c[1]['may_exist'] for c in calls])
+
+    def test_update_acls_for_security_group_chunk_failed(self):
+        ovn_config.cfg.CONF.set_override('ovn_acl_fanout_chunk_size', 1,
+                                         'ovn')
+        sg = fakes.FakeSecurityGroup.create_one_security_group().info()
+        sg_rule = fakes.FakeSecurityGroupRule.create_one_security_group_rule({
+            'security_group_id': sg['id']}).info()
+        ports = [fakes.FakePort.create_one_port({
+            'security_groups': [sg['id']]}).info() for i in range(2)]
+        self.plugin.get_ports.return_value = ports
+        sg_ports_cache = {sg['id']: [{'port_id': p['id']} for p in ports]}
+        txn = mock.MagicMock()
+        txn.__exit__.side_effect = ovsdbapp_exc.TimeoutException(
+            commands=[], timeout=180)
+        self.driver._nb_ovn.transaction = mock.Mock(return_value=txn)
+
+        self.assertRaises(ovsdbapp_exc.TimeoutException,
+                          ovn_acl.update_acls_for_security_group,
+                          self.plugin, self.admin_context,
+                          self.driver._nb_ovn, sg['id'], sg_rule,
+                          sg_ports_cache=sg_ports_cache)
+        self.assertEqual(ovn_acl.ACL_FANOUT_CHUNK_ATTEMPTS,
+                         self.driver._nb_ovn.transaction.call_count)
+
+    def test_update_acls_for_security_group_chunk_error(self):
+        ovn_config.cfg.CONF.set_override('ovn_acl_fanout_chunk_size', 1,
+                                         'ovn')
+        sg = fakes.FakeSecurityGroup.create_one_security_group().info()
+        sg_rule = fakes.FakeSecurityGroupRule.create_one_security_group_rule({
+            'security_group_id': sg['id']}).info()
+        ports = [fakes.FakePort.create_one_port({
+            'security_groups': [sg['id']]}).info() for i in range(2)]
+        self.plugin.get_ports.return_value = ports
+        sg_ports_cache = {sg['id']: [{'port_id': p['id']} for p in ports]}
+        txn = mock.MagicMock()
+        # Even when its message says so, a RuntimeError is not a timeout
+        txn.__exit__.side_effect = RuntimeError('Request timed out')
+        self.driver._nb_ovn.transaction = mock.Mock(return_value=txn)
+
+        # The errors which are not transient are not attempted again
+        self.assertRaises(RuntimeError,
+                          ovn_acl.update_acls_for_security_group,
+                          self.plugin, self.admin_context,
+                          self.driver._nb_ovn, sg['id'], sg_rule,
+                          sg_ports_cache=sg_ports_cache)
+        self.assertEqual(1, self.driver._nb_ovn.transaction.call_count)
+
+    def test_update_acls_for_security_group_rules_port_groups(self):
+        self.driver._nb_ovn.is_port_groups_supported.return_value = True
+        sg_rule1, sg_rule2 = [
+            fakes.FakeSecurityGroupRule.create_one_security_group_rule({
+                'security_group_id': 'sg-id'}).info() for i in range(2)]
+        pg_name = ovn_utils.ovn_port_group_name('sg-id')
+        self.driver._nb_ovn.get_port_group.return_value = mock.Mock(ports=[])
+        self.plugin._get_port_security_group_bindings.return_value = []
+        ovn_acl.update_acls_for_security_group_rules(
+            self.plugin, self.admin_context, self.driver._nb_ovn, 'sg-id',
+            rules_add=[sg_rule1], rules_del=[sg_rule2])
+        self.driver._nb_ovn.update_port_group_acls.assert_called_once_with(
+            pg_name,
+            acls_add=[ovn_acl.add_sg_rule_acl_for_port_group(pg_name,
+                                                             sg_rule1)],
+            acls_del=[ovn_acl.add_sg_rule_acl_for_port_group(pg_name,
+                                                             sg_rule2)])
+        self.plugin.get_ports.assert_not_called()
+
+    def test_add_sg_rule_acl_for_port_group(self):
+        sg_rule = {'id': 'sgr-id',
+                   'direction': 'ingress',
+                   'ethertype': 'IPv4',
+                   'remote_group_id': None,
+                   'remote_ip_prefix': '1.1.1.0/24',
+                   'protocol': None}
+        acl = ovn_acl.add_sg_rule_acl_for_port_group('pg_sg_id', sg_rule)
+        self.assertEqual({'priority': ovn_const.ACL_PRIORITY_ALLOW,
+                          'action': ovn_const.ACL_ACTION_ALLOW_RELATED,
+                          'log': False,
+                          'direction': 'to-lport',
+                          'match': 'outport == @pg_sg_id && ip4 && '
+                                   'ip4.src == 1.1.1.0/24',
+                          'external_ids': {
+                              ovn_const.OVN_SG_RULE_EXT_ID_KEY: 'sgr-id'}},
+                         acl)
+
     def test_acl_port_ips(self):
         port4 = fakes.FakePort.create_one_port({
             'fixed_ips': [{'subnet_id': 'subnet-ipv4',
@@ -573,3 +859,48 @@ class TestACLs(base.TestCase):
 
             addresses = ovn_acl.acl_port_ips(port)
             self.assertEqual({'ip4': [], 'ip6': []}, addresses)
+
+
+class TestResourceCache(base.TestCase):
+
+    def setUp(self):
+        super(TestResourceCache, self).setUp()
+        ovn_config.cfg.CONF.set_override('ovn_acl_cache_ttl', 5, 'ovn')
+        self.cache = ovn_acl.ResourceCache(2)
+
+    def test_get(self):
+        self.cache['sg1'] = 'sg1-value'
+        self.assertEqual('sg1-value', self.cache.get('sg1'))
+        self.assertIsNone(self.cache.get('sg2'))
+
+    @mock.patch.object(ovn_acl.time, 'time')
+    def test_get_expired(self, mock_time):
+        mock_time.return_value = 100
+        self.cache['sg1'] = 'sg1-value'
+        mock_time.return_value = 105
+        self.assertIsNone(self.cache.get('sg1'))
+        self.assertEqual(0, len(self.cache))
+
+    def test_evict_least_recently_used(self):
+        self.cache['sg1'] = 'sg1-value'
+        self.cache['sg2'] = 'sg2-value'
+        self.cache.get('sg1')
+        self.cache['sg3'] = 'sg3-value'
+        self.assertEqual(2, len(self.cache))
+        self.assertIsNone(self.cache.get('sg2'))
+        self.assertEqual('sg1-value', self.cache.get('sg1'))
+
+    def test_evict(self):
+        self.cache['sg1'] = 'sg1-value'
+        self.cache.evict('sg1')
+        self.cache.evict('sg2')
+        self.assertIsNone(self.cache.get('sg1'))
+
+    def test_get_acl_caches(self):
+        self.assertEqual((ovn_acl._sg_cache, ovn_acl._subnet_cache),
+                         ovn_acl.get_acl_caches())
+        ovn_config.cfg.CONF.set_override('ovn_acl_cache_ttl', 0, 'ovn')
+        sg_cache, subnet_cache = ovn_acl.get_acl_caches()
+        self.assertEqual({}, sg_cache)
+        self.assertEqual({}, subnet_cache)
+        self.assertIsNot(sg_cache, ovn_acl.get_acl_caches()[0])
@@ -16,6 +16,7 @@ import copy
 import mock
 
 from oslo_utils import uuidutils
+from ovsdbapp.backend.ovs_idl import idlutils
 
 
 class FakeOvsdbNbOvnIdl(object):
@@ -33,6 +34,7 @@ class FakeOvsdbNbOvnIdl(object):
         self.acl_table = FakeOvsdbTable.create_one_ovsdb_table()
         self.dhcp_options_table = FakeOvsdbTable.create_one_ovsdb_table()
         self.nat_table = FakeOvsdbTable.create_one_ovsdb_table()
+        self.port_group_table = FakeOvsdbTable.create_one_ovsdb_table()
         self._tables = {}
         self._tables['Logical_Switch'] = self.lswitch_table
         self._tables['Logical_Switch_Port'] = self.lsp_table
@@ -44,6 +46,7 @@ class FakeOvsdbNbOvnIdl(object):
         self._tables['Address_Set'] = self.addrset_table
         self._tables['DHCP_Options'] = self.dhcp_options_table
         self._tables['NAT'] = self.nat_table
+        self._tables['Port_Group'] = self.port_group_table
         self.transaction = _fake
         self.create_lswitch = mock.Mock()
         self.set_lswitch_ext_id = mock.Mock()
@@ -90,6 +93,31 @@ class FakeOvsdbNbOvnIdl(object):
         self.get_lrouter_nat_rules.return_value = []
         self.set_nat_rule_in_lrouter = mock.Mock()
         self.check_for_row_by_value_and_retry = mock.Mock()
+        self.is_port_groups_supported = mock.Mock()
+        self.is_port_groups_supported.return_value = False
+        self.create_port_group = mock.Mock()
+        self.delete_port_group = mock.Mock()
+        self.update_port_group_ports = mock.Mock()
+        self.update_port_group_acls = mock.Mock()
+        self.get_port_groups = mock.Mock()
+        self.get_port_groups.return_value = {}
+        self.get_port_group = mock.Mock()
+        self.get_port_group.return_value = None
+
+    def lookup(self, table, name, *default):
+        return idlutils.row_by_value(self.idl, table, 'name', name, *default)
+
+    def get_acls_for_lport(self, lswitch, lport):
+        return [acl for acl in getattr(lswitch, 'acls', [])
+                if getattr(acl, 'external_ids', {}).get(
+                    'neutron:lport') == lport]
+
+    def get_dhcp_options_row(self, subnet_id, port_id=None):
+        for row in self._tables['DHCP_Options'].rows.values():
+            external_ids = getattr(row, 'external_ids', {})
+            if (external_ids.get('subnet_id') == subnet_id and
+                    external_ids.get('port_id') == port_id):
+                return row
 
 
 class FakeOvsdbSbOvnIdl(object):
@@ -722,6 +722,32 @@ class OVNL3RouterPlugin(test_mech_driver.OVNMechanismDriverTestCase):
         self.l3_plugin._ovn.delete_nat_rule_in_lrouter.assert_has_calls(
             delete_nat_calls, any_order=True)
 
+    @mock.patch('networking_ovn.l3.l3_ovn.OVNL3RouterPlugin.'
+                'update_floatingip_status')
+    @mock.patch('neutron.db.l3_db.L3_NAT_dbonly_mixin.get_floatingips')
+    def test_disassociate_floatingips_failed(self, gfs, ufs):
+        gfs.return_value = [{'id': 'fip-id1',
+                             'floating_ip_address': '192.168.0.10',
+                             'router_id': 'router-id',
+                             'port_id': 'port_id',
+                             'floating_port_id': 'fip-port-id1',
+                             'fixed_ip_address': '10.0.0.10'},
+                            {'id': 'fip-id2',
+                             'floating_ip_address': '192.167.0.10',
+                             'router_id': 'router-id',
+                             'port_id': 'port_id',
+                             'floating_port_id': 'fip-port-id2',
+                             'fixed_ip_address': '10.0.0.11'}]
+        failed_txn = mock.MagicMock()
+        failed_txn.commit_async.return_value.result.side_effect = (
+            RuntimeError)
+        with mock.patch.object(self.l3_plugin._ovn, 'transaction',
+                               side_effect=[failed_txn, mock.MagicMock()]):
+            self.l3_plugin.disassociate_floatingips(self.context, 'port_id',
+                                                    do_notify=False)
+        ufs.assert_called_once_with(self.context, 'fip-id2',
+                                    constants.FLOATINGIP_STATUS_DOWN)
+
 
 class OVNL3ExtrarouteTests(test_l3_gw.ExtGwModeIntTestCase,
                            test_l3.L3NatDBIntTestCase,
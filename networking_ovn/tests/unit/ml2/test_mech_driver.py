@@ -37,6 +37,7 @@ from neutron.tests.unit.plugins.ml2 import test_plugin
 from networking_ovn.common import acl as ovn_acl
 from networking_ovn.common import constants as ovn_const
 from networking_ovn.common import utils as ovn_utils
+from networking_ovn.ml2 import mech_driver
 from networking_ovn.tests.unit import fakes
 
 
@@ -115,6 +116,46 @@ class TestOVNMechanismDriver(test_plugin.Ml2PluginV2TestCase):
         self.nb_ovn.delete_address_set.assert_has_calls(
             delete_address_set_calls, any_order=True)
 
+    def test__process_sg_notification_create_port_groups(self):
+        self.nb_ovn.is_port_groups_supported.return_value = True
+        self.mech_driver._process_sg_notification(
+            resources.SECURITY_GROUP, events.AFTER_CREATE, {},
+            security_group=self.fake_sg)
+        self.nb_ovn.create_port_group.assert_called_once_with(
+            ovn_utils.ovn_port_group_name(self.fake_sg['id']),
+            acls=ovn_acl.add_acls_for_port_group(self.fake_sg),
+            external_ids={ovn_const.OVN_SG_EXT_ID_KEY: self.fake_sg['id']})
+
+    def test__process_sg_notification_delete_port_groups(self):
+        self.nb_ovn.is_port_groups_supported.return_value = True
+        self.mech_driver._process_sg_notification(
+            resources.SECURITY_GROUP, events.BEFORE_DELETE, {},
+            security_group=self.fake_sg)
+        self.nb_ovn.delete_port_group.assert_called_once_with(
+            ovn_utils.ovn_port_group_name(self.fake_sg['id']))
+
+    @mock.patch('networking_ovn.common.acl.evict_sg_rule_match')
+    @mock.patch('networking_ovn.common.acl.evict_security_group')
+    def test__evict_sg_notification_sg_delete(self, mock_evict_sg,
+                                              mock_evict_rule):
+        self.mech_driver._evict_sg_notification(
+            resources.SECURITY_GROUP, events.AFTER_DELETE, {},
+            security_group_id='sg_id',
+            security_group_rule_ids=['sgr_id1', 'sgr_id2'])
+        mock_evict_sg.assert_called_once_with('sg_id')
+        mock_evict_rule.assert_has_calls([mock.call('sgr_id1'),
+                                          mock.call('sgr_id2')])
+
+    @mock.patch('networking_ovn.common.acl.evict_sg_rule_match')
+    @mock.patch('networking_ovn.common.acl.evict_security_group')
+    def test__evict_sg_notification_sgr_delete(self, mock_evict_sg,
+                                               mock_evict_rule):
+        self.mech_driver._evict_sg_notification(
+            resources.SECURITY_GROUP_RULE, events.AFTER_DELETE, {},
+            security_group_rule_id='sgr_id', security_group_id='sg_id')
+        mock_evict_sg.assert_called_once_with('sg_id')
+        mock_evict_rule.assert_not_called()
+
     def test__process_sg_rule_notifications_sgr_create(self):
         with mock.patch(
             'networking_ovn.common.acl.update_acls_for_security_group'
@@ -137,12 +178,142 @@ class TestOVNMechanismDriver(test_plugin.Ml2PluginV2TestCase):
                 'SecurityGroupDbMixin.get_security_group_rule',
                 return_value=rule
             ):
+                with mock.patch('networking_ovn.common.acl.'
+                                'evict_sg_rule_match') as evict:
+                    self.mech_driver._process_sg_rule_notification(
+                        resources.SECURITY_GROUP_RULE, events.BEFORE_DELETE,
+                        {}, security_group_rule=rule,
+                        security_group_rule_id='sgr_id')
+                    ovn_acl_up.assert_called_once_with(
+                        mock.ANY, mock.ANY, mock.ANY,
+                        'sg_id', rule, is_add_acl=False)
+                    evict.assert_called_once_with('sgr_id')
+
+    @mock.patch('networking_ovn.ml2.mech_driver.greenthread.spawn_after')
+    @mock.patch('networking_ovn.common.acl.'
+                'update_acls_for_security_group_rules')
+    def test_process_sg_rule_notifications_batched(self, mock_update_acls,
+                                                   mock_spawn_after):
+        self.mech_driver._sg_rule_window = 0.1
+        rule1 = {'id': 'sgr_id1', 'security_group_id': 'sg_id'}
+        rule2 = {'id': 'sgr_id2', 'security_group_id': 'sg_id'}
+        rule3 = {'id': 'sgr_id3', 'security_group_id': 'sg_id'}
+        for rule in (rule1, rule2):
+            self.mech_driver._process_sg_rule_notification(
+                resources.SECURITY_GROUP_RULE, events.AFTER_CREATE, {},
+                security_group_rule=rule)
+        with mock.patch(
+            'neutron.db.securitygroups_db.'
+            'SecurityGroupDbMixin.get_security_group_rule',
+            side_effect=[rule2, rule3]
+        ):
+            for rule in (rule2, rule3):
                 self.mech_driver._process_sg_rule_notification(
                     resources.SECURITY_GROUP_RULE, events.BEFORE_DELETE, {},
-                    security_group_rule=rule)
-                ovn_acl_up.assert_called_once_with(
-                    mock.ANY, mock.ANY, mock.ANY,
-                    'sg_id', rule, is_add_acl=False)
+                    security_group_rule_id=rule['id'])
+        mock_spawn_after.assert_called_once_with(
+            0.1, self.mech_driver._flush_sg_rule_changes, 'sg_id')
+        mock_update_acls.assert_not_called()
+
+        self.mech_driver._flush_sg_rule_changes('sg_id')
+        # The ACLs of the rule created then deleted are never added
+        mock_update_acls.assert_called_once_with(
+            mock.ANY, mock.ANY, self.mech_driver._nb_ovn, 'sg_id',
+            rules_add=[rule1], rules_del=[rule3], may_exist=False)
+        self.assertEqual({}, self.mech_driver._sg_rule_changes)
+
+    @mock.patch('networking_ovn.ml2.mech_driver.greenthread.spawn_after')
+    @mock.patch('networking_ovn.common.acl.'
+                'update_acls_for_security_group_rules')
+    def test_flush_sg_rule_changes_serialized(self, mock_update_acls,
+                                              mock_spawn_after):
+        self.mech_driver._sg_rule_window = 0.1
+        rule = {'id': 'sgr_id1', 'security_group_id': 'sg_id'}
+        self.mech_driver._queue_sg_rule_change('sg_id', rule, True)
+
+        def slow_flush(*args, **kwargs):
+            if mock_update_acls.call_count == 1:
+                # The rule is deleted while the ACLs of its creation are
+                # being added, and the deletion window ends meanwhile.
+                self.mech_driver._queue_sg_rule_change('sg_id', rule, False)
+                self.mech_driver._flush_sg_rule_changes('sg_id')
+
+        mock_update_acls.side_effect = slow_flush
+        self.mech_driver._flush_sg_rule_changes('sg_id')
+        self.assertEqual(1, mock_update_acls.call_count)
+        # The deletion is flushed once the creation is done
+        self.assertEqual(2, mock_spawn_after.call_count)
+        self.mech_driver._flush_sg_rule_changes('sg_id')
+        self.assertEqual([
+            mock.call(mock.ANY, mock.ANY, self.mech_driver._nb_ovn, 'sg_id',
+                      rules_add=[rule], rules_del=[], may_exist=False),
+            mock.call(mock.ANY, mock.ANY, self.mech_driver._nb_ovn, 'sg_id',
+                      rules_add=[], rules_del=[rule], may_exist=False)],
+            mock_update_acls.call_args_list)
+        self.assertEqual({}, self.mech_driver._sg_rule_changes)
+        self.assertEqual(set(), self.mech_driver._sg_rule_flushing)
+
+    @mock.patch('networking_ovn.ml2.mech_driver.greenthread.spawn_after')
+    @mock.patch('networking_ovn.common.acl.'
+                'update_acls_for_security_group_rules')
+    def test_flush_sg_rule_changes_failed(self, mock_update_acls,
+                                          mock_spawn_after):
+        self.mech_driver._sg_rule_window = 0.1
+        rule1 = {'id': 'sgr_id1', 'security_group_id': 'sg_id'}
+        rule2 = {'id': 'sgr_id2', 'security_group_id': 'sg_id'}
+        self.mech_driver._queue_sg_rule_change('sg_id', rule1, True)
+        mock_update_acls.side_effect = [RuntimeError('error'), None]
+        self.mech_driver._flush_sg_rule_changes('sg_id')
+        # The failed changes are flushed again after the batch window
+        self.assertEqual(2, mock_spawn_after.call_count)
+        mock_spawn_after.assert_called_with(
+            0.1, self.mech_driver._flush_sg_rule_changes, 'sg_id')
+        self.mech_driver._queue_sg_rule_change('sg_id', rule2, True)
+        self.assertEqual(2, mock_spawn_after.call_count)
+
+        self.mech_driver._flush_sg_rule_changes('sg_id')
+        mock_update_acls.assert_called_with(
+            mock.ANY, mock.ANY, self.mech_driver._nb_ovn, 'sg_id',
+            rules_add=[rule1, rule2], rules_del=[], may_exist=True)
+        self.assertEqual({}, self.mech_driver._sg_rule_changes)
+        self.assertEqual({}, self.mech_driver._sg_rule_resyncs)
+
+    @mock.patch('networking_ovn.ml2.mech_driver.greenthread.spawn_after')
+    @mock.patch('networking_ovn.common.acl.'
+                'update_acls_for_security_group_rules')
+    def test_flush_sg_rule_changes_failed_attempts(self, mock_update_acls,
+                                                   mock_spawn_after):
+        self.mech_driver._sg_rule_window = 0.1
+        rule = {'id': 'sgr_id1', 'security_group_id': 'sg_id'}
+        self.mech_driver._queue_sg_rule_change('sg_id', rule, True)
+        mock_update_acls.side_effect = RuntimeError('error')
+        for i in range(mech_driver.SG_RULE_FLUSH_ATTEMPTS + 1):
+            self.mech_driver._flush_sg_rule_changes('sg_id')
+        self.assertEqual(mech_driver.SG_RULE_FLUSH_ATTEMPTS,
+                         mock_update_acls.call_count)
+        self.assertEqual(mech_driver.SG_RULE_FLUSH_ATTEMPTS,
+                         mock_spawn_after.call_count)
+        self.assertEqual({}, self.mech_driver._sg_rule_changes)
+        self.assertEqual({}, self.mech_driver._sg_rule_resyncs)
+
+    @mock.patch('networking_ovn.ml2.mech_driver.greenthread.spawn_after')
+    @mock.patch('networking_ovn.common.acl.'
+                'update_acls_for_security_group_rules')
+    def test_flush_all_sg_rule_changes(self, mock_update_acls,
+                                       mock_spawn_after):
+        self.mech_driver._sg_rule_window = 0.1
+        rule1 = {'id': 'sgr_id1', 'security_group_id': 'sg_id1'}
+        rule2 = {'id': 'sgr_id2', 'security_group_id': 'sg_id2'}
+        self.mech_driver._queue_sg_rule_change('sg_id1', rule1, True)
+        self.mech_driver._queue_sg_rule_change('sg_id2', rule2, False)
+        self.mech_driver._flush_all_sg_rule_changes()
+        mock_update_acls.assert_has_calls([
+            mock.call(mock.ANY, mock.ANY, self.mech_driver._nb_ovn, 'sg_id1',
+                      rules_add=[rule1], rules_del=[], may_exist=False),
+            mock.call(mock.ANY, mock.ANY, self.mech_driver._nb_ovn, 'sg_id2',
+                      rules_add=[], rules_del=[rule2], may_exist=False)],
+            any_order=True)
+        self.assertEqual({}, self.mech_driver._sg_rule_changes)
 
     def test_add_acls_no_sec_group(self):
         acls = ovn_acl.add_acls(self.mech_driver._plugin,
@@ -448,6 +619,55 @@ class TestOVNMechanismDriver(test_plugin.Ml2PluginV2TestCase):
     def test_create_port_with_security_groups_native_dhcp_enabled(self):
         self._test_create_port_with_security_groups_helper(7)
 
+    def test_create_port_with_security_groups_port_groups(self):
+        self.nb_ovn.is_port_groups_supported.return_value = True
+        # Only the DHCP ACL is created for the port.
+        self._test_create_port_with_security_groups_helper(1)
+        self.assertEqual(2, self.nb_ovn.update_port_group_ports.call_count)
+        pg_names = [c[0][0] for c in
+                    self.nb_ovn.update_port_group_ports.call_args_list]
+        self.assertIn(ovn_const.OVN_DROP_PORT_GROUP_NAME, pg_names)
+
+    def test_create_ports_in_ovn(self):
+        self.nb_ovn.is_port_groups_supported.return_value = True
+        with self.network(set_context=True, tenant_id='test') as net1:
+            with self.subnet(network=net1) as subnet1:
+                with self.port(subnet=subnet1, set_context=True,
+                               tenant_id='test') as port1, \
+                        self.port(subnet=subnet1, set_context=True,
+                                  tenant_id='test') as port2:
+                    ports = [port1['port'], port2['port']]
+                    sg_id = ports[0]['security_groups'][0]
+                    ports_info = [
+                        (port, self.mech_driver.get_ovn_port_options(port))
+                        for port in ports]
+                    self.nb_ovn.create_lswitch_port.reset_mock()
+                    self.nb_ovn.update_port_group_ports.reset_mock()
+                    self.nb_ovn.update_address_set.reset_mock()
+                    self.nb_ovn.check_for_row_by_value_and_retry.reset_mock()
+
+                    self.mech_driver.create_ports_in_ovn(ports_info)
+
+                    self.assertEqual(
+                        2, self.nb_ovn.create_lswitch_port.call_count)
+                    self.nb_ovn.check_for_row_by_value_and_retry.\
+                        assert_called_once_with(
+                            'Logical_Switch', 'name',
+                            ovn_utils.ovn_name(net1['network']['id']))
+                    port_ids = [port['id'] for port in ports]
+                    self.nb_ovn.update_port_group_ports.assert_has_calls([
+                        mock.call(ovn_utils.ovn_port_group_name(sg_id),
+                                  lports_add=port_ids, if_exists=False),
+                        mock.call(ovn_const.OVN_DROP_PORT_GROUP_NAME,
+                                  lports_add=port_ids, if_exists=False)])
+                    self.assertEqual(
+                        1, self.nb_ovn.update_address_set.call_count)
+                    addrs = self.nb_ovn.update_address_set.call_args[1][
+                        'addrs_add']
+                    self.assertItemsEqual(
+                        [port['fixed_ips'][0]['ip_address']
+                         for port in ports], addrs)
+
     def test_update_port_changed_security_groups(self):
         with self.network(set_context=True, tenant_id='test') as net1:
             with self.subnet(network=net1) as subnet1:
@@ -481,6 +701,122 @@ class TestOVNMechanismDriver(test_plugin.Ml2PluginV2TestCase):
                     self.assertEqual(
                         1, self.nb_ovn.update_address_set.call_count)
 
+    def test_update_port_changed_security_groups_port_groups(self):
+        self.nb_ovn.is_port_groups_supported.return_value = True
+        with self.network(set_context=True, tenant_id='test') as net1:
+            with self.subnet(network=net1) as subnet1:
+                with self.port(subnet=subnet1,
+                               set_context=True, tenant_id='test') as port1:
+                    port_id = port1['port']['id']
+                    sg_id = port1['port']['security_groups'][0]
+
+                    # Remove the default security group.
+                    self.nb_ovn.update_port_group_ports.reset_mock()
+                    data = {'port': {'security_groups': []}}
+                    self._update('ports', port_id, data)
+                    self.nb_ovn.update_port_group_ports.assert_has_calls([
+                        mock.call(ovn_utils.ovn_port_group_name(sg_id),
+                                  lports_del=[port_id]),
+                        mock.call(ovn_const.OVN_DROP_PORT_GROUP_NAME,
+                                  lports_del=[port_id])])
+
+                    # Add the default security group.
+                    self.nb_ovn.update_port_group_ports.reset_mock()
+                    data = {'port': {'security_groups': [sg_id]}}
+                    self._update('ports', port_id, data)
+                    self.nb_ovn.update_port_group_ports.assert_has_calls([
+                        mock.call(ovn_utils.ovn_port_group_name(sg_id),
+                                  lports_add=[port_id], if_exists=False),
+                        mock.call(ovn_const.OVN_DROP_PORT_GROUP_NAME,
+                                  lports_add=[port_id], if_exists=False)])
+
+    def test_create_port_port_groups_missing(self):
+        # The security group was created before port groups were enabled
+        self.nb_ovn.is_port_groups_supported.return_value = True
+        with self.network(set_context=True, tenant_id='test') as net1:
+            with self.subnet(network=net1) as subnet1:
+                with self.port(subnet=subnet1,
+                               set_context=True, tenant_id='test') as port1:
+                    sg_id = port1['port']['security_groups'][0]
+                    sg = self._show('security-groups', sg_id)[
+                        'security_group']
+                    drop_acls = ovn_acl.drop_all_ip_traffic_for_port_group()
+                    external_ids = {ovn_const.OVN_SG_EXT_ID_KEY: sg_id}
+                    self.nb_ovn.create_port_group.assert_has_calls([
+                        mock.call(ovn_const.OVN_DROP_PORT_GROUP_NAME,
+                                  acls=drop_acls),
+                        mock.call(ovn_utils.ovn_port_group_name(sg_id),
+                                  acls=ovn_acl.add_acls_for_port_group(sg),
+                                  external_ids=external_ids)])
+                    self.nb_ovn.update_port_group_ports.assert_has_calls([
+                        mock.call(ovn_utils.ovn_port_group_name(sg_id),
+                                  lports_add=[port1['port']['id']],
+                                  if_exists=False)])
+
+    def test_create_port_port_groups_exist(self):
+        self.nb_ovn.is_port_groups_supported.return_value = True
+        self.nb_ovn.get_port_group.return_value = mock.Mock()
+        with self.network(set_context=True, tenant_id='test') as net1:
+            with self.subnet(network=net1) as subnet1:
+                with self.port(subnet=subnet1,
+                               set_context=True, tenant_id='test'):
+                    self.nb_ovn.create_port_group.assert_not_called()
+
+    def test_create_missing_port_groups_created_concurrently(self):
+        pg_name = ovn_utils.ovn_port_group_name(self.fake_sg['id'])
+        txn = mock.MagicMock()
+        txn.__exit__.side_effect = RuntimeError
+        self.nb_ovn.transaction = mock.Mock(return_value=txn)
+        with mock.patch.object(self.mech_driver._plugin,
+                               'get_security_group',
+                               return_value=self.fake_sg):
+            # Another worker created the port groups first
+            self.nb_ovn.get_port_group.side_effect = [None, None,
+                                                      mock.Mock(),
+                                                      mock.Mock()]
+            self.mech_driver._create_missing_port_groups(
+                mock.Mock(), [self.fake_sg['id']])
+
+            self.nb_ovn.get_port_group.side_effect = [None, None,
+                                                      mock.Mock(), None]
+            self.assertRaises(RuntimeError,
+                              self.mech_driver._create_missing_port_groups,
+                              mock.Mock(), [self.fake_sg['id']])
+        self.nb_ovn.create_port_group.assert_called_with(
+            pg_name, acls=ovn_acl.add_acls_for_port_group(self.fake_sg),
+            external_ids={ovn_const.OVN_SG_EXT_ID_KEY: self.fake_sg['id']})
+
+    def test_update_port_port_groups_enabled_after_creation(self):
+        with self.network(set_context=True, tenant_id='test') as net1:
+            with self.subnet(network=net1) as subnet1:
+                with self.port(subnet=subnet1,
+                               set_context=True, tenant_id='test') as port1:
+                    port_id = port1['port']['id']
+                    sg_id = port1['port']['security_groups'][0]
+                    self.nb_ovn.update_port_group_ports.assert_not_called()
+
+                    # Enable port groups over the existing security group
+                    # and port, then update the fixed IPs of the port.
+                    self.nb_ovn.is_port_groups_supported.return_value = True
+                    data = {'port': {'fixed_ips': [{
+                        'subnet_id': subnet1['subnet']['id'],
+                        'ip_address': '10.0.0.10'}]}}
+                    self._update('ports', port_id, data)
+                    self.assertEqual(
+                        2, self.nb_ovn.create_port_group.call_count)
+                    # The port, whose own security group ACLs are removed,
+                    # is added to the port groups of all its security
+                    # groups.
+                    self.nb_ovn.update_port_group_ports.assert_has_calls([
+                        mock.call(ovn_utils.ovn_port_group_name(sg_id),
+                                  lports_add=[port_id], if_exists=False),
+                        mock.call(ovn_const.OVN_DROP_PORT_GROUP_NAME,
+                                  lports_add=[port_id], if_exists=False)])
+                    acls = self.nb_ovn.update_acls.call_args[0][2][port_id]
+                    self.assertFalse([acl for acl in acls
+                                      if acl['priority'] ==
+                                      ovn_const.ACL_PRIORITY_DROP])
+
     def test_update_port_unchanged_security_groups(self):
         with self.network(set_context=True, tenant_id='test') as net1:
             with self.subnet(network=net1) as subnet1:
@@ -510,6 +846,21 @@ class TestOVNMechanismDriver(test_plugin.Ml2PluginV2TestCase):
                     self.assertEqual(
                         1, self.nb_ovn.update_address_set.call_count)
 
+    def test_update_port_not_ovn_attributes(self):
+        with self.network(set_context=True, tenant_id='test') as net1:
+            with self.subnet(network=net1) as subnet1:
+                with self.port(subnet=subnet1,
+                               set_context=True, tenant_id='test') as port1:
+                    self.nb_ovn.set_lswitch_port.reset_mock()
+                    data = {'port': {'description': 'rtheis'}}
+                    self._update('ports', port1['port']['id'], data)
+                    self.nb_ovn.set_lswitch_port.assert_not_called()
+
+                    data = {'port': {'admin_state_up': False}}
+                    self._update('ports', port1['port']['id'], data)
+                    self.assertEqual(
+                        1, self.nb_ovn.set_lswitch_port.call_count)
+
     def test_delete_port_without_security_groups(self):
         kwargs = {'security_groups': []}
         with self.network(set_context=True, tenant_id='test') as net1:
@@ -597,6 +948,72 @@ class TestOVNMechanismDriver(test_plugin.Ml2PluginV2TestCase):
                     provisioning_blocks.L2_AGENT_ENTITY
                 )
 
+    def test_set_port_statuses(self):
+        with self.network(set_context=True, tenant_id='test') as net1, \
+            self.subnet(network=net1) as subnet1, \
+            self.port(subnet=subnet1, set_context=True,
+                      tenant_id='test') as port1, \
+            self.port(subnet=subnet1, set_context=True,
+                      tenant_id='test') as port2, \
+            mock.patch('neutron.db.provisioning_blocks.'
+                       'provisioning_complete') as pc, \
+            mock.patch('neutron.db.provisioning_blocks.'
+                       'add_provisioning_component') as apc:
+                self.mech_driver.set_port_statuses(
+                    up_port_ids=[port1['port']['id']],
+                    down_port_ids=[port2['port']['id'], 'foo'])
+                pc.assert_called_once_with(
+                    mock.ANY,
+                    port1['port']['id'],
+                    resources.PORT,
+                    provisioning_blocks.L2_AGENT_ENTITY
+                )
+                apc.assert_called_once_with(
+                    mock.ANY,
+                    port2['port']['id'],
+                    resources.PORT,
+                    provisioning_blocks.L2_AGENT_ENTITY
+                )
+
+    def test_set_port_statuses_port_failed(self):
+        ports = [{'id': 'port3', 'status': const.PORT_STATUS_ACTIVE}]
+        with mock.patch('neutron.db.provisioning_blocks.'
+                        'provisioning_complete',
+                        side_effect=[RuntimeError, None]) as pc, \
+                mock.patch.object(self.mech_driver._plugin, 'get_ports',
+                                  return_value=ports), \
+                mock.patch.object(self.mech_driver,
+                                  '_insert_port_provisioning_block'), \
+                mock.patch.object(self.mech_driver._plugin,
+                                  'update_port_status') as ups:
+            self.mech_driver.set_port_statuses(
+                up_port_ids=['port1', 'port2'], down_port_ids=['port3'])
+        # The ports after the failed one are still updated
+        self.assertEqual(2, pc.call_count)
+        self.assertEqual('port2', pc.call_args[0][1])
+        ups.assert_called_once_with(mock.ANY, 'port3',
+                                    const.PORT_STATUS_DOWN)
+
+    def test_sync_port_statuses(self):
+        ports = [{'id': 'port1', 'status': const.PORT_STATUS_DOWN},
+                 {'id': 'port2', 'status': const.PORT_STATUS_DOWN},
+                 {'id': 'port3', 'status': const.PORT_STATUS_ACTIVE},
+                 {'id': 'port4', 'status': const.PORT_STATUS_BUILD}]
+        with mock.patch.object(self.mech_driver._plugin, 'get_ports',
+                               return_value=ports) as gp, \
+                mock.patch.object(self.mech_driver,
+                                  'set_port_statuses') as sps:
+            self.mech_driver.sync_port_statuses(
+                {'port1': True, 'port2': False, 'port3': True,
+                 'port4': False, 'provnet-foo': True})
+        self.assertEqual(1, gp.call_count)
+        self.assertItemsEqual(
+            ['port1', 'port2', 'port3', 'port4', 'provnet-foo'],
+            gp.call_args[1]['filters']['id'])
+        # port2 is already down and port3 already active
+        sps.assert_called_once_with(up_port_ids=['port1'],
+                                    down_port_ids=['port4'])
+
     def test_bind_port_unsupported_vnic_type(self):
         fake_port = fakes.FakePort.create_one_port(
             attrs={'binding:vnic_type': 'unknown'}).info()
@@ -845,9 +845,11 @@ class TestUpdateACLsCommand(TestBaseCommand):
                    'acls': []})
         add_acl = ovn_acl.add_sg_rule_acl_for_port(
             fake_port, fake_sg_rule, 'add_acl')
+        del_acl = ovn_acl.add_sg_rule_acl_for_port(
+            fake_port, fake_sg_rule, 'del_acl')
         self.ovn_api.get_acls_for_lswitches.return_value = (
-            {fake_port['id']: [fake_del_acl.match]},
-            {fake_del_acl.match: fake_del_acl},
+            {fake_port['id']: [del_acl]},
+            {ovn_acl.acl_key(del_acl): fake_del_acl},
             {fake_lswitch.name.replace('neutron-', ''): fake_lswitch})
         cmd = commands.UpdateACLsCommand(
             self.ovn_api, [fake_port['network_id']],
@@ -858,6 +860,7 @@ class TestUpdateACLsCommand(TestBaseCommand):
         self.transaction.insert.assert_called_once_with(
             self.ovn_api._tables['ACL'])
         fake_lswitch.addvalue.assert_called_with('acls', fake_add_acl.uuid)
+        fake_lswitch.delvalue.assert_called_with('acls', fake_del_acl)
 
     def test_acl_update_no_compare_add_acls(self):
         fake_sg_rule = \
@@ -883,15 +886,44 @@ class TestUpdateACLsCommand(TestBaseCommand):
             fake_lswitch.addvalue.assert_called_once_with(
                 'acls', fake_acl.uuid)
 
-    def test_acl_update_no_compare_del_acls(self):
+    def test_acl_update_no_compare_add_acls_may_exist(self):
         fake_sg_rule = \
             fakes.FakeSecurityGroupRule.create_one_security_group_rule().info()
         fake_port = fakes.FakePort.create_one_port().info()
+        # The ACL was added by a transaction that timed out
         fake_acl = fakes.FakeOvsdbRow.create_one_ovsdb_row(
-            attrs={'match': '*'})
+            attrs={'match': '*',
+                   'external_ids': {'neutron:lport': fake_port['id']}})
         fake_lswitch = fakes.FakeOvsdbRow.create_one_ovsdb_row(
             attrs={'name': ovn_utils.ovn_name(fake_port['network_id']),
                    'acls': [fake_acl]})
+        add_acl = ovn_acl.add_sg_rule_acl_for_port(
+            fake_port, fake_sg_rule, '*')
+        with mock.patch.object(idlutils, 'row_by_value',
+                               return_value=fake_lswitch):
+            cmd = commands.UpdateACLsCommand(
+                self.ovn_api, [fake_port['network_id']],
+                [fake_port], {fake_port['id']: add_acl},
+                need_compare=False,
+                is_add_acl=True,
+                may_exist=True)
+            cmd.run_idl(self.transaction)
+            self.transaction.insert.assert_not_called()
+            fake_lswitch.addvalue.assert_not_called()
+
+    def test_acl_update_no_compare_del_acls(self):
+        fake_sg_rule = \
+            fakes.FakeSecurityGroupRule.create_one_security_group_rule().info()
+        fake_port = fakes.FakePort.create_one_port().info()
+        fake_acl = fakes.FakeOvsdbRow.create_one_ovsdb_row(
+            attrs={'match': '*',
+                   'external_ids': {'neutron:lport': fake_port['id']}})
+        fake_other_acl = fakes.FakeOvsdbRow.create_one_ovsdb_row(
+            attrs={'match': '*',
+                   'external_ids': {'neutron:lport': 'other-port'}})
+        fake_lswitch = fakes.FakeOvsdbRow.create_one_ovsdb_row(
+            attrs={'name': ovn_utils.ovn_name(fake_port['network_id']),
+                   'acls': [fake_acl, fake_other_acl]})
         del_acl = ovn_acl.add_sg_rule_acl_for_port(
             fake_port, fake_sg_rule, '*')
         with mock.patch.object(idlutils, 'row_by_value',
@@ -903,7 +935,8 @@ class TestUpdateACLsCommand(TestBaseCommand):
                 is_add_acl=False)
             cmd.run_idl(self.transaction)
             self.transaction.insert.assert_not_called()
-            fake_lswitch.delvalue.assert_called_with('acls', mock.ANY)
+            fake_lswitch.delvalue.assert_called_once_with('acls', fake_acl)
+            fake_other_acl.delete.assert_not_called()
 
 
 class TestAddStaticRouteCommand(TestBaseCommand):
@@ -1152,6 +1185,222 @@ class TestUpdateAddrSetExtIdsCommand(TestBaseCommand):
             self.assertEqual(new_ext_ids, fake_addrset.external_ids)
 
 
+class TestCoalesceAddressSetUpdates(TestBaseCommand):
+
+    def _update(self, name, addrs_add=None, addrs_remove=None,
+                if_exists=True):
+        return commands.UpdateAddrSetCommand(
+            self.ovn_api, name, addrs_add=addrs_add,
+            addrs_remove=addrs_remove, if_exists=if_exists)
+
+    def test_single_update_untouched(self):
+        other = mock.Mock()
+        update = self._update('as1', addrs_add=['10.0.0.1'])
+        self.assertEqual(
+            [other, update],
+            commands.coalesce_address_set_updates([other, update]))
+
+    def test_updates_folded(self):
+        other = mock.Mock()
+        cmds = [self._update('as1', addrs_add=['10.0.0.1', '10.0.0.2']),
+                other,
+                self._update('as2', addrs_add=['10.0.0.5']),
+                self._update('as1', addrs_add=['10.0.0.3'],
+                             addrs_remove=['10.0.0.2', '10.0.0.4'],
+                             if_exists=False),
+                self._update('as1', addrs_add=['10.0.0.4'])]
+        result = commands.coalesce_address_set_updates(cmds)
+        self.assertEqual(3, len(result))
+        self.assertIs(other, result[1])
+        self.assertIs(cmds[2], result[2])
+        merged = result[0]
+        self.assertEqual('as1', merged.name)
+        self.assertEqual(['10.0.0.1', '10.0.0.3', '10.0.0.4'],
+                         merged.addrs_add)
+        self.assertEqual(['10.0.0.2'], merged.addrs_remove)
+        self.assertFalse(merged.if_exists)
+
+    def test_updates_not_folded_across_delete(self):
+        cmds = [self._update('as1', addrs_add=['10.0.0.1']),
+                commands.DelAddrSetCommand(self.ovn_api, 'as1', True),
+                commands.AddAddrSetCommand(self.ovn_api, 'as1', True),
+                self._update('as1', addrs_add=['10.0.0.2']),
+                self._update('as1', addrs_remove=['10.0.0.2'])]
+        result = commands.coalesce_address_set_updates(cmds)
+        self.assertEqual(cmds[:3], result[:3])
+        self.assertEqual(4, len(result))
+        self.assertIsNone(result[3].addrs_add)
+        self.assertEqual(['10.0.0.2'], result[3].addrs_remove)
+
+
+class TestAddPortGroupCommand(TestBaseCommand):
+
+    def test_port_group_exists(self):
+        with mock.patch.object(idlutils, 'row_by_value',
+                               return_value=mock.ANY):
+            cmd = commands.AddPortGroupCommand(
+                self.ovn_api, 'fake_pg', may_exist=True)
+            cmd.run_idl(self.transaction)
+            self.transaction.insert.assert_not_called()
+
+    def test_port_group_add(self):
+        fake_pg = fakes.FakeOvsdbRow.create_one_ovsdb_row(
+            attrs={'external_ids': {}})
+        fake_acl = fakes.FakeOvsdbRow.create_one_ovsdb_row(
+            attrs={'match': ''})
+        self.transaction.insert.side_effect = [fake_pg, fake_acl]
+        with mock.patch.object(idlutils, 'row_by_value',
+                               return_value=None):
+            cmd = commands.AddPortGroupCommand(
+                self.ovn_api, 'fake_pg', may_exist=True,
+                acls=[{'match': 'inport == @fake_pg && ip'}],
+                external_ids={'foo': 'bar'})
+            cmd.run_idl(self.transaction)
+        self.transaction.insert.assert_has_calls([
+            mock.call(self.ovn_api._tables['Port_Group']),
+            mock.call(self.ovn_api._tables['ACL'])])
+        self.assertEqual('fake_pg', fake_pg.name)
+        self.assertEqual({'foo': 'bar'}, fake_pg.external_ids)
+        self.assertEqual('inport == @fake_pg && ip', fake_acl.match)
+        fake_pg.addvalue.assert_called_once_with('acls', fake_acl.uuid)
+
+
+class TestDelPortGroupCommand(TestBaseCommand):
+
+    def _test_port_group_del_no_exist(self, if_exists=True):
+        with mock.patch.object(idlutils, 'row_by_value',
+                               side_effect=idlutils.RowNotFound):
+            cmd = commands.DelPortGroupCommand(
+                self.ovn_api, 'fake_pg', if_exists=if_exists)
+            if if_exists:
+                cmd.run_idl(self.transaction)
+            else:
+                self.assertRaises(RuntimeError, cmd.run_idl, self.transaction)
+
+    def test_port_group_no_exist_ignore(self):
+        self._test_port_group_del_no_exist(if_exists=True)
+
+    def test_port_group_no_exist_fail(self):
+        self._test_port_group_del_no_exist(if_exists=False)
+
+    def test_port_group_del(self):
+        fake_pg = fakes.FakeOvsdbRow.create_one_ovsdb_row()
+        with mock.patch.object(idlutils, 'row_by_value',
+                               return_value=fake_pg):
+            cmd = commands.DelPortGroupCommand(
+                self.ovn_api, fake_pg.name, if_exists=True)
+            cmd.run_idl(self.transaction)
+            fake_pg.delete.assert_called_once_with()
+
+
+class TestUpdatePortGroupPortsCommand(TestBaseCommand):
+
+    def _test_port_group_update_no_exist(self, if_exists=True):
+        with mock.patch.object(idlutils, 'row_by_value',
+                               side_effect=idlutils.RowNotFound):
+            cmd = commands.UpdatePortGroupPortsCommand(
+                self.ovn_api, 'fake_pg', lports_add=['fake-lsp'],
+                lports_del=None, if_exists=if_exists)
+            if if_exists:
+                cmd.run_idl(self.transaction)
+            else:
+                self.assertRaises(RuntimeError, cmd.run_idl, self.transaction)
+
+    def test_port_group_no_exist_ignore(self):
+        self._test_port_group_update_no_exist(if_exists=True)
+
+    def test_port_group_no_exist_fail(self):
+        self._test_port_group_update_no_exist(if_exists=False)
+
+    def test_port_group_update_ports(self):
+        fake_pg = fakes.FakeOvsdbRow.create_one_ovsdb_row()
+        fake_lsp_add = fakes.FakeOvsdbRow.create_one_ovsdb_row()
+        fake_lsp_del = fakes.FakeOvsdbRow.create_one_ovsdb_row()
+        rows = {'fake_pg': fake_pg, 'lsp-add': fake_lsp_add,
+                'lsp-del': fake_lsp_del}
+
+        def _row_by_value(idl, table, column, match, *default):
+            if match in rows:
+                return rows[match]
+            if default:
+                return default[0]
+            raise idlutils.RowNotFound(table=table, col=column, match=match)
+
+        with mock.patch.object(idlutils, 'row_by_value',
+                               side_effect=_row_by_value):
+            cmd = commands.UpdatePortGroupPortsCommand(
+                self.ovn_api, 'fake_pg', lports_add=['lsp-add'],
+                lports_del=['lsp-del', 'lsp-gone'], if_exists=True)
+            cmd.run_idl(self.transaction)
+            fake_pg.addvalue.assert_called_once_with(
+                'ports', fake_lsp_add.uuid)
+            fake_pg.delvalue.assert_called_once_with('ports', fake_lsp_del)
+
+            cmd = commands.UpdatePortGroupPortsCommand(
+                self.ovn_api, 'fake_pg', lports_add=['lsp-gone'],
+                lports_del=None, if_exists=True)
+            self.assertRaises(RuntimeError, cmd.run_idl, self.transaction)
+
+            # The missing ports are skipped, the others are still added
+            fake_pg.addvalue.reset_mock()
+            cmd = commands.UpdatePortGroupPortsCommand(
+                self.ovn_api, 'fake_pg', lports_add=['lsp-gone', 'lsp-add'],
+                lports_del=None, if_exists=True, skip_missing_lports=True)
+            cmd.run_idl(self.transaction)
+            fake_pg.addvalue.assert_called_once_with(
+                'ports', fake_lsp_add.uuid)
+
+
+class TestUpdatePortGroupACLsCommand(TestBaseCommand):
+
+    def _test_port_group_update_no_exist(self, if_exists=True):
+        with mock.patch.object(idlutils, 'row_by_value',
+                               side_effect=idlutils.RowNotFound):
+            cmd = commands.UpdatePortGroupACLsCommand(
+                self.ovn_api, 'fake_pg', acls_add=[], acls_del=[],
+                if_exists=if_exists)
+            if if_exists:
+                cmd.run_idl(self.transaction)
+            else:
+                self.assertRaises(RuntimeError, cmd.run_idl, self.transaction)
+
+    def test_port_group_no_exist_ignore(self):
+        self._test_port_group_update_no_exist(if_exists=True)
+
+    def test_port_group_no_exist_fail(self):
+        self._test_port_group_update_no_exist(if_exists=False)
+
+    def test_port_group_update_acls(self):
+        acl_keep = {'priority': 1002, 'direction': 'to-lport',
+                    'action': 'allow-related', 'log': False,
+                    'match': 'outport == @fake_pg && ip4'}
+        acl_del = dict(acl_keep, match='outport == @fake_pg && ip6')
+        acl_add = dict(acl_keep, match='outport == @fake_pg && tcp')
+        fake_acl_keep = fakes.FakeOvsdbRow.create_one_ovsdb_row(
+            attrs=acl_keep)
+        fake_acl_del = fakes.FakeOvsdbRow.create_one_ovsdb_row(
+            attrs=acl_del)
+        fake_acl_add = fakes.FakeOvsdbRow.create_one_ovsdb_row(
+            attrs={'match': ''})
+        fake_pg = fakes.FakeOvsdbRow.create_one_ovsdb_row(
+            attrs={'acls': [fake_acl_keep, fake_acl_del]})
+        self.transaction.insert.return_value = fake_acl_add
+        with mock.patch.object(idlutils, 'row_by_value',
+                               return_value=fake_pg):
+            cmd = commands.UpdatePortGroupACLsCommand(
+                self.ovn_api, fake_pg.name,
+                acls_add=[acl_add, acl_keep], acls_del=[acl_del],
+                if_exists=True)
+            cmd.run_idl(self.transaction)
+        self.transaction.insert.assert_called_once_with(
+            self.ovn_api._tables['ACL'])
+        self.assertEqual(acl_add['match'], fake_acl_add.match)
+        fake_acl_del.delete.assert_called_once_with()
+        fake_acl_keep.delete.assert_not_called()
+        fake_pg.addvalue.assert_called_once_with('acls', fake_acl_add.uuid)
+        fake_pg.delvalue.assert_called_once_with('acls', fake_acl_del)
+
+
 class TestAddDHCPOptionsCommand(TestBaseCommand):
 
     def test_dhcp_options_exists(self):
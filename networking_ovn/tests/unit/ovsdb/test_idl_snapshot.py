@@ -0,0 +1,162 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import stat
+import uuid
+
+import fixtures
+import mock
+from ovs.db import data
+from ovs.db import idl as ovs_idl
+
+from networking_ovn.ovsdb import idl_snapshot
+from networking_ovn.tests import base
+from networking_ovn.tests.unit.ovsdb import test_ovsdb_monitor
+
+TXN_ID = str(uuid.UUID(int=1))
+
+
+class TestIdlSnapshot(base.TestCase):
+
+    def setUp(self):
+        super(TestIdlSnapshot, self).setUp()
+        self.snapshot_dir = self.useFixture(fixtures.TempDir()).path
+        self.idl = self._create_idl()
+        if not idl_snapshot.is_supported(self.idl):
+            self.skipTest('The OVS python library does not support '
+                          'monitor_cond_since')
+        self.snapshot = idl_snapshot.IdlSnapshot(self.idl, self.snapshot_dir,
+                                                 300)
+
+    def _create_idl(self, tables=None):
+        helper = ovs_idl.SchemaHelper(
+            schema_json=test_ovsdb_monitor.OVN_NB_SCHEMA)
+        if tables is None:
+            helper.register_all()
+        else:
+            for table in tables:
+                helper.register_table(table)
+        return ovs_idl.Idl('remote', helper)
+
+    def _add_port(self, name, addresses):
+        table = self.idl.tables['Logical_Switch_Port']
+        row_uuid = uuid.uuid4()
+        row_data = {}
+        for column_name, column in table.columns.items():
+            row_data[column_name] = data.Datum.default(column.type)
+        row_data['name'] = data.Datum.from_json(table.columns['name'].type,
+                                                name)
+        row_data['addresses'] = data.Datum.from_json(
+            table.columns['addresses'].type, ['set', addresses])
+        table.rows[row_uuid] = ovs_idl.Row(self.idl, table, row_uuid,
+                                           row_data)
+        return row_uuid
+
+    def test_save_and_load(self):
+        port_uuid = self._add_port('lsp1', ['00:00:00:00:00:01 10.0.0.1'])
+        self.idl.last_id = TXN_ID
+        self.snapshot.save()
+
+        new_idl = self._create_idl()
+        snapshot = idl_snapshot.IdlSnapshot(new_idl, self.snapshot_dir, 300)
+        self.assertEqual(self.snapshot.path, snapshot.path)
+        self.assertTrue(snapshot.load())
+        self.assertEqual(TXN_ID, new_idl.last_id)
+        row = new_idl.tables['Logical_Switch_Port'].rows[port_uuid]
+        self.assertEqual('lsp1', row.name)
+        self.assertEqual(['00:00:00:00:00:01 10.0.0.1'], row.addresses)
+        self.assertEqual([], row.up)
+        self.assertEqual({}, new_idl.tables['Logical_Switch'].rows)
+
+    def test_save_permissions(self):
+        self._add_port('lsp1', [])
+        self.idl.last_id = TXN_ID
+        self.addCleanup(os.umask, os.umask(0))
+        self.snapshot.save()
+        self.assertEqual(0o600,
+                         stat.S_IMODE(os.stat(self.snapshot.path).st_mode))
+
+    @mock.patch.object(idl_snapshot.greenthread, 'spawn_n')
+    def test_save_background(self, mock_spawn_n):
+        port_uuid = self._add_port('lsp1', ['00:00:00:00:00:01 10.0.0.1'])
+        self.idl.last_id = TXN_ID
+        self.snapshot.save(background=True)
+        mock_spawn_n.assert_called_once_with(
+            self.snapshot._save_in_background, TXN_ID, mock.ANY)
+        self.assertFalse(os.path.exists(self.snapshot.path))
+
+        # No other save starts until this one is done
+        self.snapshot.save(background=True)
+        self.assertEqual(1, mock_spawn_n.call_count)
+
+        # The rows changed by the IDL meanwhile are saved as they were
+        table = self.idl.tables['Logical_Switch_Port']
+        table.rows[port_uuid]._data['name'] = data.Datum.from_json(
+            table.columns['name'].type, 'lsp2')
+        self.snapshot._save_in_background(*mock_spawn_n.call_args[0][1:])
+        self.assertFalse(self.snapshot._saving)
+
+        new_idl = self._create_idl()
+        snapshot = idl_snapshot.IdlSnapshot(new_idl, self.snapshot_dir, 300)
+        self.assertTrue(snapshot.load())
+        row = new_idl.tables['Logical_Switch_Port'].rows[port_uuid]
+        self.assertEqual('lsp1', row.name)
+
+    def test_save_without_transaction(self):
+        self._add_port('lsp1', [])
+        self.snapshot.save()
+        self.assertFalse(os.path.exists(self.snapshot.path))
+
+    def test_load_no_snapshot(self):
+        self.assertFalse(self.snapshot.load())
+        self.assertEqual(idl_snapshot.ZERO_TXN_ID, self.idl.last_id)
+
+    def test_load_corrupted_snapshot(self):
+        with open(self.snapshot.path, 'wb') as f:
+            f.write(b'corrupted')
+        self.assertFalse(self.snapshot.load())
+        self.assertEqual(idl_snapshot.ZERO_TXN_ID, self.idl.last_id)
+
+    def test_load_other_columns(self):
+        self._add_port('lsp1', [])
+        self.idl.last_id = TXN_ID
+        self.snapshot.save()
+
+        # The IDLs monitoring other columns use another snapshot
+        new_idl = self._create_idl(tables=['Logical_Switch_Port'])
+        snapshot = idl_snapshot.IdlSnapshot(new_idl, self.snapshot_dir, 300)
+        self.assertNotEqual(self.snapshot.path, snapshot.path)
+        self.assertFalse(snapshot.load())
+
+        os.rename(self.snapshot.path, snapshot.path)
+        self.assertFalse(snapshot.load())
+        self.assertEqual({}, new_idl.tables['Logical_Switch_Port'].rows)
+        self.assertEqual(idl_snapshot.ZERO_TXN_ID, new_idl.last_id)
+
+    @mock.patch.object(idl_snapshot.IdlSnapshot, 'save')
+    def test_maybe_save(self, mock_save):
+        self.snapshot.maybe_save()
+        mock_save.assert_not_called()
+
+        self.snapshot._next_save = 0
+        self.snapshot.maybe_save()
+        mock_save.assert_called_once_with(background=True)
+        self.assertGreater(self.snapshot._next_save, 0)
+
+    @mock.patch.object(idl_snapshot.IdlSnapshot, 'save')
+    def test_maybe_save_refreshed_by_other_worker(self, mock_save):
+        with open(self.snapshot.path, 'wb') as f:
+            f.write(b'')
+        self.snapshot._next_save = 0
+        self.snapshot.maybe_save()
+        mock_save.assert_not_called()
@@ -14,11 +14,15 @@
 
 import copy
 import mock
+import threading
+
+from ovsdbapp import exceptions as ovsdbapp_exc
 
 from networking_ovn.common import config
 from networking_ovn.common import constants as ovn_const
 from networking_ovn.common import utils
 from networking_ovn.ovsdb import impl_idl_ovn
+from networking_ovn.ovsdb import ovn_api
 from networking_ovn.tests import base
 from networking_ovn.tests.unit import fakes
 
@@ -530,6 +534,28 @@ class TestNBImplIdlOvn(TestDBImplIdlOvn):
         self.assertEqual(len(acl_objs), 0)
         self.assertEqual(len(lswitch_ovsdb_dict), 0)
 
+    def test_get_acls_for_lswitches_with_ports(self):
+        self._load_nb_db()
+        lswitches = ['ls-id-1', 'ls-id-2']
+        ports = [{'id': 'lsp-id-11', 'network_id': 'ls-id-1'},
+                 {'id': 'lsp-id-21', 'network_id': 'ls-id-2'}]
+        acl_values, acl_objs, lswitch_ovsdb_dict = \
+            self.nb_ovn_idl.get_acls_for_lswitches(lswitches, ports=ports)
+        self.assertItemsEqual(['lsp-id-11', 'lsp-id-21'], acl_values)
+        self.assertEqual(len(acl_objs), 4)
+        self.assertEqual(len(lswitch_ovsdb_dict), len(lswitches))
+
+    def test_get_acls_for_lport(self):
+        self._load_nb_db()
+        lswitch = self._find_ovsdb_fake_row(
+            self.lswitch_table, 'name', utils.ovn_name('ls-id-1'))
+        acls = self.nb_ovn_idl.get_acls_for_lport(lswitch, 'lsp-id-12')
+        self.assertEqual(2, len(acls))
+        for acl in acls:
+            self.assertEqual('lsp-id-12', acl.external_ids['neutron:lport'])
+        self.assertEqual(
+            [], self.nb_ovn_idl.get_acls_for_lport(lswitch, 'lsp-id-21'))
+
     def test_get_all_chassis_gateway_bindings(self):
         self._load_nb_db()
         bindings = self.nb_ovn_idl.get_all_chassis_gateway_bindings()
@@ -637,6 +663,20 @@ class TestNBImplIdlOvn(TestDBImplIdlOvn):
             ['port-id-30-0-1-0', 'fake-not-exist'])
         self.assertEqual([], subnets_options)
 
+    def test_get_dhcp_options_row(self):
+        self._load_nb_db()
+        row = self.nb_ovn_idl.get_dhcp_options_row('subnet-id-10-0-3-0')
+        self.assertIsNone(row)
+        row = self.nb_ovn_idl.get_dhcp_options_row('subnet-id-10-0-3-0',
+                                                   'lsp-vpn-id-3')
+        self.assertEqual(
+            self._find_ovsdb_fake_row(self.dhcp_table, 'cidr', '10.0.3.0/24'),
+            row)
+        row = self.nb_ovn_idl.get_dhcp_options_row('subnet-id-20-0-1-0')
+        self.assertEqual(
+            self._find_ovsdb_fake_row(self.dhcp_table, 'cidr', '20.0.1.0/24'),
+            row)
+
     def test_get_all_dhcp_options(self):
         self._load_nb_db()
         dhcp_options = self.nb_ovn_idl.get_all_dhcp_options()
@@ -652,6 +692,242 @@ class TestNBImplIdlOvn(TestDBImplIdlOvn):
         address_sets = self.nb_ovn_idl.get_address_sets()
         self.assertEqual(len(address_sets), 4)
 
+    def test_check_for_row_by_value_and_retry_waits_on_index(self):
+        index = mock.Mock()
+        index.wait.return_value = [mock.Mock()]
+        with mock.patch.object(self.nb_ovn_idl, '_get_row_index',
+                               return_value=index):
+            self.nb_ovn_idl.check_for_row_by_value_and_retry(
+                'Logical_Switch', 'name', 'ls1')
+        index.wait.assert_called_once_with(
+            'ls1', impl_idl_ovn.ROW_WAIT_TIMEOUT)
+
+    def test_check_for_row_by_value_and_retry_timeout(self):
+        index = mock.Mock()
+        index.wait.return_value = []
+        with mock.patch.object(self.nb_ovn_idl, '_get_row_index',
+                               return_value=index):
+            self.assertRaises(
+                RuntimeError,
+                self.nb_ovn_idl.check_for_row_by_value_and_retry,
+                'Logical_Switch', 'name', 'ls1')
+
+
+class TestTransactionBatcher(base.TestCase):
+
+    def setUp(self):
+        super(TestTransactionBatcher, self).setUp()
+        self.batcher = impl_idl_ovn.TransactionBatcher(0, 10)
+
+    def _make_txn(self, *commands):
+        txn = impl_idl_ovn.NbTransaction(
+            mock.Mock(), mock.Mock(), 10, check_error=True,
+            batcher=self.batcher)
+        txn.commands.extend(commands)
+        return txn
+
+    def _make_batch(self, *txns):
+        batch = impl_idl_ovn._TransactionBatch()
+        batch.txns.extend(txns)
+        return batch
+
+    def test_commit_through_batcher(self):
+        txn = self._make_txn(mock.Mock())
+        with mock.patch.object(self.batcher, 'commit') as mock_commit:
+            txn.commit()
+        mock_commit.assert_called_once_with(txn)
+
+    def test_commit_without_commands(self):
+        txn = self._make_txn()
+        with mock.patch.object(self.batcher, 'commit') as mock_commit, \
+                mock.patch.object(txn, 'commit_alone') as mock_alone:
+            txn.commit()
+        mock_commit.assert_not_called()
+        mock_alone.assert_called_once_with()
+
+    def test_commit_single_transaction(self):
+        txn = self._make_txn(mock.Mock())
+        with mock.patch.object(impl_idl_ovn.NbTransaction, 'commit_alone',
+                               return_value='result') as mock_alone:
+            self.assertEqual('result', self.batcher.commit(txn))
+        mock_alone.assert_called_once_with()
+        self.assertIsNone(self.batcher._batch)
+
+    def test_commit_batch(self):
+        cmd1 = mock.Mock(result='r1')
+        cmd2 = mock.Mock(result='r2')
+        batch = self._make_batch(self._make_txn(cmd1),
+                                 self._make_txn(cmd2))
+        committed = []
+
+        def commit_alone(txn):
+            committed.append(list(txn.commands))
+
+        with mock.patch.object(impl_idl_ovn.NbTransaction, 'commit_alone',
+                               autospec=True, side_effect=commit_alone):
+            self.batcher._commit_batch(batch)
+        self.assertEqual([[cmd1, cmd2]], committed)
+        self.assertFalse(batch.split)
+        self.assertTrue(batch.done.is_set())
+
+    def test_commit_batch_failed(self):
+        batch = self._make_batch(self._make_txn(mock.Mock()),
+                                 self._make_txn(mock.Mock()))
+        with mock.patch.object(impl_idl_ovn.NbTransaction, 'commit_alone',
+                               side_effect=RuntimeError):
+            self.batcher._commit_batch(batch)
+        self.assertTrue(batch.split)
+        self.assertTrue(batch.done.is_set())
+
+    def test_commit_batch_timeout(self):
+        batch = self._make_batch(self._make_txn(mock.Mock()),
+                                 self._make_txn(mock.Mock()))
+        error = ovsdbapp_exc.TimeoutException(commands=[], timeout=10)
+        with mock.patch.object(impl_idl_ovn.NbTransaction, 'commit_alone',
+                               side_effect=error):
+            self.batcher._commit_batch(batch)
+        # The batch may have been committed, it is not committed again
+        self.assertFalse(batch.split)
+        self.assertIs(error, batch.error)
+        self.assertTrue(batch.done.is_set())
+
+    def test_commit_joins_timed_out_batch(self):
+        batch = self._make_batch()
+        batch.split = False
+        batch.error = ovsdbapp_exc.TimeoutException(commands=[], timeout=10)
+        batch.done.set()
+        self.batcher._batch = batch
+        txn = self._make_txn(mock.Mock(result='r1'))
+        with mock.patch.object(impl_idl_ovn.NbTransaction,
+                               'commit_alone') as mock_alone:
+            self.assertRaises(ovsdbapp_exc.TimeoutException,
+                              self.batcher.commit, txn)
+        mock_alone.assert_not_called()
+
+    @mock.patch.object(impl_idl_ovn.idl_trans.Transaction, 'do_commit',
+                       side_effect=RuntimeError('OVS transaction timed out'))
+    def test_do_commit_timeout(self, mock_do_commit):
+        txn = self._make_txn(mock.Mock())
+        with mock.patch.object(txn, 'timeout_exceeded', return_value=True):
+            self.assertRaises(ovsdbapp_exc.TimeoutException, txn.do_commit)
+        with mock.patch.object(txn, 'timeout_exceeded', return_value=False):
+            self.assertRaises(RuntimeError, txn.do_commit)
+
+    def test_commit_joins_open_batch(self):
+        batch = self._make_batch()
+        batch.split = False
+        batch.done.set()
+        self.batcher._batch = batch
+        txn = self._make_txn(mock.Mock(result='r1'))
+        with mock.patch.object(impl_idl_ovn.NbTransaction,
+                               'commit_alone') as mock_alone:
+            self.assertEqual(['r1'], self.batcher.commit(txn))
+        mock_alone.assert_not_called()
+        self.assertEqual([txn], batch.txns)
+
+
+class TestTransactionFuture(base.TestCase):
+
+    def _make_txn(self, **commit_kwargs):
+        txn = impl_idl_ovn.NbTransaction(mock.Mock(), mock.Mock(), 10,
+                                         check_error=True)
+        txn.commands.append(mock.Mock())
+        txn.commit = mock.Mock(**commit_kwargs)
+        return txn
+
+    def test_commit_async(self):
+        txn = self._make_txn(return_value=['r1'])
+        self.assertIsInstance(txn, ovn_api.Transaction)
+        future = txn.commit_async()
+        self.assertEqual(['r1'], future.result())
+        self.assertTrue(future.done())
+        txn.commit.assert_called_once_with()
+
+    def test_commit_async_failed(self):
+        txn = self._make_txn(side_effect=RuntimeError)
+        future = txn.commit_async()
+        self.assertRaises(RuntimeError, future.result)
+        self.assertTrue(future.done())
+
+
+class TestLazyOvnIdl(base.TestCase):
+
+    def setUp(self):
+        super(TestLazyOvnIdl, self).setUp()
+        self.cls = mock.Mock(__name__='OvsdbNbOvnIdl')
+        self.trigger = mock.Mock()
+        self.idl = impl_idl_ovn.LazyOvnIdl(self.cls, mock.sentinel.driver,
+                                           self.trigger)
+
+    def test_connect_on_first_use(self):
+        self.assertFalse(self.idl.connected)
+        self.cls.assert_not_called()
+        self.assertEqual(self.cls.return_value.get_all_chassis.return_value,
+                         self.idl.get_all_chassis())
+        self.idl.is_port_groups_supported()
+        self.assertTrue(self.idl.connected)
+        self.cls.assert_called_once_with(mock.sentinel.driver, self.trigger)
+
+    def test_connect_failed(self):
+        self.cls.side_effect = impl_idl_ovn.OvsdbConnectionUnavailable(
+            db_schema='OVN_Northbound', error='error')
+        self.assertRaises(impl_idl_ovn.OvsdbConnectionUnavailable,
+                          getattr, self.idl, 'transaction')
+        self.assertFalse(self.idl.connected)
+
+    @mock.patch.object(impl_idl_ovn.tenacity, 'wait_exponential')
+    def test_connect_during_warm_up_retries(self, mock_wait):
+        mock_wait.return_value = impl_idl_ovn.tenacity.wait_fixed(1)
+        self.trigger.im_class.__name__ = 'OvnWorker'
+        failed = threading.Event()
+        callers = []
+
+        def create_idl(driver, trigger):
+            callers.append(threading.current_thread())
+            if len(callers) == 1:
+                failed.set()
+                raise impl_idl_ovn.OvsdbConnectionUnavailable(
+                    db_schema='OVN_Northbound', error='error')
+            return mock.sentinel.idl
+
+        self.cls.side_effect = create_idl
+        warm_up = threading.Thread(target=self.idl.connect,
+                                   kwargs={'retry': True})
+        warm_up.start()
+        failed.wait(5)
+        # The caller not retrying does not wait for the warm-up retries
+        self.assertEqual(mock.sentinel.idl, self.idl.connect())
+        warm_up.join(5)
+        self.assertFalse(warm_up.is_alive())
+        self.assertEqual([warm_up, threading.current_thread()], callers)
+        self.assertEqual(mock.sentinel.idl, self.idl.connect(retry=True))
+
+    @mock.patch.object(impl_idl_ovn.greenthread, 'spawn_after')
+    def test_warm_up(self, mock_spawn_after):
+        self.idl.warm_up(5)
+        mock_spawn_after.assert_called_once_with(5, self.idl.connect,
+                                                 retry=True)
+        self.cls.assert_not_called()
+
+    @mock.patch.object(impl_idl_ovn.LazyOvnIdl, 'warm_up')
+    @mock.patch.object(impl_idl_ovn, '_get_ovn_idl_retry')
+    def test_get_ovn_idls_lazy(self, mock_get_idl, mock_warm_up):
+        config.cfg.CONF.set_override('ovn_idl_warmup_window', 30, 'ovn')
+        nb_idl, sb_idl = impl_idl_ovn.get_ovn_idls(
+            mock.sentinel.driver, self.trigger, lazy=True)
+        self.assertIsInstance(nb_idl, impl_idl_ovn.LazyOvnIdl)
+        self.assertIsInstance(sb_idl, impl_idl_ovn.LazyOvnIdl)
+        mock_get_idl.assert_not_called()
+        self.assertEqual(2, mock_warm_up.call_count)
+        for call in mock_warm_up.call_args_list:
+            self.assertTrue(0 <= call[0][0] <= 30)
+
+    @mock.patch.object(impl_idl_ovn.LazyOvnIdl, 'warm_up')
+    def test_get_ovn_idls_lazy_no_warm_up(self, mock_warm_up):
+        impl_idl_ovn.get_ovn_idls(mock.sentinel.driver, self.trigger,
+                                  lazy=True)
+        mock_warm_up.assert_not_called()
+
 
 class TestSBImplIdlOvn(TestDBImplIdlOvn):
 
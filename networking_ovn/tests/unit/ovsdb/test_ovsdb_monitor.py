@@ -12,6 +12,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import copy
 import mock
 
@@ -105,40 +106,34 @@ class TestOvnNbIdlNotifyHandler(test_mech_driver.OVNMechanismDriverTestCase):
         # Execute the notifications queued
         self.idl.notify_handler.notify_loop()
 
-    def test_lsp_up_create_event(self):
+    def test_lsp_create_event(self):
         row_data = {"up": True, "name": "foo-name"}
         self._test_lsp_helper('create', row_data)
-        self.driver.set_port_status_up.assert_called_once_with("foo-name")
-        self.assertFalse(self.driver.set_port_status_down.called)
-
-    def test_lsp_down_create_event(self):
-        row_data = {"up": False, "name": "foo-name"}
-        self._test_lsp_helper('create', row_data)
-        self.driver.set_port_status_down.assert_called_once_with("foo-name")
-        self.assertFalse(self.driver.set_port_status_up.called)
-
-    def test_lsp_up_not_set_event(self):
-        row_data = {"up": ['set', []], "name": "foo-name"}
-        self._test_lsp_helper('create', row_data)
         self.assertFalse(self.driver.set_port_status_up.called)
         self.assertFalse(self.driver.set_port_status_down.called)
 
-    def test_unwatch_logical_switch_port_create_events(self):
-        self.idl.unwatch_logical_switch_port_create_events()
-        row_data = {"up": True, "name": "foo-name"}
-        self._test_lsp_helper('create', row_data)
-        self.assertFalse(self.driver.set_port_status_up.called)
-        self.assertFalse(self.driver.set_port_status_down.called)
-
-        row_data["up"] = False
-        self._test_lsp_helper('create', row_data)
-        self.assertFalse(self.driver.set_port_status_up.called)
-        self.assertFalse(self.driver.set_port_status_down.called)
+    def _add_lsp_row(self, row_json):
+        row = ovs_idl.Row.from_json(self.idl, self.lp_table,
+                                    uuidutils.generate_uuid(), row_json)
+        self.lp_table.rows[row.uuid] = row
+        return row
 
     def test_post_initialize(self):
+        self._add_lsp_row({"up": True, "name": "up-port"})
+        self._add_lsp_row({"up": False, "name": "down-port"})
+        self._add_lsp_row({"up": ['set', []], "name": "unset-port"})
+        self.driver.sync_port_statuses = mock.Mock()
         self.idl.post_initialize(self.driver)
-        self.assertIsNone(self.idl._lsp_create_up_event)
-        self.assertIsNone(self.idl._lsp_create_down_event)
+        self.driver.sync_port_statuses.assert_called_once_with(
+            {'up-port': True, 'down-port': False})
+
+    def test_post_initialize_no_ovsdb_lock(self):
+        self.idl.has_lock = False
+        self.idl.is_lock_contended = True
+        self._add_lsp_row({"up": True, "name": "up-port"})
+        self.driver.sync_port_statuses = mock.Mock()
+        self.idl.post_initialize(self.driver)
+        self.driver.sync_port_statuses.assert_not_called()
 
     def test_lsp_up_update_event(self):
         new_row_json = {"up": True, "name": "foo-name"}
@@ -156,6 +151,20 @@ class TestOvnNbIdlNotifyHandler(test_mech_driver.OVNMechanismDriverTestCase):
         self.driver.set_port_status_down.assert_called_once_with("foo-name")
         self.assertFalse(self.driver.set_port_status_up.called)
 
+    def test_lsp_update_events_merged(self):
+        row_uuid = uuidutils.generate_uuid()
+        for up in (True, False):
+            row = ovs_idl.Row.from_json(self.idl, self.lp_table, row_uuid,
+                                        {"up": up, "name": "foo-name"})
+            old_row = ovs_idl.Row.from_json(self.idl, self.lp_table,
+                                            row_uuid, {"up": not up})
+            self.idl.notify('update', row, updates=old_row)
+        self.assertEqual(1, self.idl.notify_handler.notifications.qsize())
+        self.idl.notify_handler.shutdown()
+        self.idl.notify_handler.notify_loop()
+        self.driver.set_port_status_down.assert_called_once_with("foo-name")
+        self.assertFalse(self.driver.set_port_status_up.called)
+
     def test_lsp_up_update_event_no_old_data(self):
         new_row_json = {"up": True, "name": "foo-name"}
         self._test_lsp_helper('update', new_row_json,
@@ -186,6 +195,222 @@ class TestOvnNbIdlNotifyHandler(test_mech_driver.OVNMechanismDriverTestCase):
         self.assertFalse(self.driver.set_port_status_up.called)
         self.assertFalse(self.driver.set_port_status_down.called)
 
+    def test_lsp_update_events_batched(self):
+        self.idl.notify_handler._port_status_window = 0.1
+        self.driver.set_port_statuses = mock.Mock()
+        with mock.patch.object(ovsdb_monitor, 'greenthread') as mock_gt:
+            self._test_lsp_helper('update', {"up": True, "name": "foo-name"},
+                                  old_row_json={"up": False})
+            self._test_lsp_helper('update', {"up": False, "name": "bar"},
+                                  old_row_json={"up": True})
+            self._test_lsp_helper('update', {"up": False, "name": "foo-name"},
+                                  old_row_json={"up": True})
+        mock_gt.spawn_after.assert_called_once_with(
+            0.1, self.idl.notify_handler.flush_port_statuses)
+        self.assertFalse(self.driver.set_port_status_up.called)
+        self.assertFalse(self.driver.set_port_status_down.called)
+
+        self.idl.notify_handler.flush_port_statuses()
+        self.driver.set_port_statuses.assert_called_once_with(
+            up_port_ids=[], down_port_ids=['bar', 'foo-name'])
+        self.idl.notify_handler.flush_port_statuses()
+        self.assertEqual(1, self.driver.set_port_statuses.call_count)
+
+    def _set_shards(self, shards, shard):
+        self.idl._shards = shards
+        self.idl._set_shard(shard)
+
+    def test_handles_row(self):
+        row = mock.Mock(uuid='8c8d9c69-a5b4-4e1f-8ac8-6e7e3f9d8c21')
+        self.assertTrue(self.idl.handles_row(row))
+        handled = []
+        for shard in range(3):
+            self._set_shards(3, shard)
+            if self.idl.handles_row(row):
+                handled.append(shard)
+        self.assertEqual(1, len(handled))
+        self.assertEqual('neutron_ovn_event_lock_2',
+                         self.idl.event_lock_name)
+
+    def test_notify_other_shard(self):
+        row = mock.Mock(uuid=uuidutils.generate_uuid())
+        self.idl.notify_handler.notify = mock.Mock()
+        self._set_shards(2, 0)
+        with mock.patch.object(self.idl, 'handles_row', return_value=False):
+            self.idl.notify("create", row)
+        self.assertFalse(self.idl.notify_handler.notify.called)
+        with mock.patch.object(self.idl, 'handles_row', return_value=True):
+            self.idl.notify("create", row)
+        self.assertTrue(self.idl.notify_handler.notify.called)
+
+    def _set_lock_sessions(self, *owned):
+        names = [ovsdb_monitor._shard_lock_name(shard) for shard in owned]
+        self.idl._lock_sessions = [
+            mock.Mock(**{'has_lock.side_effect': lambda name: name in names})
+            for shard in range(self.idl._shards)]
+
+    def test_handles_row_backup_shard(self):
+        row = mock.Mock(uuid='8c8d9c69-a5b4-4e1f-8ac8-6e7e3f9d8c21')
+        self._set_shards(3, 0)
+        self.idl.has_lock = False
+        self.idl.is_lock_contended = True
+        self._set_lock_sessions()
+        self.assertFalse(self.idl.has_event_lock())
+        self.assertFalse(self.idl.handles_row(row))
+        self._set_lock_sessions(2)
+        self.assertEqual({2}, self.idl.owned_shards())
+        self.assertTrue(self.idl.has_event_lock())
+        self.assertTrue(self.idl.handles_row(row))
+
+    def test_notify_backup_shard_lock(self):
+        row = mock.Mock(uuid='8c8d9c69-a5b4-4e1f-8ac8-6e7e3f9d8c21')
+        self.idl.notify_handler.notify = mock.Mock()
+        self._set_shards(3, 0)
+        self.idl.has_lock = False
+        self.idl.is_lock_contended = True
+        self._set_lock_sessions(2)
+        self.idl.notify("create", row)
+        self.idl.notify_handler.notify.assert_called_once_with(
+            "create", row, None)
+
+    @mock.patch.object(ovsdb_monitor, 'LockSession')
+    def test_run_lock_sessions(self, mock_session):
+        self._set_shards(2, 1)
+        with mock.patch.object(ovs_idl.Idl, 'run'):
+            self.idl.run()
+            self.idl.run()
+        self.assertEqual([mock.call("remote")] * 2,
+                         mock_session.call_args_list)
+        session = mock_session.return_value
+        delay = 3 * ovsdb_monitor.SHARD_LOCK_WAIT
+        session.lock.assert_has_calls([
+            mock.call('neutron_ovn_event_lock_0', delay),
+            mock.call('neutron_ovn_event_lock_1', delay),
+            mock.call('neutron_ovn_event_lock_worker_1')])
+        # Both runs run the two lock sessions
+        self.assertEqual(4, session.run.call_count)
+
+    def _set_workers(self, workers, idle_workers=0):
+        self.idl._workers = workers
+        self.idl._idle_workers = idle_workers
+        self.idl._may_release_shard = True
+
+    def test_release_shard(self):
+        self._set_shards(3, 0)
+        self._set_lock_sessions(1, 2)
+        self._set_workers(2)
+        self.idl._release_shard()
+        session = self.idl._lock_sessions[1]
+        session.unlock.assert_called_once_with('neutron_ovn_event_lock_1')
+        # The lock is requested again, in case no other worker wants it
+        session.lock.assert_called_once_with('neutron_ovn_event_lock_1')
+        self.idl._lock_sessions[2].unlock.assert_not_called()
+        self.assertFalse(self.idl._may_release_shard)
+
+    def test_release_shard_fair_share(self):
+        self._set_shards(3, 0)
+        self._set_lock_sessions(1, 2)
+        self._set_workers(1)
+        self.idl._release_shard()
+        for session in self.idl._lock_sessions:
+            session.unlock.assert_not_called()
+
+    def test_release_shard_idle_workers(self):
+        self._set_shards(4, 0)
+        self._set_lock_sessions(3)
+        self._set_workers(2)
+        self.idl._release_shard()
+        self.idl._lock_sessions[3].unlock.assert_not_called()
+        self._set_workers(3, idle_workers=1)
+        self.idl._release_shard()
+        self.idl._lock_sessions[3].unlock.assert_called_once_with(
+            'neutron_ovn_event_lock_3')
+
+    @mock.patch.object(ovsdb_monitor.time, 'time')
+    def test_probe_slots(self, mock_time):
+        mock_time.return_value = 100
+        self._set_shards(3, 0)
+        self._set_lock_sessions()
+        self.idl._slot = 0
+        self.idl._slot_probe_at = 100
+        self.idl._probe_slots()
+        for slot in (1, 2):
+            self.idl._lock_sessions[slot].lock.assert_has_calls([
+                mock.call('neutron_ovn_event_lock_worker_%d' % slot),
+                mock.call('neutron_ovn_event_lock_idle_%d' % slot)])
+        self.idl._lock_sessions[0].lock.assert_not_called()
+
+        # Slot 1 is owned by an idle worker, slot 2 by no worker
+        owned = ['neutron_ovn_event_lock_worker_1',
+                 'neutron_ovn_event_lock_idle_1']
+        for slot in (1, 2):
+            session = self.idl._lock_sessions[slot]
+            session.is_lock_contended.side_effect = (
+                lambda name: name in owned)
+            session.has_lock.side_effect = lambda name: name not in owned
+        self.idl._probe_slots()
+        self.assertEqual({}, self.idl._slot_probes)
+        self.assertEqual(2, self.idl._lock_sessions[1].unlock.call_count)
+        self.assertIsNone(self.idl._workers)
+
+        mock_time.return_value += ovsdb_monitor.SHARD_LOCK_WAIT
+        self.idl._probe_slots()
+        self.assertEqual(2, self.idl._workers)
+        self.assertEqual(1, self.idl._idle_workers)
+        self.assertTrue(self.idl._may_release_shard)
+
+    def test_shards_acquired(self):
+        self._set_shards(3, 0)
+        self.idl._synced_shards = set([0])
+        with mock.patch.object(self.idl, 'owned_shards',
+                               return_value=set([0, 2])), \
+                mock.patch.object(self.idl,
+                                  'sync_port_statuses') as mock_sync:
+            self.idl._sync_acquired_shards()
+            self.idl._sync_acquired_shards()
+        mock_sync.assert_called_once_with(self.driver, set([2]))
+        self.assertEqual(set([0, 2]), self.idl._synced_shards)
+
+    def test_sync_port_statuses_shards(self):
+        self._set_shards(3, 0)
+        rows = [self._add_lsp_row({"up": True, "name": "port%d" % i})
+                for i in range(6)]
+        shard_ports = {}
+        for row in rows:
+            for shard in range(3):
+                if self.idl.handles_row(row, set([shard])):
+                    shard_ports[row.name] = shard
+        self.driver.sync_port_statuses = mock.Mock()
+        self.idl.sync_port_statuses(self.driver, set([2]))
+        self.driver.sync_port_statuses.assert_called_once_with(
+            {name: True for name, shard in shard_ports.items()
+             if shard == 2})
+
+    @mock.patch.object(ovsdb_monitor.time, 'time')
+    def test_rebalance_shard(self, mock_time):
+        self._set_shards(3, 2)
+        self.idl.has_lock = False
+        self.idl.is_lock_contended = True
+        mock_time.return_value = 100
+        with mock.patch.object(self.idl, 'set_lock') as mock_set_lock:
+            self.idl._rebalance_shard()
+            mock_time.return_value += ovsdb_monitor.SHARD_LOCK_WAIT - 1
+            self.idl._rebalance_shard()
+            mock_set_lock.assert_not_called()
+            mock_time.return_value += 1
+            self.idl._rebalance_shard()
+        mock_set_lock.assert_called_once_with('neutron_ovn_event_lock_0')
+        self.assertEqual(0, self.idl._shard)
+
+    def test_rebalance_shard_lock_owned(self):
+        self._set_shards(3, 2)
+        self.idl.has_lock = True
+        self.idl.is_lock_contended = True
+        with mock.patch.object(self.idl, 'set_lock') as mock_set_lock:
+            self.idl._rebalance_shard()
+        self.assertIsNone(self.idl._shard_wait_start)
+        mock_set_lock.assert_not_called()
+
     def test_notify_no_ovsdb_lock(self):
         self.idl.has_lock = False
         self.idl.is_lock_contended = True
@@ -236,11 +461,16 @@ class TestOvnSbIdlNotifyHandler(test_mech_driver.OVNMechanismDriverTestCase):
                                             row_uuid, old_row_json)
         else:
             old_row = None
-        self.sb_idl.notify(event, row, updates=old_row)
-        # Add a STOP EVENT to the queue
-        self.sb_idl.notify_handler.shutdown()
-        # Execute the notifications queued
-        self.sb_idl.notify_handler.notify_loop()
+        with mock.patch.object(ovsdb_monitor, 'greenthread') as mock_gt:
+            self.sb_idl.notify(event, row, updates=old_row)
+            # Add a STOP EVENT to the queue
+            self.sb_idl.notify_handler.shutdown()
+            # Execute the notifications queued
+            self.sb_idl.notify_handler.notify_loop()
+        # Run the gateways rescheduling
+        for delay, func in (c[0] for c in mock_gt.spawn_after.call_args_list):
+            func()
+        return mock_gt
 
     def test_chassis_create_event(self):
         self._test_chassis_helper('create', self.row_json)
@@ -272,6 +502,38 @@ class TestOvnSbIdlNotifyHandler(test_mech_driver.OVNMechanismDriverTestCase):
                 1,
                 self.l3_plugin.schedule_unhosted_gateways.call_count)
 
+    def test_chassis_update_event_mappings_unchanged(self):
+        old_row_json = copy.deepcopy(self.row_json)
+        old_row_json['external_ids'][1].append(["ovn-encap-ip", "10.0.0.1"])
+        self._test_chassis_helper('update', self.row_json, old_row_json)
+        self.assertFalse(self.driver.update_segment_host_mapping.called)
+
+    def test_chassis_update_event_other_column(self):
+        self._test_chassis_helper('update', self.row_json,
+                                  {"name": "old-name"})
+        self.assertFalse(self.driver.update_segment_host_mapping.called)
+
+    def test_chassis_update_event_hostname(self):
+        self._test_chassis_helper('update', self.row_json,
+                                  {"hostname": "old-hostname"})
+        self.driver.update_segment_host_mapping.assert_called_once_with(
+            'fake-hostname', ['fake-phynet1'])
+
+    def test_chassis_events_reschedule_gateways_once(self):
+        if not ovn_config.is_ovn_l3():
+            self.skipTest('OVN L3 mode is disabled')
+        event = self.sb_idl._chassis_event
+        with mock.patch.object(ovsdb_monitor, 'greenthread') as mock_gt:
+            event.schedule_unhosted_gateways()
+            event.schedule_unhosted_gateways()
+        mock_gt.spawn_after.assert_called_once_with(
+            ovsdb_monitor.GATEWAY_RESCHEDULE_DELAY,
+            event._reschedule_gateways)
+        event._reschedule_gateways()
+        self.assertEqual(
+            1, self.l3_plugin.schedule_unhosted_gateways.call_count)
+        self.assertFalse(event._reschedule_pending)
+
 
 class TestOvnDbNotifyHandler(base.TestCase):
 
@@ -282,9 +544,10 @@ class TestOvnDbNotifyHandler(base.TestCase):
 
     def test_watch_and_unwatch_events(self):
         expected_events = set()
-        networking_event = mock.Mock()
-        ovn_event = mock.Mock()
-        unknown_event = mock.Mock()
+        networking_event = mock.Mock(table='Logical_Switch',
+                                     events=('create', 'update'))
+        ovn_event = mock.Mock(table='Logical_Switch_Port', events='update')
+        unknown_event = mock.Mock(table='Logical_Switch', events=('delete',))
 
         self.assertItemsEqual(set(), self.watched_events)
 
@@ -300,10 +563,252 @@ class TestOvnDbNotifyHandler(base.TestCase):
         self.handler.unwatch_event(unknown_event)
         self.handler.unwatch_events([unknown_event])
         self.assertItemsEqual(set(), self.watched_events)
+        self.assertEqual(
+            {}, self.handler._OvnDbNotifyHandler__watched_index)
+
+    def test_matching_events(self):
+        row = mock.Mock()
+        row._table.name = 'Logical_Switch_Port'
+        update_event = mock.Mock(table='Logical_Switch_Port',
+                                 events=('update',))
+        other_table_event = mock.Mock(table='Logical_Switch',
+                                      events=('update',))
+        self.handler.watch_events([update_event, other_table_event])
+
+        self.assertEqual((update_event,),
+                         self.handler.matching_events('update', row, None))
+        update_event.matches.assert_called_once_with('update', row, None)
+        self.assertEqual((),
+                         self.handler.matching_events('create', row, None))
+        other_table_event.matches.assert_not_called()
 
     def test_shutdown(self):
         self.handler.shutdown()
 
+    def _make_row(self, table='Logical_Switch_Port'):
+        row = mock.Mock(uuid=uuidutils.generate_uuid())
+        row._table.name = table
+        return row
+
+    def test_dispatch_keeps_row_order(self):
+        self.handler._pool = mock.Mock()
+        calls = []
+        event1 = mock.Mock(ONETIME=False, event_name='event1')
+        event1.run.side_effect = lambda e, r, u: calls.append((1, r))
+        event2 = mock.Mock(ONETIME=False, event_name='event2')
+        event2.run.side_effect = lambda e, r, u: calls.append((2, r))
+        row1 = self._make_row()
+        row2 = self._make_row()
+
+        self.handler._dispatch(event1, 'update', row1, None)
+        self.handler._dispatch(event2, 'update', row1, None)
+        self.handler._dispatch(event1, 'update', row2, None)
+        key1 = ('Logical_Switch_Port', row1.uuid)
+        key2 = ('Logical_Switch_Port', row2.uuid)
+        self.handler._pool.spawn_n.assert_has_calls([
+            mock.call(self.handler._run_row_notifications, key1),
+            mock.call(self.handler._run_row_notifications, key2)])
+        self.assertEqual(2, self.handler._pool.spawn_n.call_count)
+        self.assertEqual(3, self.handler.get_stats()['queue_depth'])
+
+        self.handler._run_row_notifications(key1)
+        self.handler._run_row_notifications(key2)
+        self.assertEqual([(1, row1), (2, row1), (1, row2)], calls)
+        self.assertEqual({}, self.handler._pending)
+
+    def test_run_row_notifications_continues_on_error(self):
+        event = mock.Mock(ONETIME=False, event_name='event')
+        event.run.side_effect = [RuntimeError, None]
+        row = self._make_row()
+        key = ('Logical_Switch_Port', row.uuid)
+        self.handler._pending[key] = collections.deque(
+            [(event, 'update', row, None), (event, 'update', row, None)])
+        self.handler._run_row_notifications(key)
+        self.assertEqual(2, event.run.call_count)
+        self.assertEqual({}, self.handler._pending)
+
+    def test_get_stats(self):
+        event = mock.Mock(ONETIME=False, event_name='event')
+        self.handler._run_notification(event, 'update', self._make_row(),
+                                       None)
+        self.handler._run_notification(event, 'update', self._make_row(),
+                                       None)
+        stats = self.handler.get_stats()
+        self.assertEqual(0, stats['queue_depth'])
+        self.assertEqual(['event'], list(stats['events']))
+        self.assertEqual(2, stats['events']['event']['count'])
+
+
+class TestNotificationQueue(base.TestCase):
+
+    def test_put_and_get(self):
+        notifications = ovsdb_monitor.NotificationQueue()
+        notifications.put('n1', key='k1')
+        notifications.put('n2')
+        notifications.put('n3', key='k1')
+        notifications.put('n4', key='k2')
+        self.assertEqual(3, notifications.qsize())
+        self.assertEqual(1, notifications.merged)
+        self.assertEqual(['n3', 'n2', 'n4'],
+                         [notifications.get() for _ in range(3)])
+        # A notification put after its key was dequeued isn't merged
+        notifications.put('n5', key='k1')
+        self.assertEqual(1, notifications.qsize())
+        self.assertEqual(['k1'], list(notifications._keyed_entries))
+
+    @mock.patch.object(ovsdb_monitor.LOG, 'warning')
+    def test_high_water(self, mock_warning):
+        notifications = ovsdb_monitor.NotificationQueue(high_water=4)
+        for i in range(5):
+            notifications.put(i)
+        self.assertEqual(1, mock_warning.call_count)
+        self.assertEqual(1, notifications.high_water_hits)
+        for i in range(4):
+            notifications.get()
+        for i in range(3):
+            notifications.put(i)
+        self.assertEqual(2, mock_warning.call_count)
+        self.assertEqual(2, notifications.high_water_hits)
+
+
+class TestRegisterProfile(base.TestCase):
+
+    schema_json = {
+        "tables": {
+            "Logical_Switch": {
+                "columns": {
+                    "name": {"type": "string"},
+                    "ports": {"type": {"key": {"type": "uuid",
+                                               "refTable":
+                                               "Logical_Switch_Port"},
+                                       "min": 0, "max": "unlimited"}},
+                    "qos_rules": {"type": {"key": {"type": "uuid",
+                                                   "refTable": "QoS"},
+                                           "min": 0, "max": "unlimited"}}}},
+            "Logical_Switch_Port": {
+                "columns": {
+                    "name": {"type": "string"},
+                    "dynamic_addresses": {"type": {"key": "string",
+                                                   "min": 0, "max": 1}}}},
+            "QoS": {"columns": {"priority": {"type": "integer"}}},
+        }
+    }
+
+    def test_register_profile(self):
+        helper = mock.Mock(schema_json=self.schema_json)
+        ovsdb_monitor.register_profile(
+            helper, {'Logical_Switch': None,
+                     'Logical_Switch_Port': ('name', 'unknown'),
+                     'Port_Group': None})
+        self.assertEqual(2, helper.register_columns.call_count)
+        calls = {c[0][0]: c[0][1]
+                 for c in helper.register_columns.call_args_list}
+        # The columns referencing tables not registered are skipped
+        self.assertItemsEqual(['name', 'ports'], calls['Logical_Switch'])
+        self.assertEqual(['name'], calls['Logical_Switch_Port'])
+
+
+class TestLockSession(base.TestCase):
+
+    def setUp(self):
+        super(TestLockSession, self).setUp()
+        mock_open = mock.patch.object(ovsdb_monitor.jsonrpc.Session,
+                                      'open').start()
+        self.session = mock_open.return_value
+        self.session.get_seqno.return_value = 1
+        self.session.is_connected.return_value = True
+        self.session.recv.return_value = None
+        self.mock_time = mock.patch.object(ovsdb_monitor.time,
+                                           'time').start()
+        self.mock_time.return_value = 100
+        self.lock_session = ovsdb_monitor.LockSession('remote')
+        self.lock_session.lock('lock1', 10)
+
+    def _recv(self, *msgs):
+        self.session.recv.side_effect = list(msgs) + [None]
+        self.lock_session.run()
+
+    def _reply(self, locked):
+        msg_id = self.session.send.call_args[0][0].id
+        return ovsdb_monitor.jsonrpc.Message.create_reply(
+            {'locked': locked}, msg_id)
+
+    def test_run_request_lock_after_delay(self):
+        self.lock_session.run()
+        self.session.send.assert_not_called()
+        self.mock_time.return_value = 110
+        self.lock_session.run()
+        self.lock_session.run()
+        self.session.send.assert_called_once_with(mock.ANY)
+        msg = self.session.send.call_args[0][0]
+        self.assertEqual('lock', msg.method)
+        self.assertEqual(['lock1'], msg.params)
+
+    def test_run_locked(self):
+        self.mock_time.return_value = 110
+        self.lock_session.run()
+        self._recv(self._reply(False))
+        self.assertFalse(self.lock_session.has_lock('lock1'))
+        self.assertTrue(self.lock_session.is_lock_contended('lock1'))
+        self._recv(ovsdb_monitor.jsonrpc.Message.create_notify(
+            'locked', ['lock1']))
+        self.assertTrue(self.lock_session.has_lock('lock1'))
+        self.assertFalse(self.lock_session.is_lock_contended('lock1'))
+        self._recv(ovsdb_monitor.jsonrpc.Message.create_notify(
+            'stolen', ['lock1']))
+        self.assertFalse(self.lock_session.has_lock('lock1'))
+
+    def test_run_reconnected(self):
+        self.mock_time.return_value = 110
+        self.lock_session.run()
+        self._recv(self._reply(True))
+        self.assertTrue(self.lock_session.has_lock('lock1'))
+        self.session.get_seqno.return_value = 2
+        self.lock_session.run()
+        self.assertFalse(self.lock_session.has_lock('lock1'))
+        # The lock is requested again on the new connection
+        self.assertEqual(2, self.session.send.call_count)
+
+    def test_unlock(self):
+        self.mock_time.return_value = 110
+        self.lock_session.run()
+        reply = self._reply(True)
+        self.lock_session.unlock('lock1')
+        msg = self.session.send.call_args[0][0]
+        self.assertEqual('unlock', msg.method)
+        self.assertEqual(['lock1'], msg.params)
+        # The reply of the lock request released meanwhile is ignored
+        self._recv(reply)
+        self.assertFalse(self.lock_session.has_lock('lock1'))
+
+    def test_unlock_not_requested(self):
+        self.lock_session.unlock('lock1')
+        self.mock_time.return_value = 110
+        self.lock_session.run()
+        self.session.send.assert_not_called()
+
+
+class TestOvnBaseIdl(base.TestCase):
+
+    def setUp(self):
+        super(TestOvnBaseIdl, self).setUp()
+        helper = ovs_idl.SchemaHelper(schema_json=OVN_NB_SCHEMA)
+        helper.register_all()
+        self.idl = ovsdb_monitor.OvnBaseIdl('remote', helper)
+        self.index = self.idl.add_row_index(
+            'Logical_Switch', 'Logical_Switch', lambda row: row.name)
+
+    def test_get_txn_inserted_rows(self):
+        txn = ovs_idl.Transaction(self.idl)
+        self.addCleanup(txn.abort)
+        row = txn.insert(self.idl.tables['Logical_Switch'])
+        row.name = 'ls1'
+        other_row = txn.insert(self.idl.tables['Logical_Switch_Port'])
+        other_row.name = 'ls1'
+        self.assertEqual([row], self.index.get('ls1'))
+        # The rows inserted in other tables are not tracked by the index
+        self.assertEqual({'ls1': {row.uuid: row}}, self.index._pending_keys)
+
 
 class TestOvnBaseConnection(base.TestCase):
 
@@ -0,0 +1,126 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+import operator
+import threading
+
+import mock
+from ovs.db import idl as ovs_idl
+
+from networking_ovn.ovsdb import row_index
+from networking_ovn.tests import base
+from networking_ovn.tests.unit import fakes
+
+
+class TestRowIndex(base.TestCase):
+
+    def setUp(self):
+        super(TestRowIndex, self).setUp()
+        self.table = fakes.FakeOvsdbTable.create_one_ovsdb_table()
+        self.idl = mock.Mock(tables={'Logical_Switch': self.table}, txn=None)
+        self.index = row_index.RowIndex(self.idl, 'Logical_Switch',
+                                        operator.attrgetter('name'))
+
+    def _add_row(self, name):
+        row = fakes.FakeOvsdbRow.create_one_ovsdb_row(attrs={'name': name})
+        self.table.rows[row.uuid] = row
+        return row
+
+    def test_create_and_delete(self):
+        row = self._add_row('ls1')
+        self.index.notify(ovs_idl.ROW_CREATE, row)
+        self.assertEqual([row], self.index.get('ls1'))
+        self.assertEqual([], self.index.get('ls2'))
+
+        del self.table.rows[row.uuid]
+        self.index.notify(ovs_idl.ROW_DELETE, row)
+        self.assertEqual([], self.index.get('ls1'))
+        self.assertEqual({}, self.index._rows)
+        self.assertEqual({}, self.index._row_keys)
+
+    def test_update_key(self):
+        row = self._add_row('ls1')
+        self.index.notify(ovs_idl.ROW_CREATE, row)
+        row.name = 'ls2'
+        self.index.notify(ovs_idl.ROW_UPDATE, row)
+        self.assertEqual([], self.index.get('ls1'))
+        self.assertEqual([row], self.index.get('ls2'))
+
+    def test_rebuild(self):
+        row1 = self._add_row('ls1')
+        row2 = self._add_row('ls2')
+        self.index.rebuild()
+        self.assertEqual([row1], self.index.get('ls1'))
+        self.assertEqual([row2], self.index.get('ls2'))
+
+    def test_get_skips_rows_not_in_table(self):
+        row = self._add_row('ls1')
+        self.index.notify(ovs_idl.ROW_CREATE, row)
+        # The IDL reconnected and replaced its rows without notifying
+        self.table.rows = {}
+        self.assertEqual([], self.index.get('ls1'))
+
+    def test_get_txn_inserted_rows(self):
+        row = fakes.FakeOvsdbRow.create_one_ovsdb_row(
+            attrs={'name': 'ls1', '_data': None, '_changes': {}})
+        row._table = self.table
+        self.table.rows[row.uuid] = row
+        self.idl.txn = mock.Mock(_txn_rows={row.uuid: row})
+        self.index.add_pending(self.idl.txn, row)
+        self.assertEqual([row], self.index.get('ls1'))
+        self.assertEqual([], self.index.get('ls2'))
+
+        # The rows inserted by another transaction are not returned
+        self.idl.txn = mock.Mock(_txn_rows={})
+        self.assertEqual([], self.index.get('ls1'))
+
+    def test_get_txn_inserted_rows_keyed_once(self):
+        row = fakes.FakeOvsdbRow.create_one_ovsdb_row(
+            attrs={'name': 'ls1', '_data': None, '_changes': {}})
+        self.idl.txn = mock.Mock(_txn_rows={row.uuid: row})
+        self.index.add_pending(self.idl.txn, row)
+        with mock.patch.object(self.index, 'key_func',
+                               wraps=self.index.key_func) as key_func:
+            self.assertEqual([], self.index.get('ls2'))
+            self.assertEqual([], self.index.get('ls3'))
+            # The row is only keyed by the first lookup, then checked
+            # against the keys it is returned for.
+            self.assertEqual(1, key_func.call_count)
+            self.assertEqual([row], self.index.get('ls1'))
+            self.assertEqual(2, key_func.call_count)
+
+    def test_get_txn_deleted_inserted_rows(self):
+        row = fakes.FakeOvsdbRow.create_one_ovsdb_row(
+            attrs={'name': 'ls1', '_data': None, '_changes': {}})
+        self.idl.txn = mock.Mock(_txn_rows={})
+        self.index.add_pending(self.idl.txn, row)
+        self.assertEqual([], self.index.get('ls1'))
+
+    def test_wait_row_present(self):
+        row = self._add_row('ls1')
+        self.index.notify(ovs_idl.ROW_CREATE, row)
+        self.assertEqual([row], self.index.wait('ls1', 0))
+
+    def test_wait_row_created(self):
+        row = self._add_row('ls1')
+        timer = threading.Timer(0.01, self.index.notify,
+                                (ovs_idl.ROW_CREATE, row))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.assertEqual([row], self.index.wait('ls1', 10))
+        self.assertEqual({}, self.index._waiters)
+
+    def test_wait_timeout(self):
+        self.assertEqual([], self.index.wait('ls1', 0.01))
+        self.assertEqual({}, self.index._waiters)
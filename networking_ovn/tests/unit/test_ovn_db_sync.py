@@ -14,7 +14,9 @@
 
 import mock
 
+from networking_ovn.common import acl as ovn_acl
 from networking_ovn.common import constants as ovn_const
+from networking_ovn.common import utils as ovn_utils
 from networking_ovn import ovn_db_sync
 from networking_ovn.tests.unit.ml2 import test_mech_driver
 
@@ -338,6 +340,9 @@ class TestOvnNbSyncML2(test_mech_driver.OVNMechanismDriverTestCase):
             "networking_ovn.common.acl.acl_remote_group_id",
             side_effect=self.matches
         ).start()
+        # Compile the rule matches with the mocked remote group only
+        ovn_acl.clear_sg_rule_match_cache()
+        self.addCleanup(ovn_acl.clear_sg_rule_match_cache)
         core_plugin.get_security_group = mock.MagicMock(
             side_effect=self.security_groups)
         ovn_nb_synchronizer.get_acls = mock.Mock()
@@ -390,6 +395,7 @@ class TestOvnNbSyncML2(test_mech_driver.OVNMechanismDriverTestCase):
 
         ovn_driver.create_network_in_ovn = mock.Mock()
         ovn_driver.create_port_in_ovn = mock.Mock()
+        ovn_driver.create_ports_in_ovn = mock.Mock()
         ovn_driver.validate_and_get_data_from_binding_profile = mock.Mock()
         ovn_driver.get_ovn_port_options = mock.Mock()
         ovn_driver.get_ovn_port_options.return_value = mock.ANY
@@ -508,12 +514,11 @@ class TestOvnNbSyncML2(test_mech_driver.OVNMechanismDriverTestCase):
         ovn_driver.create_network_in_ovn.assert_has_calls(
             create_network_calls, any_order=True)
 
-        self.assertEqual(len(create_port_list),
-                         ovn_driver.create_port_in_ovn.call_count)
-        create_port_calls = [mock.call(port, mock.ANY)
-                             for port in create_port_list]
-        ovn_driver.create_port_in_ovn.assert_has_calls(create_port_calls,
-                                                       any_order=True)
+        created_ports = [port for call in
+                         ovn_driver.create_ports_in_ovn.call_args_list
+                         for port, ovn_port_info in call[0][0]]
+        self.assertItemsEqual(create_port_list, created_ports)
+        ovn_driver.create_port_in_ovn.assert_not_called()
 
         create_provnet_port_calls = [
             mock.call(mock.ANY, mock.ANY,
@@ -654,6 +659,79 @@ class TestOvnNbSyncML2(test_mech_driver.OVNMechanismDriverTestCase):
         ovn_api.delete_dhcp_options.assert_has_calls(
             delete_dhcp_options_calls, any_order=True)
 
+    def test_remove_common_acls(self):
+        acl1 = {'lport': 'p1', 'lswitch': 'neutron-n1', 'priority': 1001,
+                'action': 'drop', 'log': False, 'direction': 'to-lport',
+                'match': 'outport == "p1" && ip',
+                'external_ids': {'neutron:lport': 'p1'}}
+        acl2 = dict(acl1, priority=1002, action='allow-related',
+                    match='outport == "p1" && ip4')
+        # ACLs read back from the NB database carry extra columns
+        nb_acl1 = dict(acl1, name=[], severity=[])
+        neutron_acls = {'p1': [acl1, acl2], 'p2': [acl1]}
+        nb_acls = {'p1': [nb_acl1, nb_acl1]}
+        ovn_nb_synchronizer = ovn_db_sync.OvnNbSynchronizer(
+            self.plugin, self.mech_driver._nb_ovn, 'log', self.mech_driver)
+        ovn_nb_synchronizer.remove_common_acls(neutron_acls, nb_acls)
+        self.assertEqual({'p1': [acl2], 'p2': [acl1]}, neutron_acls)
+        # The duplicated NB ACL is left to be removed
+        self.assertEqual({'p1': [nb_acl1]}, nb_acls)
+
+    def test_sync_port_groups(self):
+        sg_rule = {'id': 'sgr1', 'security_group_id': 'sg1',
+                   'direction': 'ingress', 'ethertype': 'IPv4',
+                   'remote_group_id': None, 'remote_ip_prefix': None,
+                   'protocol': None, 'port_range_min': None,
+                   'port_range_max': None}
+        sg1 = {'id': 'sg1', 'security_group_rules': [sg_rule]}
+        sg2 = {'id': 'sg2', 'security_group_rules': []}
+        ports = [{'id': 'p1', 'security_groups': ['sg1']},
+                 {'id': 'p2', 'security_groups': ['sg1', 'sg2']},
+                 {'id': 'p3', 'security_groups': []}]
+        pg1 = ovn_utils.ovn_port_group_name('sg1')
+        pg2 = ovn_utils.ovn_port_group_name('sg2')
+        stale_acl = {'priority': 1002, 'direction': 'to-lport',
+                     'action': 'allow-related', 'log': False,
+                     'match': 'outport == @%s && ip6' % pg1}
+        nb_pgs = {
+            ovn_const.OVN_DROP_PORT_GROUP_NAME: {
+                'name': ovn_const.OVN_DROP_PORT_GROUP_NAME,
+                'ports': ['p1', 'p3'],
+                'acls': ovn_acl.drop_all_ip_traffic_for_port_group(),
+                'external_ids': {}},
+            pg1: {'name': pg1, 'ports': ['p1'], 'acls': [stale_acl],
+                  'external_ids': {ovn_const.OVN_SG_EXT_ID_KEY: 'sg1'}},
+            'pg_stale': {'name': 'pg_stale', 'ports': [], 'acls': [],
+                         'external_ids': {
+                             ovn_const.OVN_SG_EXT_ID_KEY: 'stale'}}}
+
+        ovn_nb_synchronizer = ovn_db_sync.OvnNbSynchronizer(
+            self.plugin, self.mech_driver._nb_ovn, 'repair', self.mech_driver)
+        ovn_api = ovn_nb_synchronizer.ovn_api
+        ovn_api.get_port_groups.return_value = nb_pgs
+        with mock.patch.object(ovn_nb_synchronizer.core_plugin,
+                               'get_security_groups',
+                               return_value=[sg1, sg2]), \
+                mock.patch.object(ovn_nb_synchronizer.core_plugin,
+                                  'get_ports', return_value=ports):
+            ovn_nb_synchronizer.sync_port_groups(mock.ANY)
+
+        ovn_api.create_port_group.assert_called_once_with(
+            pg2, acls=[],
+            external_ids={ovn_const.OVN_SG_EXT_ID_KEY: 'sg2'})
+        ovn_api.delete_port_group.assert_called_once_with('pg_stale')
+        ovn_api.update_port_group_ports.assert_has_calls([
+            mock.call(pg2, lports_add=['p2'], skip_missing_lports=True),
+            mock.call(ovn_const.OVN_DROP_PORT_GROUP_NAME,
+                      lports_add=['p2'], lports_del=['p3'],
+                      skip_missing_lports=True),
+            mock.call(pg1, lports_add=['p2'], lports_del=[],
+                      skip_missing_lports=True)],
+            any_order=True)
+        ovn_api.update_port_group_acls.assert_called_once_with(
+            pg1, acls_add=ovn_acl.add_acls_for_port_group(sg1),
+            acls_del=[stale_acl])
+
     def test_ovn_nb_sync_mode_repair(self):
         create_network_list = [{'net': {'id': 'n2', 'mtu': 1450},
                                 'ext_ids': {}}]